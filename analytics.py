@@ -0,0 +1,166 @@
+# agroflow/analytics.py
+
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+try: import numpy as np
+except ImportError: np = None
+
+UNAVAILABLE = "Analytics require the optional 'numpy' package (pip install numpy)."
+ANALYTICS_TABLES = ("orders", "order_items")
+SNAPSHOT_TTL_SECONDS = 300
+TREND_WEEKS = 12
+TREND_AVERAGE_WEEKS = 4
+SEASONALITY_MIN_MONTHS = 12
+SEASONALITY_MIN_UNITS = 100
+FORECAST_HISTORY_DAYS = 56
+FORECAST_HALF_LIFE_DAYS = 14
+REORDER_COVER_DAYS = 7
+REORDER_SERVICE_Z = 1.65
+RFM_BINS = 5
+SEGMENTS = ("Champions", "Loyal", "Promising", "At risk", "Hibernating", "Needs attention")
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+# Days are counted from 1970-01-01 so they index straight into bincount; julianday() parses the stored timestamps in SQLite.
+# Lines are read with a plain scan of order_items (no join) and matched to their order's customer and day by array indexing.
+ORDERS_QUERY = "SELECT id, customer_id, CAST(julianday(order_date) - 2440587.5 AS INTEGER), total_invoice FROM orders WHERE status = 'Completed'"
+LINES_QUERY = "SELECT order_id, product_id, quantity, quantity * final_price FROM order_items WHERE +is_out_of_stock = 0 AND final_price IS NOT NULL"
+ORDER_DTYPE = [("id", "i8"), ("customer", "i8"), ("day", "i8"), ("total", "f8")]
+LINE_DTYPE = [("order", "i8"), ("product", "i8"), ("quantity", "f8"), ("revenue", "f8")]
+
+# Completed orders and their in-stock lines as parallel arrays: one entry per order / per line.
+Sales = namedtuple("Sales", "customer order_day order_total product day quantity revenue")
+
+_snapshots, _snapshots_lock = {}, threading.Lock()
+
+def available(): return np is not None
+def day_number(day): return (day - date(1970, 1, 1)).days
+def from_day_number(number): return date(1970, 1, 1) + timedelta(days=int(number))
+
+def load(db):
+    # One snapshot per database file, shared by every pool reader. It is rebuilt when this process writes to orders or
+    # order_items, and at least every SNAPSHOT_TTL_SECONDS so writes from other processes show up.
+    key, stamp = os.path.abspath(db.db_file), db.table_versions(*ANALYTICS_TABLES)
+    with _snapshots_lock:
+        entry = _snapshots.get(key)
+        if entry is None or entry[0] != stamp or time.monotonic() >= entry[1]:
+            entry = _snapshots[key] = (stamp, time.monotonic() + SNAPSHOT_TTL_SECONDS, read_sales(db))
+        return entry[2]
+
+def read_sales(db):
+    # fromiter fills the structured arrays straight from the cursor; columns are then copied out contiguously.
+    cursor = db.conn.cursor(); cursor.row_factory = None
+    orders = np.fromiter(cursor.execute(ORDERS_QUERY), dtype=ORDER_DTYPE); lines = np.fromiter(cursor.execute(LINES_QUERY), dtype=LINE_DTYPE)
+    day_by_order = np.full(int(max(orders["id"].max(initial=0), lines["order"].max(initial=0))) + 1, -1); day_by_order[orders["id"]] = orders["day"]
+    day = day_by_order[lines["order"]]; completed = day >= 0
+    column = lambda values: np.ascontiguousarray(values)
+    return Sales(column(orders["customer"]), column(orders["day"]), np.nan_to_num(orders["total"]), column(lines["product"][completed]), day[completed], column(lines["quantity"][completed]), np.nan_to_num(lines["revenue"][completed]))
+
+def weekly_revenue(sales, today, weeks=TREND_WEEKS):
+    # Daily revenue for the last `weeks` * 7 days (ending today) folded into rolling 7-day windows, oldest first.
+    end = day_number(today) + 1; start = end - weeks * 7
+    mask = (sales.order_day >= start) & (sales.order_day < end)
+    daily = np.bincount(sales.order_day[mask] - start, weights=sales.order_total[mask], minlength=weeks * 7)
+    return [from_day_number(start + 7 * week) for week in range(weeks)], daily.reshape(weeks, 7).sum(axis=1)
+
+def seasonality(sales, today):
+    # Per product and calendar month: units per day in that month / the product's average across months. Returns
+    # (product ids, index matrix [product, month], units) for products selling at least SEASONALITY_MIN_UNITS,
+    # or None with less than SEASONALITY_MIN_MONTHS of history.
+    if not len(sales.day): return None
+    # Only whole months count: the month of the first order and the current month are left out.
+    months = sales.day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    first, last = int(months.min()) + 1, int(np.datetime64(today, "M").astype(np.int64)) - 1
+    if last - first + 1 < SEASONALITY_MIN_MONTHS: return None
+    whole = (months >= first) & (months <= last); months, product, quantity = months[whole], sales.product[whole], sales.quantity[whole]
+    # Days of each calendar month in the history, so neither a month seen twice nor a 31-day month reads as busier.
+    span = np.arange(first, last + 2).astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+    occurrences = np.bincount(np.arange(first, last + 1) % 12, weights=np.diff(span), minlength=12)
+    size = int(product.max()) + 1
+    units = np.bincount(product * 12 + months % 12, weights=quantity, minlength=size * 12).reshape(size, 12)
+    totals = units.sum(axis=1); products = np.flatnonzero(totals >= SEASONALITY_MIN_UNITS)
+    average = units[products] / occurrences; index = average / average.mean(axis=1, keepdims=True)
+    return products, index, totals[products]
+
+def rfm(sales, today):
+    # Recency (days since last order), frequency (orders) and monetary value per customer, each scored 1-5 by rank,
+    # and a segment index into SEGMENTS from the recency score and the average of the frequency and monetary scores.
+    if not len(sales.customer): return None
+    size = int(sales.customer.max()) + 1
+    frequency = np.bincount(sales.customer, minlength=size); customers = np.flatnonzero(frequency)
+    monetary = np.bincount(sales.customer, weights=sales.order_total, minlength=size)[customers]
+    last = np.full(size, np.iinfo(np.int64).min); np.maximum.at(last, sales.customer, sales.order_day)
+    recency, frequency = day_number(today) - last[customers], frequency[customers]
+    r, f, m = score(-recency), score(frequency), score(monetary); fm = (f + m) / 2
+    segment = np.select([(r >= 4) & (fm >= 4), (r >= 3) & (fm >= 3), r >= 4, (r <= 2) & (fm >= 3), r <= 2], range(5), default=5)
+    return customers, recency, frequency, monetary, segment
+
+def score(values):
+    # Equal-sized rank bins; ties are broken by position, as with qcut on rank(method="first").
+    ranks = np.empty(len(values), dtype=np.int64); ranks[np.argsort(values, kind="stable")] = np.arange(len(values))
+    return ranks * RFM_BINS // len(values) + 1
+
+def reorder(sales, today, history=FORECAST_HISTORY_DAYS, cover=REORDER_COVER_DAYS):
+    # Units per day from an exponentially weighted average of the last `history` days, times the cover period, plus
+    # safety stock from the week-to-week spread. Returns (product ids, suggested units, forecast, this week, last week).
+    end = day_number(today) + 1; start = end - history
+    mask = (sales.day >= start) & (sales.day < end)
+    if not mask.any(): return None
+    size = int(sales.product[mask].max()) + 1
+    daily = np.bincount(sales.product[mask] * history + (sales.day[mask] - start), weights=sales.quantity[mask], minlength=size * history).reshape(size, history)
+    weights = 0.5 ** (np.arange(history)[::-1] / FORECAST_HALF_LIFE_DAYS); weights /= weights.sum()
+    weekly = daily[:, history % 7:].reshape(size, -1, 7).sum(axis=2)
+    forecast = daily @ weights * cover; suggested = np.ceil(forecast + REORDER_SERVICE_Z * weekly.std(axis=1) * np.sqrt(cover / 7))
+    products = np.flatnonzero(suggested > 0)
+    return products, suggested[products], forecast[products], weekly[products, -1], weekly[products, -2]
+
+def change(now, before): return f"{(now - before) / before:+.0%}" if before else "-"
+
+def trend_report(db, today=None, limit=TREND_WEEKS):
+    # Extra weeks are read before the first one shown so every row has a change and a moving average.
+    today = today or date.today(); starts, weekly = weekly_revenue(load(db), today, limit + TREND_AVERAGE_WEEKS - 1)
+    if not weekly.any(): return f"No completed orders in the {len(weekly)} weeks to {today:%Y-%m-%d}."
+    average = np.convolve(weekly, np.ones(TREND_AVERAGE_WEEKS) / TREND_AVERAGE_WEEKS)[:len(weekly)]
+    lines = [f"Weekly revenue, rolling 7-day windows to {today:%Y-%m-%d}:", f"{'Week from':<12}{'Revenue':>14}{'Change':>8}{f'{TREND_AVERAGE_WEEKS}-wk avg':>14}"]
+    shown = range(len(weekly) - limit, len(weekly))
+    lines += [f"{starts[i]:%Y-%m-%d}  {weekly[i]:>12,.2f}{change(weekly[i], weekly[i - 1]):>8}{average[i]:>14,.2f}" for i in shown]
+    return "\n".join(lines + [f"Last 7 days: ${weekly[-1]:,.2f} ({change(weekly[-1], weekly[-2])} on the week before)."])
+
+def seasonality_report(db, today=None, limit=10):
+    today = today or date.today(); result = seasonality(load(db), today)
+    if result is None: return f"Seasonality needs at least {SEASONALITY_MIN_MONTHS} months of completed orders."
+    products, index, units = result
+    if not len(products): return f"No product has sold {SEASONALITY_MIN_UNITS:,} units yet."
+    names, peak, low = db.get_names("products", products.tolist()), index.argmax(axis=1), index.argmin(axis=1)
+    upcoming = today.month % 12; strongest = np.argsort(-index.max(axis=1), kind="stable")[:limit]; coming = np.argsort(-index[:, upcoming], kind="stable")[:limit]
+    lines = ["Most seasonal products (month index, 1.0 = an average month):"]
+    lines += [f"- {names.get(int(products[i]), products[i])}: peaks in {MONTHS[peak[i]]} ({index[i, peak[i]]:.1f}x), lowest in {MONTHS[low[i]]} ({index[i, low[i]]:.1f}x)" for i in strongest]
+    lines += ["", f"Usually strongest in {MONTHS[upcoming]}:"] + [f"- {names.get(int(products[i]), products[i])} ({index[i, upcoming]:.1f}x)" for i in coming if index[i, upcoming] > 1]
+    return "\n".join(lines)
+
+def segments_report(db, today=None, limit=10):
+    today = today or date.today(); result = rfm(load(db), today)
+    if result is None: return "No completed orders yet."
+    customers, recency, frequency, monetary, segment = result
+    counts, revenue, days = np.bincount(segment, minlength=len(SEGMENTS)), np.bincount(segment, weights=monetary, minlength=len(SEGMENTS)), np.bincount(segment, weights=recency, minlength=len(SEGMENTS))
+    lines = [f"Customer segments (RFM) as of {today:%Y-%m-%d}:", f"{'Segment':<17}{'Customers':>10}{'Revenue':>9}{'Last order':>12}"]
+    lines += [f"{name:<17}{counts[i]:>10,}{revenue[i] / monetary.sum():>9.0%}{days[i] / counts[i]:>8.0f} days" for i, name in enumerate(SEGMENTS) if counts[i]]
+    # The valuable customers who have gone quiet are the ones to call.
+    at_risk = np.flatnonzero(segment == SEGMENTS.index("At risk")); at_risk = at_risk[np.argsort(-monetary[at_risk], kind="stable")[:limit]]
+    if len(at_risk):
+        names = db.get_names("customers", customers[at_risk].tolist())
+        lines += ["", "At risk, by value:"] + [f"- {names.get(int(customers[i]), customers[i])}: ${monetary[i]:,.2f} over {frequency[i]:,} orders, last {recency[i]:,} days ago" for i in at_risk]
+    return "\n".join(lines)
+
+def reorder_report(db, today=None, limit=10):
+    today = today or date.today(); result = reorder(load(db), today)
+    if result is None: return f"No completed orders in the {FORECAST_HISTORY_DAYS} days to {today:%Y-%m-%d}."
+    products, suggested, forecast, this_week, last_week = result; top = np.argsort(-suggested, kind="stable")[:limit]
+    names = db.get_names("products", products[top].tolist())
+    lines = [f"Suggested purchases for the next {REORDER_COVER_DAYS} days (forecast demand plus safety stock):"]
+    lines += [f"- {names.get(int(products[i]), products[i])}: {suggested[i]:,.0f} units (forecast {forecast[i]:,.0f}; last 7 days {this_week[i]:,.0f}, {change(this_week[i], last_week[i])})" for i in top]
+    return "\n".join(lines)
+
+REPORTS = {"Weekly revenue": trend_report, "Seasonality": seasonality_report, "Customer segments": segments_report, "Reorder suggestions": reorder_report}
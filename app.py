@@ -4,15 +4,27 @@ import customtkinter as ctk
 from tkinter import filedialog, messagebox
 from PIL import Image, ImageOps, ImageDraw
 import os
-from database import Database
-from datetime import datetime
-import re
+import sys
+import subprocess
+import multiprocessing
+from database import Database, SEARCH_LIMIT, ORDER_PAGE_SIZE, STATEMENT_PAGE_SIZE, DB_PROFILES, EXPORT_QUERIES
+from workers import DataAccessPool, SearchDispatcher, BackgroundTask, SEARCH_DEBOUNCE_MS
+from catalog import ProductCatalog
+from invoices import InvoiceRenderer, SMTPPool, INVOICE_DIR, email_invoices
+import querystats
+import intents
+import analytics
+import uiprofiler
+import sync
+from datetime import datetime, timedelta
 
 # --- Constants ---
 APP_NAME = "AgroFlow"
 WIDTH = 1366
 HEIGHT = 768
 SIDEBAR_WIDTH = 240
+QUERY_STATS_ROWS = 12
+QUERY_STATS_REFRESH_MS = 1000
 
 # --- Asset Paths ---
 ASSETS_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "assets")
@@ -26,6 +38,22 @@ ICON_INVENTORY_PATH = os.path.join(ASSETS_PATH, "icons", "inventory.png")
 ICON_REPORTS_PATH = os.path.join(ASSETS_PATH, "icons", "reports.png")
 ICON_SETTINGS_PATH = os.path.join(ASSETS_PATH, "icons", "settings.png")
 
+# Decoded once per process and shared by every widget that shows the same asset; failures are cached as None.
+_image_cache = {}
+def load_image(path, size, circular=False):
+    key = (path, size, circular)
+    if key not in _image_cache:
+        try:
+            image = Image.open(path)
+            if circular: image = image.resize(size, Image.Resampling.LANCZOS); mask = Image.new('L', size, 0); ImageDraw.Draw(mask).ellipse((0, 0) + size, fill=255); image.putalpha(mask)
+            _image_cache[key] = ctk.CTkImage(image, size=size)
+        except Exception as e: print(f"Warning: Could not load image '{path}'. Error: {e}"); _image_cache[key] = None
+    return _image_cache[key]
+
+def open_file(path):
+    if sys.platform == "win32": os.startfile(path)
+    else: subprocess.Popen(["open" if sys.platform == "darwin" else "xdg-open", path])
+
 class App(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -38,17 +66,25 @@ class App(ctk.CTk):
             self.THEME_NAME = "System"
 
         self.db = Database()
+        if self.db.setting("query_stats") and not querystats.is_enabled(): querystats.enable(self.db.setting("slow_query_ms")); self.db.close(); self.db = Database()
+        self.profiler = uiprofiler.from_environment() or (uiprofiler.UIProfiler() if self.db.setting("ui_profile") else None)
+        if self.profiler: self.profiler.install(sys.modules[__name__]); self.profiler.start_watchdog(self)
+        self.data = DataAccessPool(self.db.db_file, self)
+        self.search = SearchDispatcher(self.data)
+        self.data.write(sync.compact, errback=lambda e: print(f"Warning: Could not fold the sync change log. Error: {e}"))
         ctk.set_appearance_mode("Light")
         self.title(APP_NAME)
         self.geometry(f"{WIDTH}x{HEIGHT}")
         self.minsize(1280, 720)
         
-        self.current_user = None
+        self.current_user, self.catalog = None, None
+        self.invoices, self.mailer = InvoiceRenderer(), None
         self._main_ui_created = False
         self.user_menu = None
         self.login_frame = LoginFrame(self)
         self.login_frame.pack(expand=True, fill="both")
         self.bind("<Button-1>", self.handle_global_click)
+        self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
     def show_main_app(self, user):
         self.current_user = user
@@ -57,54 +93,37 @@ class App(ctk.CTk):
         if not self._main_ui_created:
             self.grid_columnconfigure(1, weight=1); self.grid_rowconfigure(0, weight=1)
             self.sidebar_frame = ctk.CTkFrame(self, width=SIDEBAR_WIDTH, corner_radius=0)
-            self.sidebar_frame.grid(row=0, column=0, sticky="nsw")
             self.main_frame = ctk.CTkFrame(self, corner_radius=0, fg_color="transparent")
-            self.main_frame.grid(row=0, column=1, sticky="nsew", padx=20, pady=20)
             self.main_frame.grid_columnconfigure(0, weight=1); self.main_frame.grid_rowconfigure(0, weight=1)
             
-            # Create all frames
-            self.frames = {}
-            frame_classes = [DashboardFrame, OrderFrame, AllOrdersFrame, CustomersFrame, InventoryFrame, ReportsFrame, SettingsFrame, AccountManagementFrame]
-            for F in frame_classes:
-                page_name = F.__name__
-                frame = F(self.main_frame, self, self.db)
-                self.frames[page_name] = frame
-                frame.grid(row=0, column=0, sticky="nsew")
-
+            # Frames are built on first visit and kept (across logouts too); refresh_data resets them on every show
+            self.frames, self.frame_classes = {}, {F.__name__: F for F in [DashboardFrame, OrderFrame, AllOrdersFrame, CustomersFrame, InventoryFrame, ReportsFrame, SettingsFrame, AccountManagementFrame]}
+            self._create_sidebar()
             self._main_ui_created = True
         
-        # Always recreate sidebar in case user info changed
-        self._create_sidebar()
+        self.sidebar_frame.grid(row=0, column=0, sticky="nsw"); self.main_frame.grid(row=0, column=1, sticky="nsew", padx=20, pady=20)
+        self.profile_button.configure(text=user['username'])
         self.select_frame("DashboardFrame")
         self.deiconify()
 
     def _create_sidebar(self):
-        for widget in self.sidebar_frame.winfo_children(): widget.destroy()
-        
         ctk.CTkLabel(self.sidebar_frame, text=APP_NAME, font=ctk.CTkFont(family="Segoe UI", size=24, weight="bold")).pack(pady=(20, 20), padx=20)
         
         button_info = [("Dashboard", ICON_DASHBOARD_PATH, "DashboardFrame"), ("New Order", ICON_ORDERS_PATH, "OrderFrame"), ("All Orders", ICON_ALL_ORDERS_PATH, "AllOrdersFrame"), ("Customers", ICON_CUSTOMERS_PATH, "CustomersFrame"), ("Inventory", ICON_INVENTORY_PATH, "InventoryFrame"), ("Reports", ICON_REPORTS_PATH, "ReportsFrame")]
         self.nav_buttons = {}
         for text, icon_path, frame_name in button_info:
-            try: icon = ctk.CTkImage(Image.open(icon_path), size=(20, 20))
-            except: icon = None
-            button = ctk.CTkButton(self.sidebar_frame, text=text, image=icon, anchor="w", height=40, border_spacing=10, fg_color="transparent", hover=False, command=lambda fn=frame_name: self.select_frame(fn))
+            button = ctk.CTkButton(self.sidebar_frame, text=text, image=load_image(icon_path, (20, 20)), anchor="w", height=40, border_spacing=10, fg_color="transparent", hover=False, command=lambda fn=frame_name: self.select_frame(fn))
             button.pack(fill="x", padx=10, pady=2)
             self.nav_buttons[frame_name] = button
             ctk.CTkFrame(self.sidebar_frame, height=1, fg_color="#E0E0E0").pack(fill="x", padx=20)
             
         bottom_frame = ctk.CTkFrame(self.sidebar_frame, fg_color="transparent"); bottom_frame.pack(side="bottom", fill="x", padx=10, pady=10); bottom_frame.grid_columnconfigure(1, weight=1)
-        self.profile_button = ctk.CTkButton(bottom_frame, text=self.current_user['username'], height=32, fg_color="transparent", hover=False, command=self.show_user_menu)
-        try:
-            profile_image = Image.open(ICON_PROFILE_PATH).resize((24, 24), Image.Resampling.LANCZOS); mask = Image.new('L', (24, 24), 0); draw = ImageDraw.Draw(mask); draw.ellipse((0, 0, 24, 24), fill=255); profile_image.putalpha(mask)
-            self.profile_button.configure(image=ctk.CTkImage(profile_image, size=(24, 24)))
-        except Exception as e: print(f"Warning: Profile icon missing '{ICON_PROFILE_PATH}'. Error: {e}")
+        self.profile_button = ctk.CTkButton(bottom_frame, text=self.current_user['username'], image=load_image(ICON_PROFILE_PATH, (24, 24), circular=True), height=32, fg_color="transparent", hover=False, command=self.show_user_menu)
         self.profile_button.grid(row=0, column=1, sticky="ew", padx=(10,0))
-        try:
-            settings_icon = ctk.CTkImage(Image.open(ICON_SETTINGS_PATH), size=(20, 20))
-            self.settings_button = ctk.CTkButton(bottom_frame, text="", image=settings_icon, width=32, height=32, fg_color="transparent", hover=False, command=lambda: self.select_frame("SettingsFrame"))
-            self.settings_button.grid(row=0, column=0)
-        except: self.settings_button = ctk.CTkButton(bottom_frame, text="Settings", command=lambda: self.select_frame("SettingsFrame")); self.settings_button.grid(row=0, column=0)
+        settings_icon = load_image(ICON_SETTINGS_PATH, (20, 20))
+        if settings_icon: self.settings_button = ctk.CTkButton(bottom_frame, text="", image=settings_icon, width=32, height=32, fg_color="transparent", hover=False, command=lambda: self.select_frame("SettingsFrame"))
+        else: self.settings_button = ctk.CTkButton(bottom_frame, text="Settings", command=lambda: self.select_frame("SettingsFrame"))
+        self.settings_button.grid(row=0, column=0)
 
     def show_user_menu(self):
         if self.user_menu and self.user_menu.winfo_exists(): self.user_menu.destroy(); self.user_menu = None; return
@@ -129,23 +148,64 @@ class App(ctk.CTk):
         if hasattr(self, 'settings_button'): self.settings_button.configure(fg_color=hover_color if page_name == "SettingsFrame" else transparent_color)
         if page_name not in self.nav_buttons and page_name != "SettingsFrame": [btn.configure(fg_color=transparent_color) for btn in self.nav_buttons.values()]
         for frame in self.frames.values(): frame.grid_remove()
+        if page_name not in self.frames: self.frames[page_name] = self.frame_classes[page_name](self.main_frame, self, self.db); self.frames[page_name].grid(row=0, column=0, sticky="nsew")
         frame_to_show = self.frames[page_name]; frame_to_show.grid()
         if hasattr(frame_to_show, 'refresh_data'): frame_to_show.refresh_data()
     
+    def load_catalog(self, callback):
+        # Built once on a pool reader; InventoryFrame keeps it in step with its edits through refresh_catalog().
+        if self.catalog is not None: callback(); return
+        self.data.read(lambda db: ProductCatalog(db.get_product_rows()), callback=lambda catalog: (setattr(self, "catalog", self.catalog or catalog), callback()))
+
+    def refresh_catalog(self):
+        # The diff runs on a reader; only the changed products are applied on the Tk thread.
+        if self.catalog is None: return
+        catalog = self.catalog; self.data.read(lambda db: catalog.diff(db.get_product_rows()), callback=catalog.apply)
+
+    def print_invoice(self, order_id):
+        # Rendered by the invoice processes from a pool reader; the PDF opens in the system viewer for printing.
+        def show(result):
+            path = result[0].get(order_id)
+            if not path: messagebox.showerror("Invoice Error", f"Order #{order_id} is not completed."); return
+            try: open_file(os.path.abspath(path))
+            except OSError: messagebox.showinfo("Invoice Saved", f"Invoice for Order #{order_id} saved to {os.path.abspath(path)}.")
+        self.data.read(lambda db: self.invoices.render_orders(db, [order_id]), callback=show, errback=lambda e: messagebox.showerror("Invoice Error", f"Could not render the invoice for Order #{order_id}: {e}"))
+
+    def email_invoice(self, order_id):
+        try: mailer = self.get_mailer()
+        except ValueError as e: messagebox.showerror("Email Invoice", str(e)); return
+        self.data.read(lambda db: email_invoices(db, self.invoices, mailer, [order_id]), callback=lambda result: messagebox.showinfo("Email Invoice", f"Invoice for Order #{order_id} sent.") if result[0] else messagebox.showerror("Email Invoice", f"Order #{order_id} has no customer email address."), errback=lambda e: messagebox.showerror("Email Invoice", f"Could not email the invoice for Order #{order_id}: {e}"))
+
+    def save_settings(self, changes, on_saved=None):
+        # One transaction on the writer. Only keys whose value actually changed come back, on the Tk thread.
+        self.data.write("set_settings", changes, callback=lambda changed: self.on_settings_changed(changed, on_saved), errback=lambda e: messagebox.showerror("Settings", f"Could not save settings: {e}"))
+    def on_settings_changed(self, changed, on_saved=None):
+        if any(key.startswith("smtp_") for key in changed): self.close_mailer()
+        if on_saved: on_saved(changed)
+
+    def get_mailer(self):
+        # One pooled SMTP client per saved configuration; SettingsFrame drops it when the SMTP settings change.
+        if self.mailer is None: self.mailer = SMTPPool.from_settings(self.db)
+        return self.mailer
+    def close_mailer(self):
+        if self.mailer is not None: self.mailer.close(); self.mailer = None
+
+    def on_closing(self): self.data.close(); self.invoices.shutdown(); self.close_mailer(); self.destroy()
+
     def logout(self):
         if self.user_menu: self.user_menu.destroy()
-        self.current_user = None
-        for widget in self.winfo_children():
-            if widget is not self.login_frame: widget.destroy()
-        self._main_ui_created = False; self.login_frame.pack(expand=True, fill="both"); self.login_frame.clear_fields()
+        self.current_user, self.user_menu = None, None
+        # Keep the sidebar and any frames already built so the next login does not pay for them again
+        self.sidebar_frame.grid_remove(); self.main_frame.grid_remove(); self.login_frame.pack(expand=True, fill="both"); self.login_frame.clear_fields()
         self.withdraw(); self.deiconify()
 
 class LoginFrame(ctk.CTkFrame):
     def __init__(self, master):
         super().__init__(master); self.master = master
         content_frame = ctk.CTkFrame(self, width=360, corner_radius=15); content_frame.place(relx=0.5, rely=0.5, anchor="center")
-        try: ctk.CTkLabel(content_frame, image=ctk.CTkImage(Image.open(LOGO_PATH), size=(180, 60)), text="").pack(pady=(40, 20))
-        except: ctk.CTkLabel(content_frame, text=APP_NAME, font=ctk.CTkFont(size=30, weight="bold")).pack(pady=(40, 20))
+        logo = load_image(LOGO_PATH, (180, 60))
+        if logo: ctk.CTkLabel(content_frame, image=logo, text="").pack(pady=(40, 20))
+        else: ctk.CTkLabel(content_frame, text=APP_NAME, font=ctk.CTkFont(size=30, weight="bold")).pack(pady=(40, 20))
         self.username_entry = ctk.CTkEntry(content_frame, width=250, placeholder_text="Username"); self.username_entry.pack(pady=10, padx=30); self.username_entry.bind("<Return>", self.login_event)
         self.password_entry = ctk.CTkEntry(content_frame, width=250, placeholder_text="Password", show="*"); self.password_entry.pack(pady=10, padx=30); self.password_entry.bind("<Return>", self.login_event)
         ctk.CTkButton(content_frame, text="Login", width=250, command=self.login_event).pack(pady=20, padx=30)
@@ -178,74 +238,134 @@ class Dropdown(ctk.CTkToplevel):
         for result in results: ctk.CTkButton(scroll_frame, text=result['name'], anchor="w", fg_color="transparent", hover=False, command=lambda r=result: self.select(r)).pack(fill="x")
         self.bind("<FocusOut>", lambda e: self.destroy()); self.focus_set()
     def select(self, result): self.callback(result); self.destroy()
+class ProgressDialog(ctk.CTkToplevel):
+    def __init__(self, master, title, on_cancel):
+        super().__init__(master); self.title(title); self.geometry("380x150"); self.resizable(False, False); self.transient(master); self.protocol("WM_DELETE_WINDOW", on_cancel)
+        self.status_label = ctk.CTkLabel(self, text="Starting..."); self.status_label.pack(pady=(20, 10), padx=20)
+        self.progress_bar = ctk.CTkProgressBar(self, mode="indeterminate"); self.progress_bar.pack(fill="x", padx=20); self.progress_bar.start()
+        self.cancel_button = ctk.CTkButton(self, text="Cancel", fg_color="#D32F2F", hover_color="#B71C1C", command=on_cancel); self.cancel_button.pack(pady=15)
+    def set_status(self, text): self.status_label.configure(text=text)
+    def close(self): self.progress_bar.stop(); self.destroy()
+class VirtualList(ctk.CTkFrame):
+    # Recycling list: keeps only enough row widgets to fill the viewport and rebinds them to items on scroll.
+    def __init__(self, master, create_row, bind_row, row_height=36, label_text=None, on_end_reached=None, **kwargs):
+        super().__init__(master, **kwargs); self.create_row, self.bind_row, self.row_height, self.on_end_reached = create_row, bind_row, row_height, on_end_reached; self.items, self.rows, self.first = [], [], 0
+        self.grid_columnconfigure(0, weight=1); self.grid_rowconfigure(1, weight=1)
+        if label_text: ctk.CTkLabel(self, text=label_text, font=ctk.CTkFont(weight="bold")).grid(row=0, column=0, columnspan=2, sticky="ew", pady=(5, 0))
+        self.viewport = ctk.CTkFrame(self, fg_color="transparent"); self.viewport.grid(row=1, column=0, sticky="nsew", padx=(5, 0), pady=5); self.viewport.grid_propagate(False); self.viewport.grid_columnconfigure(0, weight=1)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.on_scrollbar); self.scrollbar.grid(row=1, column=1, sticky="ns", pady=5)
+        self.viewport.bind("<Configure>", self.on_resize)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"): self.bind_all(sequence, self.on_mouse_wheel, add="+")
+    def set_items(self, items): self.items = list(items); self.first = 0; self.render()
+    def append_items(self, items): self.items.extend(items); self.render()
+    def visible_count(self): return max(1, self.viewport.winfo_height() // self.row_height)
+    def on_resize(self, event=None):
+        while len(self.rows) < self.visible_count() + 1:
+            row = self.create_row(self.viewport); row.grid(row=len(self.rows), column=0, sticky="ew"); self.viewport.grid_rowconfigure(len(self.rows), minsize=self.row_height); self.rows.append(row)
+        self.render()
+    def scroll_to(self, first): self.first = max(0, min(int(first), len(self.items) - self.visible_count())); self.render()
+    def on_scrollbar(self, action, value, unit=None):
+        if action == "moveto": self.scroll_to(float(value) * len(self.items))
+        else: self.scroll_to(self.first + int(value) * (self.visible_count() if unit == "pages" else 1))
+    def on_mouse_wheel(self, event):
+        if not str(event.widget).startswith(str(self.viewport)): return
+        if event.num in (4, 5): step = -1 if event.num == 4 else 1
+        else: step = -int(event.delta / 120) if sys.platform.startswith("win") else -event.delta
+        self.scroll_to(self.first + step)
+    def render(self):
+        for i, row in enumerate(self.rows):
+            index = self.first + i
+            if index < len(self.items): self.bind_row(row, self.items[index]); row.grid()
+            else: row.grid_remove()
+        total = len(self.items); self.scrollbar.set(self.first / total, min(1.0, (self.first + self.visible_count()) / total)) if total else self.scrollbar.set(0.0, 1.0)
+        if self.on_end_reached and total and self.first + 2 * self.visible_count() >= total: self.on_end_reached()
 class OrderFrame(ctk.CTkFrame):
     def __init__(self, master, app_instance, db):
-        super().__init__(master, fg_color="transparent"); self.app, self.db = app_instance, db; self.cart, self.current_customer_id, self.last_submitted_order_id, self.dropdown = {}, None, None, None
+        super().__init__(master, fg_color="transparent"); self.app, self.db = app_instance, db; self.cart, self.current_customer_id, self.last_submitted_order_id, self.dropdown = {}, None, None, None; self.cart_rows, self.cart_total, self.last_order_status, self.product_search_job = {}, 0.0, None, None
         self.grid_columnconfigure(0, weight=2); self.grid_columnconfigure(1, weight=1); self.grid_rowconfigure(0, weight=1)
-        left_panel = ctk.CTkFrame(self); left_panel.grid(row=0, column=0, sticky="nsew", padx=(0, 10)); left_panel.grid_rowconfigure(1, weight=1); left_panel.grid_columnconfigure(0, weight=1)
-        selection_area = ctk.CTkScrollableFrame(left_panel, label_text="Order Details"); selection_area.grid(row=0, column=0, sticky="nsew", pady=10); selection_area.grid_columnconfigure(0, weight=1)
+        left_panel = ctk.CTkFrame(self); left_panel.grid(row=0, column=0, sticky="nsew", padx=(0, 10)); left_panel.grid_rowconfigure(0, weight=1); left_panel.grid_columnconfigure(0, weight=1)
+        selection_area = ctk.CTkFrame(left_panel, fg_color="transparent"); selection_area.grid(row=0, column=0, sticky="nsew", pady=10); selection_area.grid_columnconfigure(0, weight=1)
+        ctk.CTkLabel(selection_area, text="Order Details", font=ctk.CTkFont(weight="bold")).pack(pady=(0, 5))
         ctk.CTkLabel(selection_area, text="Customer").pack(anchor="w", padx=5); self.customer_entry = ctk.CTkEntry(selection_area, placeholder_text="Start typing to search..."); self.customer_entry.pack(fill="x", padx=5, pady=(0,10)); self.customer_entry.bind("<KeyRelease>", self.filter_customers); self.customer_entry.bind("<FocusOut>", lambda e: self.after(150, self.close_dropdown))
         ctk.CTkLabel(selection_area, text="Products").pack(anchor="w", padx=5); self.product_search_entry = ctk.CTkEntry(selection_area, placeholder_text="Search for products..."); self.product_search_entry.pack(fill="x", padx=5, pady=(0,10)); self.product_search_entry.bind("<KeyRelease>", self.filter_products)
-        self.product_list_frame = ctk.CTkFrame(selection_area, fg_color="transparent"); self.product_list_frame.pack(expand=True, fill="both")
+        self.product_list = VirtualList(selection_area, self.create_product_row, self.bind_product_row, fg_color="transparent"); self.product_list.pack(expand=True, fill="both")
         right_panel = ctk.CTkFrame(self); right_panel.grid(row=0, column=1, sticky="nsew", padx=(10, 0)); right_panel.grid_rowconfigure(1, weight=1); right_panel.grid_columnconfigure(0, weight=1)
         ctk.CTkLabel(right_panel, text="Current Order", font=ctk.CTkFont(size=18, weight="bold")).grid(row=0, column=0, pady=10, padx=10)
-        self.cart_items_frame = ctk.CTkScrollableFrame(right_panel); self.cart_items_frame.grid(row=1, column=0, sticky="nsew", padx=10)
-        actions_frame = ctk.CTkFrame(right_panel, fg_color="transparent"); actions_frame.grid(row=2, column=0, sticky="ew", padx=10, pady=10); actions_frame.grid_columnconfigure((0, 1), weight=1)
+        self.cart_items_frame = ctk.CTkScrollableFrame(right_panel); self.cart_items_frame.grid(row=1, column=0, sticky="nsew", padx=10); self.cart_empty_label = ctk.CTkLabel(self.cart_items_frame, text="Cart is empty")
+        self.cart_total_label = ctk.CTkLabel(right_panel, text="", font=ctk.CTkFont(weight="bold")); self.cart_total_label.grid(row=2, column=0, sticky="e", padx=15, pady=(10, 0))
+        actions_frame = ctk.CTkFrame(right_panel, fg_color="transparent"); actions_frame.grid(row=3, column=0, sticky="ew", padx=10, pady=10); actions_frame.grid_columnconfigure((0, 1), weight=1)
         self.submit_order_button = ctk.CTkButton(actions_frame, text="Submit Order", state="disabled", command=self.submit_order); self.submit_order_button.grid(row=0, column=0, sticky="ew", padx=(0, 5))
         self.send_vendor_button = ctk.CTkButton(actions_frame, text="Send to Vendor", state="disabled", command=self.send_to_vendor); self.send_vendor_button.grid(row=0, column=1, sticky="ew", padx=(5, 0))
         self.print_invoice_button = ctk.CTkButton(actions_frame, text="Print Invoice", state="disabled", command=self.print_invoice); self.print_invoice_button.grid(row=1, column=0, sticky="ew", padx=(0, 5), pady=(10,0))
         self.email_invoice_button = ctk.CTkButton(actions_frame, text="Email Invoice", state="disabled", command=self.email_invoice); self.email_invoice_button.grid(row=1, column=1, sticky="ew", padx=(5, 0), pady=(10,0))
     def filter_customers(self, event=None):
-        self.close_dropdown(); search_term = self.customer_entry.get()
-        if not search_term: return
-        customers = self.db.get_customers(search_term)
-        if customers: self.dropdown = Dropdown(self.customer_entry, customers, self.on_customer_select)
+        search_term = self.customer_entry.get()
+        if not search_term: self.close_dropdown(); self.app.search.cancel(self.customer_entry); return
+        self.app.search.submit(self.customer_entry, "get_customers", (search_term, SEARCH_LIMIT), self.show_customer_results)
+    def show_customer_results(self, customers):
+        self.close_dropdown()
+        if customers and self.customer_entry.get(): self.dropdown = Dropdown(self.customer_entry, customers, self.on_customer_select)
     def close_dropdown(self):
         if self.dropdown and self.dropdown.winfo_exists(): self.dropdown.destroy(); self.dropdown = None
     def on_customer_select(self, customer): self.current_customer_id = customer['id']; self.customer_entry.delete(0, "end"); self.customer_entry.insert(0, customer['name']); self.close_dropdown(); self.update_actions_state()
-    def update_actions_state(self):
-        self.submit_order_button.configure(state="normal" if self.cart and self.current_customer_id else "disabled"); can_invoice = False
-        if self.last_submitted_order_id:
-             order_info, _ = self.db.get_full_order_details(self.last_submitted_order_id)
-             if order_info and order_info['status'] == 'Completed': can_invoice = True
+    def update_actions_state(self, refresh_status=False):
+        self.submit_order_button.configure(state="normal" if self.cart and self.current_customer_id else "disabled")
+        if refresh_status and self.last_submitted_order_id: self.app.data.read("get_order_status", self.last_submitted_order_id, callback=self.on_order_status)
+        can_invoice = self.last_order_status == 'Completed'
         self.print_invoice_button.configure(state="normal" if can_invoice else "disabled"); self.email_invoice_button.configure(state="normal" if can_invoice else "disabled")
-    def submit_order(self): self.last_submitted_order_id = self.db.create_order(self.current_customer_id, self.cart); messagebox.showinfo("Success", f"Order #{self.last_submitted_order_id} has been created."); self.send_vendor_button.configure(state="normal", text=f"Send Order #{self.last_submitted_order_id}"); self.submit_order_button.configure(state="disabled"); self.reset_order_form()
+    def on_order_status(self, status): self.last_order_status = status; self.update_actions_state()
+    def submit_order(self): self.submit_order_button.configure(state="disabled"); self.app.data.write("create_order", self.current_customer_id, dict(self.cart), callback=self.on_order_created, errback=lambda e: (messagebox.showerror("Error", f"Could not create the order: {e}"), self.update_actions_state()))
+    def on_order_created(self, order_id): self.last_submitted_order_id = order_id; self.last_order_status = "Pending Vendor"; messagebox.showinfo("Success", f"Order #{self.last_submitted_order_id} has been created."); self.send_vendor_button.configure(state="normal", text=f"Send Order #{self.last_submitted_order_id}"); self.submit_order_button.configure(state="disabled"); self.reset_order_form()
     def reset_order_form(self): self.cart = {}; self.customer_entry.delete(0, "end"); self.current_customer_id = None; self.update_cart_display()
     def send_to_vendor(self):
         if self.last_submitted_order_id:
-            win = VendorFulfillmentWindow(self, self.db, self.last_submitted_order_id); self.wait_window(win)
-            self.send_vendor_button.configure(state="disabled", text="Send to Vendor"); self.update_actions_state()
-    def print_invoice(self): messagebox.showinfo("Not Implemented", f"This would print a PDF for Order #{self.last_submitted_order_id}.")
-    def email_invoice(self): messagebox.showinfo("Not Implemented", f"This would email the invoice for Order #{self.last_submitted_order_id}.")
-    def refresh_data(self): self.filter_products(); self.reset_order_form(); self.last_submitted_order_id = None; self.update_actions_state()
+            win = VendorFulfillmentWindow(self, self.app.data, self.last_submitted_order_id); self.wait_window(win)
+            self.send_vendor_button.configure(state="disabled", text="Send to Vendor"); self.update_actions_state(refresh_status=True)
+    def print_invoice(self): self.app.print_invoice(self.last_submitted_order_id)
+    def email_invoice(self): self.app.email_invoice(self.last_submitted_order_id)
+    def refresh_data(self): self.last_submitted_order_id, self.last_order_status = None, None; self.app.load_catalog(self.filter_products); self.reset_order_form()
     def filter_products(self, event=None):
-        products = self.db.get_products(self.product_search_entry.get()); [widget.destroy() for widget in self.product_list_frame.winfo_children()]
-        for product in products:
-            frame = ctk.CTkFrame(self.product_list_frame); frame.pack(fill="x", pady=2)
-            ctk.CTkLabel(frame, text=f"{product['name']} (${product['master_price']:.2f})").pack(side="left", padx=5)
-            ctk.CTkButton(frame, text="Add", width=60, command=lambda p=product: self.add_to_cart(p)).pack(side="right", padx=5)
-    def add_to_cart(self, product):
-        prod_id = product['id']
-        if prod_id in self.cart: self.cart[prod_id]['quantity'] += 1
-        else: self.cart[prod_id] = {'name': product['name'], 'price': product['master_price'], 'quantity': 1}
-        self.update_cart_display()
+        # Searches the in-memory catalog, so typing here never waits on SQLite. While typing, only the prefix matches (a bisect) are
+        # shown at once; the substring scan runs once typing pauses, like the dispatcher's debounced searches.
+        if self.product_search_job: self.after_cancel(self.product_search_job); self.product_search_job = None
+        catalog, term = self.app.catalog, self.product_search_entry.get()
+        if catalog is None: return
+        if event is None or not term: self.product_list.set_items(catalog.search(term, SEARCH_LIMIT if term else None)); return
+        found = catalog.search(term, SEARCH_LIMIT, substrings=False); self.product_list.set_items(found)
+        if len(found) < SEARCH_LIMIT: self.product_search_job = self.after(SEARCH_DEBOUNCE_MS, self.filter_products)
+    def create_product_row(self, parent):
+        frame = ctk.CTkFrame(parent); frame.label = ctk.CTkLabel(frame, text=""); frame.label.pack(side="left", padx=5)
+        frame.button = ctk.CTkButton(frame, text="Add", width=60); frame.button.pack(side="right", padx=5); return frame
+    def bind_product_row(self, frame, prod_id): catalog = self.app.catalog; frame.label.configure(text=f"{catalog.name(prod_id)} (${catalog.price(prod_id):.2f})"); frame.button.configure(command=lambda p=prod_id: self.add_to_cart(p))
+    def add_to_cart(self, prod_id):
+        # The cart is {product id: quantity}; names and prices come from the catalog.
+        self.cart[prod_id] = self.cart.get(prod_id, 0) + 1; self.cart_total += self.app.catalog.price(prod_id); self.update_cart_row(prod_id)
     def remove_from_cart(self, prod_id):
         if prod_id in self.cart:
-            self.cart[prod_id]['quantity'] -= 1
-            if self.cart[prod_id]['quantity'] == 0: del self.cart[prod_id]
-        self.update_cart_display()
-    def update_cart_display(self):
-        [widget.destroy() for widget in self.cart_items_frame.winfo_children()]
-        if not self.cart: ctk.CTkLabel(self.cart_items_frame, text="Cart is empty").pack(pady=20)
+            self.cart[prod_id] -= 1; self.cart_total -= self.app.catalog.price(prod_id) or 0.0
+            if self.cart[prod_id] == 0: del self.cart[prod_id]
+        self.update_cart_row(prod_id)
+    def update_cart_row(self, prod_id):
+        quantity, row = self.cart.get(prod_id), self.cart_rows.get(prod_id)
+        if quantity is None:
+            if row: row.destroy(); del self.cart_rows[prod_id]
+        elif row: row.label.configure(text=f"{self.app.catalog.name(prod_id)} (x{quantity})")
         else:
-            for prod_id, data in self.cart.items():
-                frame = ctk.CTkFrame(self.cart_items_frame); frame.pack(fill="x", pady=2, padx=2)
-                ctk.CTkLabel(frame, text=f"{data['name']} (x{data['quantity']})").pack(side="left", padx=5)
-                ctk.CTkButton(frame, text="-", width=30, fg_color="#D32F2F", hover_color="#B71C1C", command=lambda p=prod_id: self.remove_from_cart(p)).pack(side="right", padx=5)
-        self.update_actions_state()
+            row = ctk.CTkFrame(self.cart_items_frame); row.pack(fill="x", pady=2, padx=2); self.cart_rows[prod_id] = row
+            row.label = ctk.CTkLabel(row, text=f"{self.app.catalog.name(prod_id)} (x{quantity})"); row.label.pack(side="left", padx=5)
+            ctk.CTkButton(row, text="-", width=30, fg_color="#D32F2F", hover_color="#B71C1C", command=lambda p=prod_id: self.remove_from_cart(p)).pack(side="right", padx=5)
+        self.update_cart_summary()
+    def update_cart_summary(self):
+        if not self.cart: self.cart_total = 0.0; self.cart_empty_label.pack(pady=20)
+        else: self.cart_empty_label.pack_forget()
+        self.cart_total_label.configure(text=f"Estimated Total: ${self.cart_total:.2f}"); self.update_actions_state()
+    def update_cart_display(self):
+        [row.destroy() for row in self.cart_rows.values()]; self.cart_rows = {}; self.cart_total = sum((self.app.catalog.price(prod_id) or 0.0) * quantity for prod_id, quantity in self.cart.items()) if self.cart else 0.0
+        for prod_id in self.cart: self.update_cart_row(prod_id)
+        self.update_cart_summary()
 class ReportsFrame(ctk.CTkFrame):
     def __init__(self, master, app_instance, db):
-        super().__init__(master, fg_color="transparent"); self.app, self.db = app_instance, db; self.grid_columnconfigure((0, 1), weight=1); self.grid_rowconfigure(0, weight=1)
+        super().__init__(master, fg_color="transparent"); self.app, self.db, self.answers = app_instance, db, intents.AnswerCache(db); self.grid_columnconfigure((0, 1), weight=1); self.grid_rowconfigure(0, weight=1)
         chat_container = ctk.CTkFrame(self, border_width=1); chat_container.grid(row=0, column=0, sticky="nsew", padx=(10,5), pady=10); chat_container.grid_rowconfigure(1, weight=1); chat_container.grid_columnconfigure(0, weight=1)
         ctk.CTkLabel(chat_container, text="AI Assistant", font=ctk.CTkFont(size=16, weight="bold")).grid(row=0, column=0, padx=10, pady=10, sticky="w")
         self.chat_frame = ctk.CTkScrollableFrame(chat_container); self.chat_frame.grid(row=1, column=0, sticky="nsew", padx=5, pady=5)
@@ -256,7 +376,18 @@ class ReportsFrame(ctk.CTkFrame):
         ctk.CTkLabel(manual_container, text="Manual Reports", font=ctk.CTkFont(size=16, weight="bold")).pack(pady=10)
         ctk.CTkLabel(manual_container, text="Select Customer:").pack(padx=10, anchor="w")
         self.report_customer_combo = ctk.CTkComboBox(manual_container, values=[], command=self.generate_report); self.report_customer_combo.pack(fill="x", padx=10, pady=5)
-        self.report_display = ctk.CTkTextbox(manual_container, state="disabled", wrap="word"); self.report_display.pack(expand=True, fill="both", padx=10, pady=10)
+        range_frame = ctk.CTkFrame(manual_container, fg_color="transparent"); range_frame.pack(fill="x", padx=10, pady=(0, 5)); self.report_seq = 0
+        ctk.CTkLabel(range_frame, text="From:").pack(side="left"); self.report_from_entry = ctk.CTkEntry(range_frame, placeholder_text="YYYY-MM-DD", width=110); self.report_from_entry.pack(side="left", padx=(5, 10))
+        ctk.CTkLabel(range_frame, text="To:").pack(side="left"); self.report_to_entry = ctk.CTkEntry(range_frame, placeholder_text="YYYY-MM-DD", width=110); self.report_to_entry.pack(side="left", padx=5)
+        ctk.CTkButton(range_frame, text="Run", width=70, command=lambda: self.generate_report(self.report_customer_combo.get())).pack(side="right")
+        for entry in (self.report_from_entry, self.report_to_entry): entry.bind("<Return>", lambda event: self.generate_report(self.report_customer_combo.get()))
+        analytics_frame = ctk.CTkFrame(manual_container, fg_color="transparent"); analytics_frame.pack(fill="x", padx=10, pady=(5, 0)); ctk.CTkLabel(analytics_frame, text="Analytics:").pack(side="left")
+        self.analytics_menu = ctk.CTkOptionMenu(analytics_frame, values=list(analytics.REPORTS)); self.analytics_menu.pack(side="left", expand=True, fill="x", padx=10)
+        ctk.CTkButton(analytics_frame, text="Show", width=70, command=self.show_analytics).pack(side="right")
+        self.report_display = ctk.CTkTextbox(manual_container, state="disabled", wrap="none", font=ctk.CTkFont(family="Consolas", size=12)); self.report_display.pack(expand=True, fill="both", padx=10, pady=10)
+        export_frame = ctk.CTkFrame(manual_container, fg_color="transparent"); export_frame.pack(fill="x", padx=10, pady=(0, 10)); ctk.CTkLabel(export_frame, text="Export:").pack(side="left")
+        self.export_menu = ctk.CTkOptionMenu(export_frame, values=list(EXPORT_QUERIES)); self.export_menu.pack(side="left", expand=True, fill="x", padx=10)
+        self.export_button = ctk.CTkButton(export_frame, text="Export...", width=100, command=self.export_data); self.export_button.pack(side="right")
         self.after(100, lambda: self.add_message("AI", "Hello! How can I help you today?"))
     def add_message(self, sender, message):
         is_user = sender == "You"; bubble_container = ctk.CTkFrame(self.chat_frame, fg_color="transparent")
@@ -269,34 +400,58 @@ class ReportsFrame(ctk.CTkFrame):
         self.after(100, self.chat_frame._parent_canvas.yview_moveto, 1.0)
     def send_message(self, event=None): query = self.user_input.get(); self.add_message("You", query); self.user_input.delete(0, "end"); self.process_ai_query(query.lower())
     def process_ai_query(self, query):
-        if any(word in query for word in ["hello", "hi", "hey"]): response = "Hi there! What report can I get for you?"
-        elif any(word in query for word in ["thank", "thanks"]): response = "You're welcome! Is there anything else?"
-        elif "total sales" in query:
-            period = 'month';
-            if 'week' in query: period = 'week'
-            if 'day' in query or 'today' in query: period = 'day'
-            total = self.db.get_total_sales(period); response = f"Total sales for the last {period} were ${total[0]:.2f}." if total and total[0] is not None else f"No sales in the last {period}."
-        elif "top" in query and "product" in query:
-            limit = int(re.search(r'(\d+)', query).group(1)) if re.search(r'(\d+)', query) else 5; products = self.db.get_top_selling_products(limit)
-            if products: response = f"Top {len(products)} products:\n" + "\n".join([f"- {p['name']} ({p['total_quantity']} units)" for p in products])
-            else: response = "No product sales data found."
-        elif "top" in query and "customer" in query:
-            limit = int(re.search(r'(\d+)', query).group(1)) if re.search(r'(\d+)', query) else 5; customers = self.db.get_top_customers_by_value(limit)
-            if customers: response = f"Top {len(customers)} customers:\n" + "\n".join([f"- {c['name']} (${c['total_spent']:.2f})" for c in customers])
-            else: response = "No customer sales data found."
-        else: response = "I can help with sales totals, top products, and top customers. How can I assist?"
-        self.add_message("AI", response)
+        intent = intents.parse(query)
+        if intent.name in intents.SMALL_TALK: self.add_message("AI", intents.SMALL_TALK[intent.name]); return
+        cached = self.answers.get(intent)
+        if cached is not None: self.add_message("AI", cached); return
+        stamp = self.answers.stamp(intent)
+        self.app.data.read(lambda db: intents.answer(db, intent), callback=lambda text: (self.answers.put(intent, stamp, text), self.add_message("AI", text)), errback=lambda e: self.add_message("AI", f"Sorry, I couldn't run that report ({e})."))
     def generate_report(self, selected_name):
-        customer_id = self.customer_map.get(selected_name); self.report_display.configure(state="normal"); self.report_display.delete("1.0", "end")
-        if not customer_id: self.report_display.insert("1.0", "Please select a valid customer."); self.report_display.configure(state="disabled"); return
-        orders = self.db.get_sales_report_for_customer(customer_id)
-        if not orders: self.report_display.insert("1.0", f"No completed orders found for {selected_name}.")
-        else:
-            report_text = f"Sales Report for: {selected_name}\n" + "="*30 + "\n"; total_value = 0
-            for order in orders: report_text += f"Order #{order['id']} on {order['order_date'].strftime('%Y-%m-%d')} - Total: ${order['total_invoice']:.2f}\n"; total_value += order['total_invoice']
-            report_text += "="*30 + f"\nTotal Value: ${total_value:.2f}"; self.report_display.insert("1.0", report_text)
-        self.report_display.configure(state="disabled")
-    def refresh_data(self): customers = self.db.get_customers(); self.customer_map = {c['name']: c['id'] for c in customers}; self.report_customer_combo.configure(values=list(self.customer_map.keys())); self.report_customer_combo.set("Select a customer..."); self.report_display.configure(state="normal"); self.report_display.delete("1.0", "end"); self.report_display.configure(state="disabled")
+        customer_id = self.customer_map.get(selected_name)
+        if not customer_id: self.show_report("Please select a valid customer."); return
+        try: start, end = [datetime.strptime(entry.get().strip(), "%Y-%m-%d") if entry.get().strip() else None for entry in (self.report_from_entry, self.report_to_entry)]
+        except ValueError: self.show_report("Enter the dates as YYYY-MM-DD, or leave them blank."); return
+        # The summary and the first page arrive together; later pages are streamed in by append_statement. A newer request drops older pages.
+        end = end and end + timedelta(days=1); self.report_seq += 1; seq = self.report_seq; self.show_report("Loading...")
+        self.app.data.read(lambda db: (db.get_customer_statement_summary(customer_id, start, end), db.get_customer_statement_page(customer_id, start, end)), callback=lambda result: self.show_statement(seq, selected_name, customer_id, start, end, *result))
+    def show_statement(self, seq, selected_name, customer_id, start, end, summary, page):
+        if seq != self.report_seq: return
+        period = f"{start:%Y-%m-%d} to " if start else "All orders to "; period += f"{end - timedelta(days=1):%Y-%m-%d}" if end else "today"
+        if not summary["orders"]: self.show_report(f"No completed orders found for {selected_name} ({period})."); return
+        change = lambda now, before: f"{(now - before) / before:+.1%}" if before else "-"
+        lines = [f"Statement for: {selected_name}", f"Period: {period}", "=" * 60, f"Orders: {summary['orders']:,}   Revenue: ${summary['revenue']:,.2f}   Average: ${summary['revenue'] / summary['orders']:,.2f}", f"First order: {summary['first_order'][:10]}   Last order: {summary['last_order'][:10]}"]
+        if summary["previous"]:
+            orders, revenue = summary["previous"]; lines.append(f"Previous period: {orders:,} orders, ${revenue:,.2f}" + (f" ({change(summary['revenue'], revenue)})" if revenue else ""))
+        lines += ["", f"{'Month':<9}{'Orders':>8}{'Revenue':>16}{'Change':>10}{'Cumulative':>16}"]
+        lines += [f"{month['month']:<9}{month['orders']:>8,}{month['revenue']:>16,.2f}{change(month['revenue'], month['previous_revenue']):>10}{month['cumulative']:>16,.2f}" for month in summary["months"]]
+        lines += ["", f"{'Order':<10}{'Date':<12}{'Amount':>16}{'Balance':>18}", ""]
+        self.show_report("\n".join(lines)); self.append_statement(seq, customer_id, start, end, summary["revenue"], page)
+    def append_statement(self, seq, customer_id, start, end, closing_balance, page):
+        if seq != self.report_seq or not self.report_display.winfo_exists(): return
+        text = "".join(f"#{row['id']:<9}{row['order_date']:%Y-%m-%d}  {row['total_invoice']:>16,.2f}{row['balance']:>18,.2f}\n" for row in page)
+        if len(page) < STATEMENT_PAGE_SIZE: text += "=" * 60 + f"\nClosing balance: ${closing_balance:,.2f}"
+        self.report_display.configure(state="normal"); self.report_display.insert("end", text); self.report_display.configure(state="disabled")
+        if len(page) == STATEMENT_PAGE_SIZE: last = page[-1]; self.app.data.read("get_customer_statement_page", customer_id, start, end, (last['order_date'], last['id']), last['balance'], callback=lambda rows: self.append_statement(seq, customer_id, start, end, closing_balance, rows))
+    def show_analytics(self):
+        # Runs as of the To date when one is given. The first run loads the sales snapshot, which can take a few seconds on a large database.
+        if not analytics.available(): self.show_report(analytics.UNAVAILABLE); return
+        try: as_of = datetime.strptime(self.report_to_entry.get().strip(), "%Y-%m-%d").date() if self.report_to_entry.get().strip() else None
+        except ValueError: self.show_report("Enter the To date as YYYY-MM-DD, or leave it blank."); return
+        report = analytics.REPORTS[self.analytics_menu.get()]; self.report_seq += 1; seq = self.report_seq; self.show_report("Loading...")
+        self.app.data.read(lambda db: report(db, as_of), callback=lambda text: seq == self.report_seq and self.show_report(text), errback=lambda e: seq == self.report_seq and self.show_report(f"Could not run the analysis: {e}"))
+    def show_report(self, text): self.report_display.configure(state="normal"); self.report_display.delete("1.0", "end"); self.report_display.insert("1.0", text); self.report_display.configure(state="disabled")
+    def export_data(self):
+        dataset = self.export_menu.get(); file_path = filedialog.asksaveasfilename(defaultextension=".csv", initialfile=f"{dataset}.csv", filetypes=[("CSV files", "*.csv"), ("Parquet files", "*.parquet")])
+        if not file_path: return
+        self.export_button.configure(state="disabled")
+        task = BackgroundTask(self.app.data, lambda db, report, cancel_event: db.export_to_file(dataset, file_path, progress=report, cancel_event=cancel_event), on_progress=lambda rows: dialog.set_status(f"{rows:,} rows written"), on_done=lambda result: self.on_export_finished("Export cancelled; no file was written." if result[1] else f"Exported {result[0]:,} rows to {file_path}.", title="Export Cancelled" if result[1] else "Export Complete"), on_error=lambda e: self.on_export_finished(f"Export failed: {e}", error=True))
+        dialog = ProgressDialog(self, f"Exporting {dataset}", lambda: (task.cancel(), dialog.set_status("Cancelling..."))); self.export_dialog = dialog
+    def on_export_finished(self, message, error=False, title="Export Complete"):
+        self.export_dialog.close(); self.export_button.configure(state="normal")
+        if error: messagebox.showerror("Export Error", message)
+        else: messagebox.showinfo(title, message)
+    def refresh_data(self): self.report_seq += 1; self.app.data.read("get_customers", callback=self.load_customers); self.show_report("")
+    def load_customers(self, customers): self.customer_map = {c['name']: c['id'] for c in customers}; self.report_customer_combo.configure(values=list(self.customer_map.keys())); self.report_customer_combo.set("Select a customer...")
 class AccountManagementFrame(ctk.CTkFrame):
     def __init__(self, master, app_instance, db):
         super().__init__(master, fg_color="transparent"); self.app, self.db = app_instance, db
@@ -312,34 +467,73 @@ class AccountManagementFrame(ctk.CTkFrame):
     def update_username(self):
         new_username = self.username_entry.get()
         if not new_username: messagebox.showerror("Error", "Username cannot be empty."); return
-        success, msg = self.db.update_username(self.app.current_user['id'], new_username)
+        self.app.data.write("update_username", self.app.current_user['id'], new_username, callback=self.on_account_updated)
+    def on_account_updated(self, result):
+        success, msg = result
         if success: messagebox.showinfo("Success", msg); self.app.logout()
         else: messagebox.showerror("Error", msg)
     def update_password(self):
         new_pass, confirm_pass = self.new_pass_entry.get(), self.confirm_pass_entry.get()
         if not new_pass or len(new_pass) < 4: messagebox.showerror("Error", "Password must be at least 4 characters."); return
         if new_pass != confirm_pass: messagebox.showerror("Error", "Passwords do not match."); return
-        success, msg = self.db.update_password(self.app.current_user['id'], new_pass); messagebox.showinfo("Success", msg); self.app.logout()
+        self.app.data.write("update_password", self.app.current_user['id'], new_pass, callback=self.on_account_updated)
     def refresh_data(self): self.username_entry.delete(0, "end"); self.username_entry.insert(0, self.app.current_user['username']); self.new_pass_entry.delete(0, "end"); self.confirm_pass_entry.delete(0, "end")
 class AllOrdersFrame(ctk.CTkFrame):
     def __init__(self, master, app_instance, db):
-        super().__init__(master, fg_color="transparent"); self.app, self.db, self.selected_order_id = app_instance, db, None; self.grid_columnconfigure(0, weight=1); self.grid_columnconfigure(1, weight=1); self.grid_rowconfigure(1, weight=1); search_frame = ctk.CTkFrame(self, fg_color="transparent"); search_frame.grid(row=0, column=0, columnspan=2, sticky="ew", padx=10, pady=10); self.search_entry = ctk.CTkEntry(search_frame, placeholder_text="Search by customer name..."); self.search_entry.pack(fill="x"); self.search_entry.bind("<KeyRelease>", self.filter_orders); self.order_list_frame = ctk.CTkScrollableFrame(self, label_text="All Orders"); self.order_list_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=10); self.details_frame = ctk.CTkFrame(self); self.details_frame.grid(row=1, column=1, sticky="nsew", padx=10, pady=10); self.details_frame.grid_columnconfigure((0,1), weight=1); self.details_frame.grid_rowconfigure(1, weight=1); ctk.CTkLabel(self.details_frame, text="Order Details", font=ctk.CTkFont(size=16, weight="bold")).grid(row=0, column=0, columnspan=2, pady=10, padx=10, sticky="w"); self.details_text = ctk.CTkTextbox(self.details_frame, state="disabled", wrap="word"); self.details_text.grid(row=1, column=0, columnspan=2, sticky="nsew", padx=10, pady=10); self.print_button = ctk.CTkButton(self.details_frame, text="Print Invoice", state="disabled", command=self.print_invoice); self.print_button.grid(row=2, column=0, sticky="ew", padx=10, pady=(0, 10)); self.email_button = ctk.CTkButton(self.details_frame, text="Email Invoice", state="disabled", command=self.email_invoice); self.email_button.grid(row=2, column=1, sticky="ew", padx=10, pady=(0, 10))
+        super().__init__(master, fg_color="transparent"); self.app, self.db, self.selected_order_id = app_instance, db, None; self.grid_columnconfigure(0, weight=1); self.grid_columnconfigure(1, weight=1); self.grid_rowconfigure(1, weight=1); search_frame = ctk.CTkFrame(self, fg_color="transparent"); search_frame.grid(row=0, column=0, columnspan=2, sticky="ew", padx=10, pady=10); self.import_button = ctk.CTkButton(search_frame, text="Import Orders", width=140, command=self.import_orders); self.import_button.pack(side="right", padx=(10, 0)); self.render_button = ctk.CTkButton(search_frame, text="Render Invoices", width=140, command=self.render_invoices); self.render_button.pack(side="right", padx=(10, 0)); self.search_entry = ctk.CTkEntry(search_frame, placeholder_text="Search by customer name..."); self.search_entry.pack(side="left", fill="x", expand=True); self.search_entry.bind("<KeyRelease>", self.filter_orders); self.order_list = VirtualList(self, lambda parent: ctk.CTkButton(parent, text="", anchor="w"), self.bind_order_row, label_text="All Orders", on_end_reached=self.load_more_orders); self.orders_search, self.orders_exhausted, self.orders_loading = "", True, False; self.order_list.grid(row=1, column=0, sticky="nsew", padx=10, pady=10); self.details_frame = ctk.CTkFrame(self); self.details_frame.grid(row=1, column=1, sticky="nsew", padx=10, pady=10); self.details_frame.grid_columnconfigure((0,1), weight=1); self.details_frame.grid_rowconfigure(1, weight=1); ctk.CTkLabel(self.details_frame, text="Order Details", font=ctk.CTkFont(size=16, weight="bold")).grid(row=0, column=0, columnspan=2, pady=10, padx=10, sticky="w"); self.details_text = ctk.CTkTextbox(self.details_frame, state="disabled", wrap="word"); self.details_text.grid(row=1, column=0, columnspan=2, sticky="nsew", padx=10, pady=10); self.print_button = ctk.CTkButton(self.details_frame, text="Print Invoice", state="disabled", command=self.print_invoice); self.print_button.grid(row=2, column=0, sticky="ew", padx=10, pady=(0, 10)); self.email_button = ctk.CTkButton(self.details_frame, text="Email Invoice", state="disabled", command=self.email_invoice); self.email_button.grid(row=2, column=1, sticky="ew", padx=10, pady=(0, 10))
     def refresh_data(self): self.filter_orders(); self.clear_details()
+    def import_orders(self):
+        file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")], title="Import orders (order_ref, customer, product, quantity[, order_date])")
+        if not file_path: return
+        self.import_button.configure(state="disabled")
+        task = BackgroundTask(self.app.data, lambda db, report, cancel_event: db.import_orders_from_csv(file_path, progress=report, cancel_event=cancel_event), write=True, on_progress=lambda imported, skipped, rate: dialog.set_status(f"{imported:,} orders imported, {skipped:,} lines skipped ({rate:,.0f}/s)"), on_done=self.on_import_done, on_error=self.on_import_error)
+        dialog = ProgressDialog(self, "Importing Orders", lambda: (task.cancel(), dialog.set_status("Cancelling...")))
+        self.import_dialog = dialog
+    def on_import_done(self, result):
+        imported, skipped, cancelled = result; self.import_dialog.close(); self.import_button.configure(state="normal")
+        if cancelled: messagebox.showinfo("Import Cancelled", "The import was cancelled and no orders were saved."); return
+        self.filter_orders(); messagebox.showinfo("Success", f"{imported:,} orders created (Pending Vendor).\n{skipped:,} lines skipped (unknown customer or product, or invalid quantity/date).")
+    def on_import_error(self, error): self.import_dialog.close(); self.import_button.configure(state="normal"); messagebox.showerror("Import Error", f"An error occurred: {error}")
     def filter_orders(self, event=None):
-        orders = self.db.get_all_orders_with_details(self.search_entry.get()); [widget.destroy() for widget in self.order_list_frame.winfo_children()]
-        for order in orders: ctk.CTkButton(self.order_list_frame, text=f"#{order['id']} - {order['name']} ({order['order_date'].strftime('%Y-%m-%d')}) - {order['status']} - ${order['total_invoice']:.2f}" if order['total_invoice'] is not None else "N/A", anchor="w", command=lambda o=order: self.select_order(o)).pack(fill="x", pady=2)
-    def select_order(self, order):
-        self.selected_order_id = order['id']; order_details, item_details = self.db.get_full_order_details(self.selected_order_id)
-        if not order_details: return
+        search_term = self.search_entry.get(); self.app.search.cancel(self.order_list)
+        self.app.search.submit(self.search_entry, "get_orders_page", (search_term, None, ORDER_PAGE_SIZE), lambda orders: self.show_orders(search_term, orders), delay=0 if event is None else None)
+    def show_orders(self, search_term, orders): self.orders_search, self.orders_exhausted, self.orders_loading = search_term, len(orders) < ORDER_PAGE_SIZE, False; self.order_list.set_items(orders)
+    def load_more_orders(self):
+        if self.orders_exhausted or self.orders_loading: return
+        last, search_term = self.order_list.items[-1], self.orders_search; self.orders_loading = True
+        self.app.search.submit(self.order_list, "get_orders_page", (search_term, (last['order_date'], last['id']), ORDER_PAGE_SIZE), lambda orders: self.append_orders(search_term, orders), delay=0)
+    def append_orders(self, search_term, orders):
+        if search_term != self.orders_search: return
+        self.orders_exhausted, self.orders_loading = len(orders) < ORDER_PAGE_SIZE, False; self.order_list.append_items(orders)
+    def bind_order_row(self, button, order): button.configure(text=f"#{order['id']} - {order['name']} ({order['order_date'].strftime('%Y-%m-%d')}) - {order['status']} - " + (f"${order['total_invoice']:.2f}" if order['total_invoice'] is not None else "N/A"), command=lambda o=order: self.select_order(o))
+    def select_order(self, order): self.selected_order_id = order['id']; self.app.data.read("get_full_order_details", order['id'], callback=self.show_order_details)
+    def show_order_details(self, details):
+        order_details, item_details = details
+        if not order_details or order_details['id'] != self.selected_order_id: return
         total, date = (f"${order_details['total_invoice']:.2f}" if order_details['total_invoice'] is not None else "Pending"), order_details['order_date'].strftime('%Y-%m-%d %H:%M'); details_str = f"Order ID: #{order_details['id']}\nCustomer: {order_details['name']}\nDate: {date}\nStatus: {order_details['status']}\nTotal: {total}\n\n--- Items ---\n" + "".join([f"- {item['name']} (x{item['quantity']}) @ ${item['final_price']:.2f}\n" for item in item_details]); self.details_text.configure(state="normal"); self.details_text.delete("1.0", "end"); self.details_text.insert("1.0", details_str); self.details_text.configure(state="disabled")
         if order_details['status'] == 'Completed': self.print_button.configure(state="normal"); self.email_button.configure(state="normal")
         else: self.print_button.configure(state="disabled"); self.email_button.configure(state="disabled")
     def clear_details(self): self.selected_order_id = None; self.details_text.configure(state="normal"); self.details_text.delete("1.0", "end"); self.details_text.insert("1.0", "Select an order to see details."); self.details_text.configure(state="disabled"); self.print_button.configure(state="disabled"); self.email_button.configure(state="disabled")
-    def print_invoice(self): messagebox.showinfo("Not Implemented", f"This would print a PDF for Order #{self.selected_order_id}.")
-    def email_invoice(self): messagebox.showinfo("Not Implemented", f"This would email the invoice for Order #{self.selected_order_id}.")
+    def print_invoice(self): self.app.print_invoice(self.selected_order_id)
+    def email_invoice(self): self.app.email_invoice(self.selected_order_id)
+    def render_invoices(self):
+        prompt = ctk.CTkInputDialog(text="Render invoices for orders completed between (YYYY-MM-DD YYYY-MM-DD):", title="Render Invoices"); dates = (prompt.get_input() or "").split()
+        if not dates: return
+        try: start, end = datetime.strptime(dates[0], "%Y-%m-%d"), datetime.strptime(dates[-1], "%Y-%m-%d") + timedelta(days=1)
+        except ValueError: messagebox.showerror("Input Error", "Enter the date range as YYYY-MM-DD YYYY-MM-DD."); return
+        os.makedirs(INVOICE_DIR, exist_ok=True); out_dir = filedialog.askdirectory(initialdir=os.path.abspath(INVOICE_DIR), title="Save invoices to")
+        if not out_dir: return
+        self.render_button.configure(state="disabled")
+        task = BackgroundTask(self.app.data, lambda db, report, cancel_event: self.app.invoices.render_orders(db, db.get_completed_order_ids(start, end), out_dir, progress=report, cancel_event=cancel_event), on_progress=lambda done, total, rate: dialog.set_status(f"{done:,} of {total:,} invoices rendered ({rate:,.0f}/s)"), on_done=lambda result: self.on_render_done(result, out_dir), on_error=self.on_render_error)
+        dialog = ProgressDialog(self, "Rendering Invoices", lambda: (task.cancel(), dialog.set_status("Cancelling...")))
+        self.render_dialog = dialog
+    def on_render_done(self, result, out_dir):
+        rendered, cancelled = result; self.render_dialog.close(); self.render_button.configure(state="normal")
+        messagebox.showinfo("Render Cancelled" if cancelled else "Success", f"{len(rendered):,} invoices saved to {out_dir}.")
+    def on_render_error(self, error): self.render_dialog.close(); self.render_button.configure(state="normal"); messagebox.showerror("Invoice Error", f"An error occurred: {error}")
 class BaseCrudFrame(ctk.CTkFrame):
     def __init__(self, master, app_instance, db, title, item_name, fields, db_get_all, db_add, db_update, db_delete, db_search, db_import):
-        super().__init__(master, fg_color="transparent"); self.app, self.db, self.title, self.item_name, self.fields = app_instance, db, title, item_name, fields; self.db_get_all, self.db_add, self.db_update, self.db_delete, self.db_search, self.db_import = db_get_all, db_add, db_update, db_delete, db_search, db_import; self.selected_item_id = None; self.grid_columnconfigure(0, weight=1); self.grid_columnconfigure(1, weight=2); self.grid_rowconfigure(0, weight=1); left_panel = ctk.CTkFrame(self); left_panel.grid(row=0, column=0, sticky="nsew", padx=(0, 10)); left_panel.grid_rowconfigure(2, weight=1); left_panel.grid_columnconfigure(0, weight=1); ctk.CTkLabel(left_panel, text=self.title, font=ctk.CTkFont(size=18, weight="bold")).grid(row=0, column=0, pady=10, padx=10, sticky="w"); self.search_entry = ctk.CTkEntry(left_panel, placeholder_text=f"Search {item_name}s..."); self.search_entry.grid(row=1, column=0, sticky="ew", padx=10, pady=(0, 10)); self.search_entry.bind("<KeyRelease>", self.filter_list); self.item_list_frame = ctk.CTkScrollableFrame(left_panel); self.item_list_frame.grid(row=2, column=0, sticky="nsew", padx=10, pady=(0, 10)); right_panel = ctk.CTkFrame(self); right_panel.grid(row=0, column=1, sticky="nsew", padx=(10, 0)); right_panel.grid_columnconfigure(0, weight=1); right_panel.grid_rowconfigure(0, weight=1); self.form_frame = ctk.CTkFrame(right_panel, fg_color="transparent"); self.form_frame.grid(row=0, column=0, sticky="nsew", padx=20, pady=20); self.form_frame.grid_columnconfigure(0, weight=1); self.form_frame.grid_rowconfigure(1, weight=1); ctk.CTkLabel(self.form_frame, text=f"{self.item_name} Details", font=ctk.CTkFont(size=16, weight="bold")).grid(row=0, column=0, sticky="w", pady=(0, 20)); self.fields_container = ctk.CTkFrame(self.form_frame, fg_color="transparent"); self.fields_container.grid(row=1, column=0, sticky="nsew"); self.create_form_fields()
+        super().__init__(master, fg_color="transparent"); self.app, self.db, self.title, self.item_name, self.fields = app_instance, db, title, item_name, fields; self.db_get_all, self.db_add, self.db_update, self.db_delete, self.db_search, self.db_import = db_get_all, db_add, db_update, db_delete, db_search, db_import; self.selected_item_id = None; self.grid_columnconfigure(0, weight=1); self.grid_columnconfigure(1, weight=2); self.grid_rowconfigure(0, weight=1); left_panel = ctk.CTkFrame(self); left_panel.grid(row=0, column=0, sticky="nsew", padx=(0, 10)); left_panel.grid_rowconfigure(2, weight=1); left_panel.grid_columnconfigure(0, weight=1); ctk.CTkLabel(left_panel, text=self.title, font=ctk.CTkFont(size=18, weight="bold")).grid(row=0, column=0, pady=10, padx=10, sticky="w"); self.search_entry = ctk.CTkEntry(left_panel, placeholder_text=f"Search {item_name}s..."); self.search_entry.grid(row=1, column=0, sticky="ew", padx=10, pady=(0, 10)); self.search_entry.bind("<KeyRelease>", self.filter_list); self.item_list = VirtualList(left_panel, lambda parent: ctk.CTkButton(parent, text="", anchor="w", fg_color="transparent", hover=False), self.bind_item_row); self.item_list.grid(row=2, column=0, sticky="nsew", padx=10, pady=(0, 10)); right_panel = ctk.CTkFrame(self); right_panel.grid(row=0, column=1, sticky="nsew", padx=(10, 0)); right_panel.grid_columnconfigure(0, weight=1); right_panel.grid_rowconfigure(0, weight=1); self.form_frame = ctk.CTkFrame(right_panel, fg_color="transparent"); self.form_frame.grid(row=0, column=0, sticky="nsew", padx=20, pady=20); self.form_frame.grid_columnconfigure(0, weight=1); self.form_frame.grid_rowconfigure(1, weight=1); ctk.CTkLabel(self.form_frame, text=f"{self.item_name} Details", font=ctk.CTkFont(size=16, weight="bold")).grid(row=0, column=0, sticky="w", pady=(0, 20)); self.fields_container = ctk.CTkFrame(self.form_frame, fg_color="transparent"); self.fields_container.grid(row=1, column=0, sticky="nsew"); self.create_form_fields()
     def create_form_fields(self):
         self.form_entries = {};
         for i, (key, label) in enumerate(self.fields.items()):
@@ -350,63 +544,117 @@ class BaseCrudFrame(ctk.CTkFrame):
         button_frame = ctk.CTkFrame(self.form_frame, fg_color="transparent"); button_frame.grid(row=2, column=0, sticky="ew", pady=(20, 0)); button_frame.grid_columnconfigure((0, 1, 2, 3), weight=1); self.save_button = ctk.CTkButton(button_frame, text="Save", command=self.save_item); self.save_button.grid(row=0, column=0, padx=(0, 5), sticky="ew"); self.clear_button = ctk.CTkButton(button_frame, text="Clear / New", command=self.clear_form); self.clear_button.grid(row=0, column=1, padx=5, sticky="ew"); self.import_button = ctk.CTkButton(button_frame, text="Import CSV", command=self.import_csv); self.import_button.grid(row=0, column=2, padx=5, sticky="ew"); self.delete_button = ctk.CTkButton(button_frame, text="Delete", command=self.delete_item, state="disabled", fg_color="#D32F2F", hover_color="#B71C1C"); self.delete_button.grid(row=0, column=3, padx=(5, 0), sticky="ew")
     def select_item(self, item): self.clear_form(); self.selected_item_id = item['id']; [entry.insert("1.0", item.get(key) or "") if isinstance(entry, ctk.CTkTextbox) else entry.insert(0, str(item.get(key) or "")) for key, entry in self.form_entries.items()]; self.delete_button.configure(state="normal")
     def refresh_data(self): self.filter_list(); self.clear_form()
-    def filter_list(self, event=None):
-        items = self.db_search(self.search_entry.get()); [widget.destroy() for widget in self.item_list_frame.winfo_children()]; [ctk.CTkButton(self.item_list_frame, text=item['name'], anchor="w", fg_color="transparent", hover=False, command=lambda i=item: self.select_item(i)).pack(fill="x", padx=5, pady=2) for item in items]
+    def filter_list(self, event=None): search_term = self.search_entry.get(); self.app.search.submit(self.search_entry, self.db_search.__name__, (search_term, SEARCH_LIMIT if search_term else None), self.show_list, delay=0 if event is None else None)
+    def show_list(self, items): self.item_list.set_items(items)
+    def bind_item_row(self, button, item): button.configure(text=item['name'], command=lambda i=item: self.select_item(i))
     def clear_form(self): self.selected_item_id = None; [entry.delete("1.0", "end") if isinstance(entry, ctk.CTkTextbox) else entry.delete(0, "end") for entry in self.form_entries.values()]; self.delete_button.configure(state="disabled"); self.form_entries[list(self.fields.keys())[0]].focus()
     def save_item(self):
         values = [entry.get("1.0", "end-1c") if isinstance(entry, ctk.CTkTextbox) else entry.get() for entry in self.form_entries.values()];
         if not values[0]: messagebox.showerror("Error", f"{self.fields[list(self.fields.keys())[0]]} is required."); return
-        if self.selected_item_id: self.db_update(self.selected_item_id, *values)
-        else: self.db_add(*values)
-        self.refresh_data(); messagebox.showinfo("Success", f"{self.item_name} saved successfully.")
+        on_error = lambda e: messagebox.showerror("Error", f"Could not save {self.item_name}: {e}")
+        if self.selected_item_id: self.app.data.write(self.db_update.__name__, self.selected_item_id, *values, callback=lambda _: self.on_item_saved(), errback=on_error)
+        else: self.app.data.write(self.db_add.__name__, *values, callback=lambda _: self.on_item_saved(), errback=on_error)
+    def on_items_changed(self): pass
+    def on_item_saved(self): self.refresh_data(); self.on_items_changed(); messagebox.showinfo("Success", f"{self.item_name} saved successfully.")
     def delete_item(self):
-        if self.selected_item_id and messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete this {self.item_name}?"): self.db_delete(self.selected_item_id); self.refresh_data(); messagebox.showinfo("Success", f"{self.item_name} deleted.")
+        if self.selected_item_id and messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete this {self.item_name}?"): self.app.data.write(self.db_delete.__name__, self.selected_item_id, callback=lambda _: (self.refresh_data(), self.on_items_changed(), messagebox.showinfo("Success", f"{self.item_name} deleted.")))
     def import_csv(self):
         file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")]);
         if not file_path: return
-        try: table_name = 'customers' if self.item_name == 'Customer' else 'products'; self.db.import_from_csv(file_path, table_name); self.refresh_data(); messagebox.showinfo("Success", f"{self.title} imported successfully.")
-        except Exception as e: messagebox.showerror("Import Error", f"An error occurred: {e}")
+        table_name = 'customers' if self.item_name == 'Customer' else 'products'; self.import_button.configure(state="disabled")
+        task = BackgroundTask(self.app.data, lambda db, report, cancel_event: db.import_from_csv(file_path, table_name, progress=report, cancel_event=cancel_event), write=True, on_progress=lambda imported, skipped, rate: dialog.set_status(f"{imported:,} rows imported, {skipped:,} skipped ({rate:,.0f} rows/s)"), on_done=self.on_import_done, on_error=self.on_import_error)
+        dialog = ProgressDialog(self, f"Importing {self.title}", lambda: (task.cancel(), dialog.set_status("Cancelling...")))
+        self.import_dialog = dialog
+    def on_import_done(self, result):
+        imported, skipped, cancelled = result; self.import_dialog.close(); self.import_button.configure(state="normal")
+        if cancelled: messagebox.showinfo("Import Cancelled", "The import was cancelled and no rows were saved."); return
+        self.refresh_data(); self.on_items_changed(); messagebox.showinfo("Success", f"{self.title} imported successfully.\n{imported:,} rows saved, {skipped:,} invalid rows skipped.")
+    def on_import_error(self, error): self.import_dialog.close(); self.import_button.configure(state="normal"); messagebox.showerror("Import Error", f"An error occurred: {error}")
 class CustomersFrame(BaseCrudFrame):
     def __init__(self, master, app_instance, db): super().__init__(master, app_instance, db, title="Customers", item_name="Customer", fields={"name": "Name*", "email": "Email", "phone": "Phone", "address": "Address", "notes": "Notes"}, db_get_all=db.get_customers, db_add=db.add_customer, db_update=db.update_customer, db_delete=db.delete_customer, db_search=db.get_customers, db_import=lambda path: db.import_from_csv(path, 'customers'))
 class InventoryFrame(BaseCrudFrame):
     def __init__(self, master, app_instance, db): super().__init__(master, app_instance, db, title="Inventory", item_name="Product", fields={"name": "Product Name*", "master_price": "Master Price*", "category": "Category"}, db_get_all=db.get_products, db_add=db.add_product, db_update=db.update_product, db_delete=db.delete_product, db_search=db.get_products, db_import=lambda path: db.import_from_csv(path, 'products'))
+    def on_items_changed(self): self.app.refresh_catalog()
 class SettingsFrame(ctk.CTkFrame):
     def __init__(self, master, app_instance, db):
         super().__init__(master, fg_color="transparent")
-        self.app, self.db = app_instance, db
-
-    def refresh_data(self):
-        for widget in self.winfo_children(): widget.destroy()
+        self.app, self.db, self.stats_display, self.stats_job = app_instance, db, None, None
         
         appearance_frame = ctk.CTkFrame(self); appearance_frame.pack(pady=20, padx=20, fill="x")
         ctk.CTkLabel(appearance_frame, text="Appearance", font=ctk.CTkFont(size=16, weight="bold")).pack(anchor="w", padx=10, pady=10)
-        theme_menu = ctk.CTkOptionMenu(appearance_frame, values=["Light (Custom)", "Dark", "System"], command=self.change_theme)
-        theme_menu.set(self.app.THEME_NAME); theme_menu.pack(pady=10, padx=10, anchor="w")
+        self.theme_menu = ctk.CTkOptionMenu(appearance_frame, values=["Light (Custom)", "Dark", "System"], command=self.change_theme)
+        self.theme_menu.pack(pady=10, padx=10, anchor="w")
+        
+        performance_frame = ctk.CTkFrame(self); performance_frame.pack(pady=20, padx=20, fill="x")
+        ctk.CTkLabel(performance_frame, text="Database Performance Profile", font=ctk.CTkFont(size=16, weight="bold")).pack(anchor="w", padx=10, pady=10)
+        ctk.CTkLabel(performance_frame, text="Safe (default): rollback journal, full fsync (use on network drives). Balanced: WAL, fewer fsyncs. Fast: WAL without fsync, large caches.", anchor="w", justify="left").pack(anchor="w", padx=10)
+        self.profile_menu = ctk.CTkOptionMenu(performance_frame, values=list(DB_PROFILES), command=self.change_db_profile)
+        self.profile_menu.pack(pady=10, padx=10, anchor="w")
+        
+        stats_frame = ctk.CTkFrame(self); stats_frame.pack(pady=20, padx=20, fill="x")
+        ctk.CTkLabel(stats_frame, text="Query Statistics", font=ctk.CTkFont(size=16, weight="bold")).pack(anchor="w", padx=10, pady=10)
+        self.diagnostic_switches = {
+            "query_stats": ctk.CTkSwitch(stats_frame, text=f"Record query timings; queries slower than {querystats.SLOW_QUERY_MS} ms are logged to {querystats.SLOW_QUERY_LOG} (applies on restart)", command=lambda: self.toggle_diagnostic("query_stats", "Query statistics")),
+            "ui_profile": ctk.CTkSwitch(stats_frame, text=f"Profile UI responsiveness; callbacks over {uiprofiler.JANK_MS}/{uiprofiler.STALL_MS} ms are flagged and a trace is written to {uiprofiler.UI_TRACE_FILE} on exit (applies on restart)", command=lambda: self.toggle_diagnostic("ui_profile", "UI profiling")),
+        }
+        for switch in self.diagnostic_switches.values(): switch.pack(anchor="w", padx=10, pady=(0, 10))
+        if querystats.is_enabled():
+            self.stats_display = ctk.CTkTextbox(stats_frame, height=150, wrap="none", font=ctk.CTkFont(family="Consolas", size=12)); self.stats_display.pack(fill="x", padx=10)
+            ctk.CTkButton(stats_frame, text="Reset Statistics", command=querystats.STATS.reset).pack(anchor="e", padx=10, pady=10)
         
         smtp_frame = ctk.CTkFrame(self); smtp_frame.pack(pady=20, padx=20, fill="x")
-        ctk.CTkLabel(smtp_frame, text="SMTP Email Settings (for future use)", font=ctk.CTkFont(size=16, weight="bold")).pack(anchor="w", padx=10, pady=10)
+        ctk.CTkLabel(smtp_frame, text="SMTP Email Settings (invoice delivery)", font=ctk.CTkFont(size=16, weight="bold")).pack(anchor="w", padx=10, pady=10)
         self.smtp_entries = {}
         for field in ["SMTP Host", "Port", "Username", "Password"]:
             frame = ctk.CTkFrame(smtp_frame, fg_color="transparent"); frame.pack(fill="x", padx=10, pady=5)
             ctk.CTkLabel(frame, text=field, width=100, anchor="w").pack(side="left")
-            entry = ctk.CTkEntry(frame, show="*" if field == "Password" else None); key = f"smtp_{field.lower().replace(' ', '_')}"
-            entry.insert(0, self.db.get_setting(key) or ""); entry.pack(side="left", expand=True, fill="x")
-            self.smtp_entries[key] = entry
+            entry = ctk.CTkEntry(frame, show="*" if field == "Password" else None); entry.pack(side="left", expand=True, fill="x")
+            self.smtp_entries[f"smtp_{field.lower().replace(' ', '_')}"] = entry
         ctk.CTkButton(smtp_frame, text="Save SMTP Settings", command=self.save_smtp_settings).pack(pady=20, padx=10, anchor="e")
+
+    def refresh_data(self):
+        # Widgets are built once; each visit only reloads their values from the in-memory settings snapshot.
+        self.theme_menu.set(self.app.THEME_NAME); self.profile_menu.set(self.db.profile_name)
+        for key, switch in self.diagnostic_switches.items(): switch.select() if self.db.setting(key) else switch.deselect()
+        for key, entry in self.smtp_entries.items(): entry.delete(0, "end"); entry.insert(0, self.db.get_setting(key) or "")
+        if self.stats_display is not None and self.stats_job is None: self.stats_job = self.after(QUERY_STATS_REFRESH_MS, self.update_query_stats)
     
     def change_theme(self, new_theme: str):
-        self.db.set_setting("theme", new_theme)
+        self.app.save_settings({"theme": new_theme})
         messagebox.showinfo("Theme Change", f"Theme set to '{new_theme}'. Please restart the application to apply changes.")
     
+    def change_db_profile(self, profile_name: str):
+        self.app.save_settings({"db_profile": profile_name})
+        messagebox.showinfo("Database Profile", f"Database profile set to '{profile_name}'. Please restart the application to apply changes.")
+    
+    def toggle_diagnostic(self, key, label):
+        enabled = bool(self.diagnostic_switches[key].get()); self.app.save_settings({key: enabled})
+        messagebox.showinfo(label, f"{label} will be {'enabled' if enabled else 'disabled'} after the application restarts.")
+    
+    def update_query_stats(self):
+        # Live while the page is visible; refresh_data restarts the loop when the page is shown again.
+        self.stats_job = None
+        if not self.winfo_ismapped(): return
+        lines = [f"{'calls':>7} {'total ms':>10} {'avg ms':>8} {'p95 ms':>7} {'max ms':>8} {'rows':>9}  statement / busiest call site"]
+        for stat in querystats.STATS.snapshot(limit=QUERY_STATS_ROWS):
+            lines.append(f"{stat['count']:>7} {stat['total_ms']:>10.1f} {stat['avg_ms']:>8.2f} {stat['p95_ms']:>7g} {stat['max_ms']:>8.1f} {stat['rows']:>9}  {stat['sql'][:100]}")
+            lines.append(f"{'':>54}{stat['sites'][0][0] if stat['sites'] else ''}")
+        self.stats_display.configure(state="normal"); self.stats_display.delete("1.0", "end"); self.stats_display.insert("1.0", "\n".join(lines)); self.stats_display.configure(state="disabled")
+        self.stats_job = self.after(QUERY_STATS_REFRESH_MS, self.update_query_stats)
+    
     def save_smtp_settings(self):
-        for key, entry in self.smtp_entries.items(): self.db.set_setting(key, entry.get())
-        messagebox.showinfo("Success", "SMTP settings saved.")
+        values = {key: entry.get().strip() for key, entry in self.smtp_entries.items()}
+        if values["smtp_port"] and not values["smtp_port"].isdigit(): messagebox.showerror("Input Error", f"Invalid port: '{values['smtp_port']}'."); return
+        self.app.save_settings(values, on_saved=lambda changed: messagebox.showinfo("Success", "SMTP settings saved."))
 class VendorFulfillmentWindow(ctk.CTkToplevel):
-    def __init__(self, master, db, order_id):
-        super().__init__(master); self.db, self.order_id = db, order_id; self.title(f"Fulfill Order #{order_id}"); self.geometry("500x600"); self.transient(master); self.grab_set(); self.grid_columnconfigure(0, weight=1); self.grid_rowconfigure(0, weight=1); scroll_frame = ctk.CTkScrollableFrame(self, label_text="Order Items"); scroll_frame.grid(row=0, column=0, sticky="nsew", padx=10, pady=10); scroll_frame.grid_columnconfigure(0, weight=1); self.fulfillment_entries = {}
-        for item in self.db.get_order_items(self.order_id):
+    def __init__(self, master, data, order_id):
+        super().__init__(master); self.data, self.order_id = data, order_id; self.title(f"Fulfill Order #{order_id}"); self.geometry("500x600"); self.transient(master); self.grab_set(); self.grid_columnconfigure(0, weight=1); self.grid_rowconfigure(0, weight=1); scroll_frame = ctk.CTkScrollableFrame(self, label_text="Order Items"); scroll_frame.grid(row=0, column=0, sticky="nsew", padx=10, pady=10); scroll_frame.grid_columnconfigure(0, weight=1); self.fulfillment_entries = {}
+        self.submit_button = ctk.CTkButton(self, text="Submit Fulfillment", state="disabled", command=self.submit); self.submit_button.grid(row=1, column=0, padx=10, pady=10, sticky="ew")
+        self.data.read("get_order_items", self.order_id, callback=lambda items: self.show_items(scroll_frame, items))
+    def show_items(self, scroll_frame, items):
+        for item in items:
             item_frame = ctk.CTkFrame(scroll_frame); item_frame.pack(fill="x", pady=5, padx=5); item_frame.grid_columnconfigure(1, weight=1); ctk.CTkLabel(item_frame, text=f"{item['name']} (Qty: {item['quantity']})", wraplength=200).grid(row=0, column=0, columnspan=2, sticky="w", padx=5, pady=5); ctk.CTkLabel(item_frame, text="Final Price:").grid(row=1, column=0, sticky="w", padx=5); price_entry = ctk.CTkEntry(item_frame); price_entry.grid(row=1, column=1, sticky="ew", padx=5); out_of_stock_check = ctk.CTkCheckBox(item_frame, text="Out of Stock"); out_of_stock_check.grid(row=2, column=0, columnspan=2, sticky="w", padx=5, pady=5); self.fulfillment_entries[item['id']] = {"price_entry": price_entry, "out_of_stock_check": out_of_stock_check}
-        ctk.CTkButton(self, text="Submit Fulfillment", command=self.submit).grid(row=1, column=0, padx=10, pady=10, sticky="ew")
+        self.submit_button.configure(state="normal")
     def submit(self):
         fulfillment_data = {};
         for item_id, widgets in self.fulfillment_entries.items():
@@ -416,8 +664,10 @@ class VendorFulfillmentWindow(ctk.CTkToplevel):
                 try: float(price)
                 except ValueError: messagebox.showerror("Input Error", f"Invalid price: '{price}'."); return
             fulfillment_data[item_id] = {"price": price, "out_of_stock": out_of_stock}
-        self.db.update_order_fulfillment(fulfillment_data); messagebox.showinfo("Success", f"Order #{self.order_id} fulfilled."); self.destroy()
+        self.submit_button.configure(state="disabled")
+        self.data.write("update_order_fulfillment", fulfillment_data, callback=lambda _: (messagebox.showinfo("Success", f"Order #{self.order_id} fulfilled."), self.destroy()), errback=lambda e: (messagebox.showerror("Error", f"Fulfillment failed: {e}"), self.submit_button.configure(state="normal")))
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = App()
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,46 @@
+# agroflow/bench/analytics_speed.py
+# Usage: python -m bench.analytics_speed [--orders 50000] [--lines 10000000] [--json]
+# Times the snapshot load from a synthetic database, then each analysis over a NumPy-generated snapshot of --lines line items.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import numpy as np
+import analytics
+from database import Database
+from bench.synthetic import populate
+
+def timed(fn):
+    started = time.perf_counter(); fn(); return round(time.perf_counter() - started, 3)
+
+def synthetic_sales(lines, today, customers=20000, products=5000, days=730, seed=42):
+    rng, end = np.random.default_rng(seed), analytics.day_number(today) + 1; orders = max(lines // 10, 1)
+    order_day = np.sort(rng.integers(end - days, end, orders)); line_order = rng.integers(0, orders, lines); quantity = rng.integers(1, 51, lines).astype(float)
+    return analytics.Sales(rng.integers(1, customers + 1, orders), order_day, rng.gamma(2.0, 150.0, orders), rng.integers(1, products + 1, lines), order_day[line_order], quantity, quantity * rng.uniform(0.5, 40.0, lines))
+
+def run(directory, orders, lines):
+    today, results = date.today(), {}
+    db = Database(os.path.join(directory, "analytics.db")); populate(db, customers=2000, products=500, orders=orders)
+    started = time.perf_counter(); loaded = len(analytics.read_sales(db).day); seconds = time.perf_counter() - started; db.close()
+    results["load"] = {"lines": loaded, "seconds": round(seconds, 3), "per_second": round(loaded / seconds)}
+    sales = synthetic_sales(lines, today); results["compute"] = {"lines": lines}
+    for name, fn in (("weekly_revenue", analytics.weekly_revenue), ("seasonality", analytics.seasonality), ("rfm", analytics.rfm), ("reorder", analytics.reorder)): results["compute"][name] = timed(lambda: fn(sales, today))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytics snapshot load and compute timings.")
+    parser.add_argument("--orders", type=int, default=50000); parser.add_argument("--lines", type=int, default=10_000_000); parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory: results = run(directory, args.orders, args.lines)
+    if args.json: print(json.dumps(results, indent=2)); return
+    load, compute = results["load"], results["compute"]
+    print(f"load: {load['lines']:,} line items in {load['seconds']:.2f}s ({load['per_second']:,}/s)")
+    print(f"compute over {compute['lines']:,} line items: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in compute.items() if name != "lines"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# agroflow/bench/bench_indexes.py
+# Usage: python -m bench.bench_indexes [--items 1000000] [--db bench/indexes.db]
+
+import argparse
+import json
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from database import Database, MIGRATIONS
+from bench.synthetic import populate
+
+def report_queries(db):
+    customer_id = db.conn.execute("SELECT customer_id FROM orders GROUP BY customer_id ORDER BY COUNT(*) DESC LIMIT 1").fetchone()[0]
+    order_id = db.conn.execute("SELECT MAX(id) FROM orders").fetchone()[0]
+    return {
+        "get_all_orders_with_details": (db.get_all_orders_with_details, ()),
+        "get_all_orders_with_details(search)": (db.get_all_orders_with_details, ("Market",)),
+        "get_full_order_details": (db.get_full_order_details, (order_id,)),
+        "get_sales_report_for_customer": (db.get_sales_report_for_customer, (customer_id,)),
+        "get_total_sales(month)": (db.get_total_sales, ("month",)),
+        "get_top_selling_products": (db.get_top_selling_products, (5,)),
+        "get_top_customers_by_value": (db.get_top_customers_by_value, (5,)),
+    }
+
+def query_plan(db, method, args):
+    statements = []; db.clear_query_cache(); db.conn.set_trace_callback(statements.append); method(*args); db.conn.set_trace_callback(None)
+    return [" | ".join(row[3] for row in db.conn.execute(f"EXPLAIN QUERY PLAN {statement}")) for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+
+def measure(db, repeat):
+    results = {}
+    for name, (method, args) in report_queries(db).items():
+        timings = []
+        for _ in range(repeat): db.clear_query_cache(); started = time.perf_counter(); method(*args); timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {"ms": round(sorted(timings)[len(timings) // 2], 3), "plan": query_plan(db, method, args)}
+    return results
+
+def drop_migration_indexes(db):
+    for name, in db.conn.execute("SELECT name FROM sqlite_master WHERE type='index' AND name IN (%s)" % ", ".join("?" * len(index_names())), index_names()).fetchall(): db.conn.execute(f"DROP INDEX {name}")
+    db.conn.execute("DROP TABLE IF EXISTS sqlite_stat1"); db.conn.execute("PRAGMA user_version = 0"); db.conn.commit()
+
+def index_names(): return [statement.split(" ON ")[0].split()[-1] for _, statements in MIGRATIONS for statement in statements if isinstance(statement, str) and statement.startswith("CREATE INDEX")]
+
+def main():
+    parser = argparse.ArgumentParser(description="Query plans and timings before and after the schema index migrations.")
+    parser.add_argument("--items", type=int, default=1_000_000); parser.add_argument("--db", default=os.path.join("bench", "indexes.db")); parser.add_argument("--repeat", type=int, default=5); parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    if os.path.exists(args.db): os.remove(args.db)
+    db = Database(args.db); started = time.perf_counter()
+    populate(db, customers=max(100, args.items // 200), products=max(50, args.items // 1000), orders=args.items // 10)
+    print(f"Generated {db.conn.execute('SELECT COUNT(*) FROM order_items').fetchone()[0]} order_items in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    drop_migration_indexes(db); before = measure(db, args.repeat)
+    started = time.perf_counter(); db._migrate(); migrate_seconds = time.perf_counter() - started; after = measure(db, args.repeat)
+    if args.json: print(json.dumps({"items": args.items, "migrate_seconds": round(migrate_seconds, 2), "before": before, "after": after}, indent=2)); return
+    print(f"Migrations applied in {migrate_seconds:.1f}s (schema version {db.schema_version()})\n")
+    for name in before:
+        print(f"{name}: {before[name]['ms']:.2f} ms -> {after[name]['ms']:.2f} ms")
+        for label, result in (("before", before), ("after", after)): [print(f"    {label}: {plan}") for plan in result[name]["plan"]]
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# agroflow/bench/bench_profiles.py
+# Usage: python -m bench.bench_profiles [--writes 500] [--json]
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from database import Database, DB_PROFILES
+from bench.synthetic import populate
+
+def open_with_profile(db_file, profile_name):
+    db = Database(db_file); db.set_setting("db_profile", profile_name); db.close()
+    return Database(db_file)
+
+def run_profile(directory, profile_name, writes, reads):
+    db_file = os.path.join(directory, f"{profile_name.lower()}.db"); db = open_with_profile(db_file, profile_name)
+    populate(db, customers=2000, products=500, orders=5000)
+    product_ids = [row[0] for row in db.conn.execute("SELECT id FROM products")]; rng = random.Random(7)
+    started = time.perf_counter()
+    for i in range(writes): db.add_customer(f"Bench Customer {i}", "", "", "", "")
+    crud_rate = writes / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for i in range(writes): db.create_order(1, {pid: {"quantity": rng.randint(1, 20)} for pid in rng.sample(product_ids, 8)})
+    order_rate = writes / (time.perf_counter() - started)
+    order_ids = [row[0] for row in db.conn.execute("SELECT id FROM orders")]; timings = []
+    for i in range(reads):
+        started = time.perf_counter(); db.get_full_order_details(rng.choice(order_ids)); db.get_customers("Market", limit=50); timings.append((time.perf_counter() - started) * 1000)
+    timings.sort(); db.close()
+    return {"profile": profile_name, "settings": DB_PROFILES[profile_name], "crud_commits_per_sec": round(crud_rate, 1), "orders_per_sec": round(order_rate, 1), "read_p50_ms": round(timings[len(timings) // 2], 3), "read_p95_ms": round(timings[int(len(timings) * 0.95)], 3)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Write throughput and read latency for each database performance profile.")
+    parser.add_argument("--writes", type=int, default=500); parser.add_argument("--reads", type=int, default=2000); parser.add_argument("--dir", default=None, help="directory for the benchmark databases (defaults to a temp dir)"); parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory: results = [run_profile(directory, name, args.writes, args.reads) for name in DB_PROFILES]
+    if args.json: print(json.dumps(results, indent=2)); return
+    print(f"{'profile':<10}{'crud/s':>10}{'orders/s':>10}{'read p50 ms':>14}{'read p95 ms':>14}")
+    for r in results: print(f"{r['profile']:<10}{r['crud_commits_per_sec']:>10}{r['orders_per_sec']:>10}{r['read_p50_ms']:>14}{r['read_p95_ms']:>14}")
+
+if __name__ == "__main__":
+    main()
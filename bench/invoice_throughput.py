@@ -0,0 +1,44 @@
+# agroflow/bench/invoice_throughput.py
+# Usage: python -m bench.invoice_throughput [--invoices 1000] [--workers 1,4] [--json]
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from database import Database
+from invoices import InvoiceRenderer, SMTPPool, email_invoices
+from bench.synthetic import populate
+from bench.smtp_sink import SMTPSink
+
+def run(directory, invoices, worker_counts, port):
+    db = Database(os.path.join(directory, "invoices.db")); populate(db, customers=2000, products=500, orders=int(invoices * 1.2) + 10)
+    order_ids = db.get_completed_order_ids()[:invoices]; results = {"invoices": len(order_ids), "render": {}}
+    for workers in worker_counts:
+        # The first run includes starting whatever processes the batch size calls for (none up to INVOICE_INLINE_MAX invoices).
+        renderer = InvoiceRenderer(workers); started = time.perf_counter(); renderer.render_orders(db, order_ids, os.path.join(directory, "warm"))
+        first = time.perf_counter() - started; started = time.perf_counter(); rendered, _ = renderer.render_orders(db, order_ids, os.path.join(directory, f"out{workers}"))
+        elapsed = time.perf_counter() - started; renderer.shutdown()
+        results["render"][workers] = {"first_s": round(first, 3), "seconds": round(elapsed, 3), "per_second": round(len(rendered) / elapsed, 1), "mean_kb": round(sum(os.path.getsize(path) for path in rendered.values()) / len(rendered) / 1024, 1)}
+    sink, renderer = SMTPSink(port).start(), InvoiceRenderer(max(worker_counts)); mailer = SMTPPool("127.0.0.1", port)
+    try:
+        started = time.perf_counter(); sent, skipped, _ = email_invoices(db, renderer, mailer, order_ids, os.path.join(directory, "mail")); elapsed = time.perf_counter() - started
+        results["email"] = {"sent": sent, "skipped": skipped, "seconds": round(elapsed, 3), "per_second": round(sent / elapsed, 1), "smtp_connections": sink.connections}
+    finally: mailer.close(); renderer.shutdown(); sink.stop(); db.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Invoice render and delivery throughput against a local stand-in SMTP server.")
+    parser.add_argument("--invoices", type=int, default=1000); parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}")
+    parser.add_argument("--port", type=int, default=8025); parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory: results = run(directory, args.invoices, sorted({int(n) for n in args.workers.split(",")}), args.port)
+    if args.json: print(json.dumps(results, indent=2)); return
+    print(f"{results['invoices']:,} invoices")
+    for workers, row in results["render"].items(): print(f"  render, up to {workers} process(es): {row['seconds']:.2f}s ({row['per_second']:,.0f}/s, {row['mean_kb']} KB each; first run {row['first_s']:.2f}s)")
+    email = results["email"]; print(f"  email: {email['sent']:,} sent in {email['seconds']:.2f}s ({email['per_second']:,.0f}/s) over {email['smtp_connections']} SMTP connection(s); {email['skipped']:,} skipped")
+
+if __name__ == "__main__":
+    main()
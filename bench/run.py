@@ -0,0 +1,135 @@
+# agroflow/bench/run.py
+# Usage: python -m bench.run [--scales small,medium] [--repeat 7] [--output results.json] [--compare baseline.json]
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from database import Database
+from bench.synthetic import populate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+# (customers, products, orders); orders average ~10 items each.
+SCALES = {"small": (1000, 200, 5000), "medium": (10000, 1000, 50000), "large": (50000, 5000, 500000)}
+IMPORT_ROWS = 10000
+BULK_ORDERS = 5000
+
+def read_cases(db, rng):
+    customer_id = db.conn.execute("SELECT customer_id FROM orders GROUP BY customer_id ORDER BY COUNT(*) DESC LIMIT 1").fetchone()[0]
+    order_ids = [row[0] for row in db.conn.execute("SELECT id FROM orders ORDER BY RANDOM() LIMIT 50")]
+    last_page = db.get_orders_page(); after = (last_page[-1]['order_date'], last_page[-1]['id']) if last_page else None
+    return {
+        "get_customers": lambda: db.get_customers(),
+        "get_customers(search)": lambda: db.get_customers("Market"),
+        "get_customers(page)": lambda: db.get_customers("Gr", limit=50),
+        "get_products": lambda: db.get_products(),
+        "get_products(search)": lambda: db.get_products("Lot 1"),
+        "get_all_orders_with_details": lambda: db.get_all_orders_with_details(),
+        "get_all_orders_with_details(search)": lambda: db.get_all_orders_with_details("Market"),
+        "get_orders_page": lambda: db.get_orders_page(),
+        "get_orders_page(next)": lambda: db.get_orders_page(after=after),
+        "get_orders_page(search)": lambda: db.get_orders_page("Market"),
+        "get_full_order_details": lambda: db.get_full_order_details(rng.choice(order_ids)),
+        "get_order_items": lambda: db.get_order_items(rng.choice(order_ids)),
+        "get_order_status": lambda: db.get_order_status(rng.choice(order_ids)),
+        "get_sales_report_for_customer": lambda: db.get_sales_report_for_customer(customer_id),
+        "get_customer_statement_summary": lambda: db.get_customer_statement_summary(customer_id, datetime.now() - timedelta(days=365)),
+        "get_customer_statement_page": lambda: db.get_customer_statement_page(customer_id),
+        "get_total_sales(day)": lambda: db.get_total_sales("day"),
+        "get_total_sales(month)": lambda: db.get_total_sales("month"),
+        "get_top_selling_products": lambda: db.get_top_selling_products(5),
+        "get_top_customers_by_value": lambda: db.get_top_customers_by_value(5),
+        "get_setting": lambda: db.get_setting("theme"),
+        "verify_user": lambda: db.verify_user("admin", "admin"),
+    }
+
+def write_cases(db, rng, directory):
+    product_ids = [row[0] for row in db.conn.execute("SELECT id FROM products")]; customer_ids = [row[0] for row in db.conn.execute("SELECT id FROM customers LIMIT 1000")]
+    created, counter = [], iter(range(10**9))
+    def fulfil():
+        order_id = created.pop() if created else db.create_order(rng.choice(customer_ids), {pid: {"quantity": 5} for pid in rng.sample(product_ids, 10)})
+        db.update_order_fulfillment({row['id']: {"out_of_stock": rng.random() < 0.05, "price": round(rng.uniform(1, 40), 2)} for row in db.get_order_items(order_id)})
+    def import_csv():
+        path = os.path.join(directory, "import.csv"); start = next(counter) * IMPORT_ROWS
+        with open(path, "w", newline="", encoding="utf-8") as f: writer = csv.writer(f); writer.writerow(["name", "email", "phone", "address", "notes"]); writer.writerows((f"Imported Buyer {start + i}", f"imported{start + i}@example.com", "", "", "") for i in range(IMPORT_ROWS))
+        db.import_from_csv(path, "customers")
+    def import_orders():
+        path = os.path.join(directory, "orders_import.csv"); names = [row[0] for row in db.conn.execute("SELECT name FROM customers LIMIT 1000")]; products = [row[0] for row in db.conn.execute("SELECT name FROM products")]
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f); writer.writerow(["order_ref", "customer", "product", "quantity"])
+            for n in range(BULK_ORDERS): customer = rng.choice(names); writer.writerows((f"B{n}", customer, product, rng.randint(1, 20)) for product in rng.sample(products, 10))
+        db.import_orders_from_csv(path)
+    def update_customer(): customer_id = rng.choice(customer_ids); db.update_customer(customer_id, f"Renamed Buyer {customer_id}", "", "", "", "")
+    def add_delete_customer(): db.add_customer(f"Temporary Buyer {next(counter)}", "", "", "", ""); db.delete_customer(db.cursor.lastrowid)
+    return {
+        "create_order": lambda: created.append(db.create_order(rng.choice(customer_ids), {pid: {"quantity": rng.randint(1, 20)} for pid in rng.sample(product_ids, 10)})),
+        "update_order_fulfillment": fulfil,
+        f"create_orders({BULK_ORDERS})": lambda: db.create_orders([(rng.choice(customer_ids), {pid: rng.randint(1, 20) for pid in rng.sample(product_ids, 10)}) for _ in range(BULK_ORDERS)]),
+        f"import_orders_from_csv({BULK_ORDERS} orders)": import_orders,
+        "update_customer": update_customer,
+        "add_customer+delete_customer": add_delete_customer,
+        "set_setting": lambda: db.set_setting("bench_marker", str(next(counter))),
+        f"import_from_csv({IMPORT_ROWS} rows)": import_csv,
+        "export_to_file(orders csv)": lambda: db.export_to_file("orders", os.path.join(directory, "orders.csv")),
+        "rebuild_sales_rollups": lambda: db.rebuild_sales_rollups(),
+    }
+
+def time_case(db, fn, repeat, cached):
+    timings = []
+    for _ in range(repeat):
+        if not cached: db.clear_query_cache()
+        started = time.perf_counter(); fn(); timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {"median_ms": round(timings[len(timings) // 2], 3), "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3), "min_ms": round(timings[0], 3), "runs": repeat}
+
+def run_scale(directory, scale, repeat, cached):
+    customers, products, orders = SCALES[scale]; db = Database(os.path.join(directory, f"{scale}.db")); rng = random.Random(99)
+    started = time.perf_counter(); populate(db, customers=customers, products=products, orders=orders); build_seconds = time.perf_counter() - started
+    results = {name: time_case(db, fn, repeat, cached) for name, fn in read_cases(db, rng).items()}
+    results.update({name: time_case(db, fn, repeat, cached) for name, fn in write_cases(db, rng, directory).items()})
+    rows = {table: db.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("customers", "products", "orders", "order_items")}; db.close()
+    return {"rows": rows, "build_seconds": round(build_seconds, 2), "methods": results}
+
+def metadata():
+    try: commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError: commit = None
+    return {"commit": commit, "timestamp": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "platform": platform.platform()}
+
+def compare(current, baseline, threshold):
+    # Prints methods whose median moved by more than threshold (a ratio, e.g. 0.2 = 20%) against a previous run.
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+    for scale, result in current["scales"].items():
+        for name, stats in result["methods"].items():
+            before = baseline["scales"].get(scale, {}).get("methods", {}).get(name)
+            if not before or not before["median_ms"]: continue
+            ratio = stats["median_ms"] / before["median_ms"]
+            if abs(ratio - 1) > threshold: print(f"  {'SLOWER' if ratio > 1 else 'faster'} {scale:<7}{name:<40}{before['median_ms']:>10.3f} -> {stats['median_ms']:>10.3f} ms ({ratio:.2f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the public Database methods on synthetic databases of several sizes.")
+    parser.add_argument("--scales", default="small,medium", help=f"comma-separated, from {', '.join(SCALES)}"); parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--cached", action="store_true", help="leave the query cache on between repetitions (default measures uncached reads)")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout"); parser.add_argument("--compare", help="a previous JSON result to diff against"); parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--dir", default=None, help="directory for the benchmark databases (defaults to a temp dir)")
+    args = parser.parse_args(); scales = [scale.strip() for scale in args.scales.split(",") if scale.strip()]
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown: parser.error(f"unknown scale(s): {', '.join(unknown)}")
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        current = {"meta": dict(metadata(), repeat=args.repeat, cached=args.cached), "scales": {}}
+        for scale in scales: print(f"Running {scale} {SCALES[scale]}...", file=sys.stderr); current["scales"][scale] = run_scale(directory, scale, args.repeat, args.cached)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: json.dump(current, f, indent=2)
+    else: print(json.dumps(current, indent=2))
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f: compare(current, json.load(f), args.threshold)
+
+if __name__ == "__main__": main()
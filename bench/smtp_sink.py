@@ -0,0 +1,60 @@
+# agroflow/bench/smtp_sink.py
+# Usage: python -m bench.smtp_sink [--port 8025] [--save data/outbox]
+# A local stand-in SMTP server for trying invoice delivery: set the SMTP host to localhost and the port to 8025 in Settings.
+
+import argparse
+import os
+import socketserver
+import threading
+import time
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    # Accepts every message without authentication or TLS; keeps counts of connections and messages and optionally writes .eml files.
+    daemon_threads, allow_reuse_address = True, True
+
+    def __init__(self, port=8025, save_dir=None, host="127.0.0.1"):
+        super().__init__((host, port), SMTPSession); self.save_dir, self.lock, self.messages, self.connections = save_dir, threading.Lock(), [], 0
+        if save_dir: os.makedirs(save_dir, exist_ok=True)
+
+    def deliver(self, sender, recipients, data):
+        with self.lock:
+            self.messages.append((sender, recipients, len(data)))
+            if self.save_dir:
+                with open(os.path.join(self.save_dir, f"{len(self.messages):06d}.eml"), "wb") as f: f.write(data)
+
+    def start(self): threading.Thread(target=self.serve_forever, daemon=True).start(); return self
+    def stop(self): self.shutdown(); self.server_close()
+
+class SMTPSession(socketserver.StreamRequestHandler):
+    def reply(self, line): self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        with self.server.lock: self.server.connections += 1
+        self.reply("220 agroflow-sink ESMTP"); sender, recipients = None, []
+        for raw in self.rfile:
+            command = raw.decode("latin-1").strip(); verb = command[:4].upper()
+            if verb == "EHLO": self.reply("250-agroflow-sink"); self.reply("250-SIZE 52428800"); self.reply("250 8BITMIME")
+            elif verb == "HELO": self.reply("250 agroflow-sink")
+            elif verb == "MAIL": sender, recipients = command[10:].strip(" <>"), []; self.reply("250 OK")
+            elif verb == "RCPT": recipients.append(command[8:].strip(" <>")); self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>"); lines = []
+                for line in self.rfile:
+                    if line in (b".\r\n", b".\n"): break
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                self.server.deliver(sender, recipients, b"".join(lines)); self.reply("250 OK")
+            elif verb in ("RSET", "NOOP"): self.reply("250 OK")
+            elif verb == "QUIT": self.reply("221 Bye"); return
+            else: self.reply("502 Command not implemented")
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in SMTP server that accepts and counts every message.")
+    parser.add_argument("--port", type=int, default=8025); parser.add_argument("--save", default=None, help="write each message to this directory as .eml")
+    args = parser.parse_args(); sink = SMTPSink(args.port, args.save).start(); print(f"Listening on 127.0.0.1:{args.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5); print(f"{len(sink.messages):,} messages over {sink.connections:,} connections", end="\r")
+    except KeyboardInterrupt: sink.stop(); print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# agroflow/bench/startup_timing.py
+# Usage: python -m bench.startup_timing [--runs 5] [--username admin --password admin] [--json]
+# Needs a display (use xvfb-run on a headless box). Each run is a fresh process so the image cache starts cold.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+def elapsed_ms(started): return round((time.perf_counter() - started) * 1000, 2)
+
+def measure(username, password):
+    started = time.perf_counter(); import app; timings = {"import": elapsed_ms(started)}
+    started = time.perf_counter(); window = app.App(); window.update(); timings["login_screen"] = elapsed_ms(started)
+    user = window.db.verify_user(username, password)
+    if not user: raise SystemExit(f"Could not log in as '{username}'.")
+    started = time.perf_counter(); window.show_main_app(user); window.update(); timings["dashboard"] = elapsed_ms(started)
+    for page_name in window.frame_classes:
+        if page_name in window.frames: continue
+        started = time.perf_counter(); window.select_frame(page_name); window.update(); timings[f"first_visit_{page_name}"] = elapsed_ms(started)
+    window.logout(); window.update()
+    started = time.perf_counter(); window.show_main_app(user); window.update(); timings["dashboard_after_relogin"] = elapsed_ms(started)
+    window.on_closing()
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-login-screen and time-to-dashboard for the desktop app.")
+    parser.add_argument("--runs", type=int, default=5); parser.add_argument("--username", default="admin"); parser.add_argument("--password", default="admin"); parser.add_argument("--json", action="store_true"); parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child: print(json.dumps(measure(args.username, args.password))); return
+    command = [sys.executable, "-m", "bench.startup_timing", "--child", "--username", args.username, "--password", args.password]
+    runs = [json.loads(subprocess.run(command, check=True, capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.realpath(__file__)))).stdout.strip().splitlines()[-1]) for _ in range(args.runs)]
+    summary = {key: {"min_ms": min(run[key] for run in runs), "median_ms": sorted(run[key] for run in runs)[len(runs) // 2]} for key in runs[0]}
+    if args.json: print(json.dumps({"runs": runs, "summary": summary}, indent=2)); return
+    for key, stats in summary.items(): print(f"{key:<36} median {stats['median_ms']:>9.2f} ms   min {stats['min_ms']:>9.2f} ms")
+
+if __name__ == "__main__": main()
@@ -0,0 +1,66 @@
+# agroflow/bench/stress_pool.py
+# Usage: python -m bench.stress_pool [--seconds 10] [--profile Safe] [--json]
+
+import argparse
+import csv
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from database import Database, DB_PROFILES, DEFAULT_DB_PROFILE
+from workers import DataAccessPool
+from bench.synthetic import populate
+
+def write_customer_csv(path, rows, offset):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f); writer.writerow(["name", "email", "phone", "address", "notes"])
+        writer.writerows((f"Stress Import {offset + i}", f"stress{offset + i}@example.com", "", "", "") for i in range(rows))
+
+def run(directory, seconds, profile, import_rows):
+    db_file = os.path.join(directory, "stress.db"); db = Database(db_file); db.set_setting("db_profile", profile)
+    populate(db, customers=5000, products=500, orders=20000); product_ids = [row[0] for row in db.conn.execute("SELECT id FROM products")]; db.close()
+    pool, rng, stop = DataAccessPool(db_file), random.Random(11), threading.Event()
+    stats = {"reads": 0, "writes": 0, "imports": 0, "locked_errors": 0, "other_errors": 0}; lock, read_ms = threading.Lock(), []
+    def record(future, key, started=None):
+        error = future.exception()
+        with lock:
+            if error is None: stats[key] += 1; started is not None and read_ms.append((time.perf_counter() - started) * 1000)
+            elif isinstance(error, sqlite3.OperationalError) and "locked" in str(error): stats["locked_errors"] += 1
+            else: stats["other_errors"] += 1
+    def reader():
+        # Mirrors what the frames issue while the user scrolls and types: keyset pages and customer searches. The query cache is
+        # cleared first so every read reaches SQLite.
+        while not stop.is_set():
+            for method, term, *args in (("get_orders_page", rng.choice(["", "Market", "Green"])), ("get_customers", rng.choice(["Val", "Harvest 1", "Deli"]), 50)):
+                started = time.perf_counter(); future = pool.read(lambda db, method=method, term=term, args=args: (db.clear_query_cache(), getattr(db, method)(term, *args))[1])
+                future.add_done_callback(lambda f, s=started: record(f, "reads", s)); future.exception()
+    def writer():
+        imports = 0
+        while not stop.is_set():
+            csv_path = os.path.join(directory, f"import_{imports}.csv"); write_customer_csv(csv_path, import_rows, imports * import_rows)
+            futures = [pool.write("import_from_csv", csv_path, "customers")] + [pool.write("create_order", 1, {pid: {"quantity": rng.randint(1, 20)} for pid in rng.sample(product_ids, 8)}) for _ in range(50)]
+            record(futures[0], "imports")
+            for future in futures[1:]: record(future, "writes")
+            imports += 1
+    threads = [threading.Thread(target=reader) for _ in range(4)] + [threading.Thread(target=writer)]
+    for thread in threads: thread.start()
+    time.sleep(seconds); stop.set()
+    for thread in threads: thread.join()
+    pool.close(); read_ms.sort()
+    return dict(stats, profile=profile, seconds=seconds, read_p50_ms=round(read_ms[len(read_ms) // 2], 3) if read_ms else None, read_p99_ms=round(read_ms[int(len(read_ms) * 0.99)], 3) if read_ms else None)
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent reads through the data access pool while bulk imports and order writes run.")
+    parser.add_argument("--seconds", type=float, default=10); parser.add_argument("--profile", choices=list(DB_PROFILES), default=DEFAULT_DB_PROFILE); parser.add_argument("--import-rows", type=int, default=20000); parser.add_argument("--dir", default=None, help="directory for the benchmark database (defaults to a temp dir)"); parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory: result = run(directory, args.seconds, args.profile, args.import_rows)
+    if args.json: print(json.dumps(result, indent=2)); return
+    print(f"{result['profile']}: {result['reads']:,} reads, {result['writes']:,} order writes, {result['imports']} imports in {result['seconds']}s")
+    print(f"  read p50 {result['read_p50_ms']} ms, p99 {result['read_p99_ms']} ms; 'database is locked' errors: {result['locked_errors']}, other errors: {result['other_errors']}")
+
+if __name__ == "__main__": main()
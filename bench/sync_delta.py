@@ -0,0 +1,65 @@
+# agroflow/bench/sync_delta.py
+# Usage: python -m bench.sync_delta [--orders 100000] [--days 730] [--json]
+# Builds a database with --days of history, copies it to a second node, then measures the bundle for one typical day
+# (a day's worth of new, fulfilled orders plus a few customer and product edits) against the database size. Also times bulk
+# order intake on a database that doesn't sync (no change capture) and on one that does.
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from database import Database
+from bench.synthetic import populate
+import sync
+
+def simulate_day(db, orders, edits=20, seed=7):
+    rng = random.Random(seed); customers = [row[0] for row in db.conn.execute("SELECT id FROM customers")]; products = [row[0] for row in db.conn.execute("SELECT id FROM products")]
+    for _ in range(orders):
+        order_id = db.create_order(rng.choice(customers), {product_id: rng.randint(1, 50) for product_id in rng.sample(products, rng.randint(1, 19))})
+        db.update_order_fulfillment({item_id: {"price": round(rng.uniform(0.5, 40.0), 2), "out_of_stock": rng.random() < 0.03} for (item_id,) in db.conn.execute("SELECT id FROM order_items WHERE order_id = ?", (order_id,))})
+    for customer_id in rng.sample(customers, edits): db.conn.execute("UPDATE customers SET notes = ? WHERE id = ?", (f"called {rng.randint(1, 9)}", customer_id))
+    for product_id in rng.sample(products, edits): db.conn.execute("UPDATE products SET master_price = ? WHERE id = ?", (round(rng.uniform(0.5, 40.0), 2), product_id))
+    db.conn.commit()
+
+def run(directory, orders, days):
+    main_file, copy_file = os.path.join(directory, "main.db"), os.path.join(directory, "laptop.db")
+    main = Database(main_file); populate(main, customers=max(orders // 50, 100), products=500, orders=orders, days=days)
+    laptop_node = sync.clone(main, copy_file); laptop = Database(copy_file)
+    # The laptop's first bundle acknowledges everything it was copied with.
+    sync.export_file(laptop, os.path.join(directory, "hello.agsync"), sync.status(main)["node"]); sync.import_file(main, os.path.join(directory, "hello.agsync"))
+    day_orders = max(orders // days, 1); simulate_day(main, day_orders)
+    bundle = os.path.join(directory, "day.agsync"); started = time.perf_counter(); header = sync.export_file(main, bundle, laptop_node); exported = time.perf_counter() - started
+    started = time.perf_counter(); applied = sync.import_file(laptop, bundle); imported = time.perf_counter() - started
+    size = os.path.getsize(main_file); main.close(); laptop.close()
+    return {"database_bytes": size, "day_orders": day_orders, "changes": header["counts"], "bundle_bytes": header["bytes"], "share": header["bytes"] / size, "export_s": round(exported, 3), "import_s": round(imported, 3), "applied": applied["applied"], "intake": intake(directory)}
+
+def intake(directory, batches=4, batch=5000, seed=11):
+    # create_orders throughput (10 lines per order) on a database that doesn't sync and on one that does.
+    rates = {}
+    for label in ("sync_off", "sync_on"):
+        db = Database(os.path.join(directory, f"intake_{label}.db")); populate(db, customers=1000, products=500, orders=0); rng = random.Random(seed)
+        if label == "sync_on":
+            with db.conn: sync.begin(db); sync.identity(db)
+        customers = [row[0] for row in db.conn.execute("SELECT id FROM customers")]; products = [row[0] for row in db.conn.execute("SELECT id FROM products")]
+        carts = [[(rng.choice(customers), {product_id: rng.randint(1, 20) for product_id in rng.sample(products, 10)}) for _ in range(batch)] for _ in range(batches)]
+        started = time.perf_counter()
+        for orders in carts: db.create_orders(orders)
+        rates[label] = round(batches * batch / (time.perf_counter() - started)); db.close()
+    return rates
+
+def main():
+    parser = argparse.ArgumentParser(description="Size of a one-day sync bundle relative to the database.")
+    parser.add_argument("--orders", type=int, default=100000); parser.add_argument("--days", type=int, default=730); parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory: results = run(directory, args.orders, args.days)
+    if args.json: print(json.dumps(results, indent=2)); return
+    print(f"database {results['database_bytes'] / 1e6:,.1f} MB; one day = {results['day_orders']:,} orders, {sum(results['changes'].values()):,} changed rows")
+    print(f"intake: {results['intake']['sync_off']:,} orders/s without sync, {results['intake']['sync_on']:,} orders/s once syncing (10 lines each)")
+    print(f"bundle {results['bundle_bytes']:,} bytes ({results['share']:.3%} of the database); export {results['export_s']:.2f}s, import {results['import_s']:.2f}s ({results['applied']:,} rows applied)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# agroflow/bench/synthetic.py
+
+import random
+from datetime import datetime, timedelta
+
+FIRST_WORDS = ["Green", "Valley", "Sunrise", "Harvest", "Golden", "River", "Hillside", "Fresh", "Orchard", "Prairie", "Coastal", "Maple"]
+SECOND_WORDS = ["Market", "Grocers", "Bistro", "Deli", "Cafe", "Kitchen", "Foods", "Co-op", "Provisions", "Table", "Pantry", "Eatery"]
+PRODUCE = ["Apples", "Pears", "Carrots", "Potatoes", "Onions", "Lettuce", "Tomatoes", "Peppers", "Spinach", "Kale", "Berries", "Grapes", "Lemons", "Limes", "Squash", "Beets"]
+CATEGORIES = ["Fruit", "Vegetable", "Greens", "Root", "Citrus"]
+
+def populate(db, customers, products, orders, items_per_order=10, days=730, completed_ratio=0.9, seed=42, end=None):
+    # Deterministic for a given seed and end date; writes straight through db.conn so large scales build quickly,
+    # then rebuilds the sales rollups so the reports see the generated orders.
+    rng, end = random.Random(seed), end or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=days)
+    db.conn.executemany("INSERT INTO customers (name, email, phone, address, notes) VALUES (?, ?, ?, ?, ?)", ((f"{rng.choice(FIRST_WORDS)} {rng.choice(SECOND_WORDS)} {i}", f"buyer{i}@example.com", f"555-{i:07d}", f"{i} Farm Road", "") for i in range(customers)))
+    db.conn.executemany("INSERT INTO products (name, master_price, category) VALUES (?, ?, ?)", ((f"{rng.choice(PRODUCE)} Lot {i}", round(rng.uniform(0.5, 40.0), 2), rng.choice(CATEGORIES)) for i in range(products)))
+    customer_ids = [row[0] for row in db.conn.execute("SELECT id FROM customers ORDER BY id")]
+    product_ids = [row[0] for row in db.conn.execute("SELECT id FROM products ORDER BY id")]
+    first_order_id = (db.conn.execute("SELECT MAX(id) FROM orders").fetchone()[0] or 0) + 1
+    step = timedelta(days=days) / max(orders, 1)
+    for batch_start in range(0, orders, 10000):
+        order_rows, item_rows = [], []
+        for n in range(batch_start, min(batch_start + 10000, orders)):
+            order_id, completed = first_order_id + n, rng.random() < completed_ratio
+            customer_id = customer_ids[min(int(rng.paretovariate(1.2)) - 1, len(customer_ids) - 1) if rng.random() < 0.5 else rng.randrange(len(customer_ids))]
+            total = 0.0
+            for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(1, items_per_order * 2 - 1))):
+                quantity, out_of_stock = rng.randint(1, 50), completed and rng.random() < 0.03
+                price = None if not completed else (0 if out_of_stock else round(rng.uniform(0.5, 40.0), 2))
+                if completed and not out_of_stock: total += price * quantity
+                item_rows.append((order_id, product_id, quantity, price, 1 if out_of_stock else 0))
+            order_date = start + step * n + timedelta(seconds=rng.randint(0, 3600))
+            order_rows.append((order_id, customer_id, order_date.isoformat(" "), "Completed" if completed else "Pending Vendor", round(total, 2) if completed else None))
+        db.conn.executemany("INSERT INTO orders (id, customer_id, order_date, status, total_invoice) VALUES (?, ?, ?, ?, ?)", order_rows)
+        db.conn.executemany("INSERT INTO order_items (order_id, product_id, quantity, final_price, is_out_of_stock) VALUES (?, ?, ?, ?, ?)", item_rows)
+    db.conn.commit(); db.rebuild_sales_rollups(); db.clear_query_cache()
@@ -0,0 +1,81 @@
+# agroflow/catalog.py
+
+import sys
+from array import array
+from bisect import bisect_left
+
+class ProductCatalog:
+    # In-memory product list for order entry. Columns are parallel arrays indexed by row; `_rows` maps product id -> row and
+    # `_keys`/`_key_rows` keep casefolded names sorted for prefix search. Rows are swap-removed, so row numbers are not stable.
+    __slots__ = ("ids", "names", "prices", "categories", "_rows", "_keys", "_key_rows")
+
+    def __init__(self, rows=()):
+        self.ids, self.names, self.prices, self.categories, self._rows = array("q"), [], array("d"), [], {}
+        for product_id, name, price, category in rows: self._append(product_id, name, price, category)
+        order = sorted(range(len(self.names)), key=self._key_of)
+        self._keys, self._key_rows = [self._key_of(row) for row in order], array("l", order)
+
+    def __len__(self): return len(self.ids)
+    def __contains__(self, product_id): return product_id in self._rows
+    def name(self, product_id): row = self._rows.get(product_id); return None if row is None else self.names[row]
+    def price(self, product_id): row = self._rows.get(product_id); return None if row is None else self.prices[row]
+    def get(self, product_id):
+        row = self._rows.get(product_id)
+        return None if row is None else {"id": product_id, "name": self.names[row], "master_price": self.prices[row], "category": self.categories[row]}
+
+    def search(self, term="", limit=None, substrings=True):
+        # Name-prefix matches first, then substring matches, each in name order (the same sets Database.get_products returns).
+        # Returns product ids. The prefix matches are a bisect; substrings=False skips the scan over every name.
+        if not term: rows = self._key_rows if limit is None else self._key_rows[:limit]; return [self.ids[row] for row in rows]
+        term = term.casefold(); position = bisect_left(self._keys, term); found = []
+        while position < len(self._keys) and self._keys[position].startswith(term) and (limit is None or len(found) < limit): found.append(self.ids[self._key_rows[position]]); position += 1
+        if substrings and (limit is None or len(found) < limit):
+            for position, key in enumerate(self._keys):
+                if term in key and not key.startswith(term):
+                    found.append(self.ids[self._key_rows[position]])
+                    if limit is not None and len(found) >= limit: break
+        return found
+
+    def diff(self, rows):
+        # Compares a full (id, name, price, category) listing with the catalog; returns (upserts, removed ids) for apply().
+        # Only reads the catalog, so it can run on a worker thread while the Tk thread keeps using it.
+        upserts, seen = [], set()
+        for product_id, name, price, category in rows:
+            seen.add(product_id); row = self._rows.get(product_id)
+            if row is None or self.names[row] != name or self.prices[row] != price or self.categories[row] != category: upserts.append((product_id, name, price, category))
+        return upserts, [product_id for product_id in self._rows if product_id not in seen]
+
+    def apply(self, changes):
+        upserts, removed = changes
+        for product_id in removed: self.remove(product_id)
+        for row in upserts: self.upsert(*row)
+        return bool(upserts or removed)
+
+    def upsert(self, product_id, name, price, category):
+        row = self._rows.get(product_id)
+        if row is None: row = self._append(product_id, name, price, category); self._insert_key(row); return
+        if self.names[row] != name: self._remove_key(row); self.names[row] = name; self._insert_key(row)
+        self.prices[row], self.categories[row] = price, sys.intern(category) if category else category
+
+    def remove(self, product_id):
+        row = self._rows.pop(product_id, None)
+        if row is None: return
+        self._remove_key(row); last = len(self.ids) - 1
+        if row != last:
+            # Move the last row into the gap and repoint its sorted-index entry.
+            self._key_rows[self._find_key(last)] = row; self._rows[self.ids[last]] = row
+            self.ids[row], self.names[row], self.prices[row], self.categories[row] = self.ids[last], self.names[last], self.prices[last], self.categories[last]
+        self.ids.pop(); self.names.pop(); self.prices.pop(); self.categories.pop()
+
+    def _append(self, product_id, name, price, category):
+        row = len(self.ids); self._rows[product_id] = row
+        self.ids.append(product_id); self.names.append(name); self.prices.append(price or 0.0); self.categories.append(sys.intern(category) if category else category)
+        return row
+    def _key_of(self, row): key = self.names[row].casefold(); return self.names[row] if key == self.names[row] else key
+    def _insert_key(self, row):
+        key = self._key_of(row); position = bisect_left(self._keys, key); self._keys.insert(position, key); self._key_rows.insert(position, row)
+    def _remove_key(self, row): position = self._find_key(row); del self._keys[position]; del self._key_rows[position]
+    def _find_key(self, row):
+        position = bisect_left(self._keys, self._key_of(row))
+        while self._key_rows[position] != row: position += 1
+        return position
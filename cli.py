@@ -0,0 +1,111 @@
+# agroflow/cli.py
+# Headless entry point: python cli.py [--db data/agroflow.db] <command> ...
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from database import Database, DB_FILE, EXPORT_QUERIES, EXPORT_FORMATS
+from invoices import InvoiceRenderer, SMTPPool, INVOICE_DIR, email_invoices
+import sync
+
+def cmd_export(db, args):
+    exported, _ = db.export_to_file(args.dataset, args.output, args.format, progress=None if args.quiet else lambda rows: print(f"\r{rows:,} rows", end="", file=sys.stderr))
+    print(f"{'' if args.quiet else chr(10)}Exported {exported:,} rows from '{args.dataset}' to {args.output}")
+
+def cmd_import_orders(db, args):
+    started = time.perf_counter(); imported, skipped, _ = db.import_orders_from_csv(args.file, progress=None if args.quiet else lambda orders, skipped, rate: print(f"\r{orders:,} orders ({rate:,.0f}/s)", end="", file=sys.stderr))
+    elapsed = time.perf_counter() - started; print(f"{'' if args.quiet else chr(10)}Imported {imported:,} orders in {elapsed:.2f}s ({imported / max(elapsed, 1e-6):,.0f}/s); {skipped:,} lines skipped")
+
+def cmd_rebuild_rollups(db, args):
+    started = time.perf_counter(); db.rebuild_sales_rollups(); print(f"Sales rollups rebuilt in {time.perf_counter() - started:.2f}s")
+
+def cmd_render_invoices(db, args):
+    end = args.to_date and args.to_date + timedelta(days=1); order_ids = db.get_completed_order_ids(args.from_date, end)
+    renderer, started = InvoiceRenderer(args.workers), time.perf_counter()
+    try:
+        if args.email:
+            mailer = SMTPPool.from_settings(db)
+            try: sent, skipped, _ = email_invoices(db, renderer, mailer, order_ids, args.out, progress=None if args.quiet else lambda sent, total: print(f"\r{sent:,} of {total:,} sent", end="", file=sys.stderr))
+            finally: mailer.close()
+            print(f"{'' if args.quiet else chr(10)}Emailed {sent:,} invoices in {time.perf_counter() - started:.2f}s; {skipped:,} orders without a customer email address"); return
+        rendered, _ = renderer.render_orders(db, order_ids, args.out, progress=None if args.quiet else lambda done, total, rate: print(f"\r{done:,} of {total:,} invoices ({rate:,.0f}/s)", end="", file=sys.stderr))
+    finally: renderer.shutdown()
+    print(f"{'' if args.quiet else chr(10)}Rendered {len(rendered):,} invoices to {args.out} in {time.perf_counter() - started:.2f}s")
+
+def describe_sync(result):
+    received = result["received"]; sent = sum(result["sent"].values())
+    return f"{sent:,} changes sent ({result['sent_bytes']:,} bytes); {received['applied']:,} applied, {received['deleted']:,} deleted, {received['skipped']:,} already current, {received['unresolved']:,} unresolved"
+
+def cmd_sync(db, args):
+    if args.action == "status":
+        info = sync.status(db)
+        if info["node"] is None: print("Sync is not enabled on this database; any sync action enables it (use 'sync clone' to set up a second installation)."); return
+        print(f"Node {info['node']} (origin {info['origin']}), sequence {info['sequence']:,}")
+        for peer, marks in info["peers"].items(): print(f"  {peer}: received up to {marks['received']:,}; acknowledged up to {marks['acked']:,}, {marks['pending']:,} changed rows to send")
+    elif args.action == "new-node": print(f"This database is now node {sync.new_node(db)}")
+    elif args.action == "compact":
+        started = time.perf_counter(); folded = sync.compact(db)
+        print(f"Change log folded up to #{folded:,} in {time.perf_counter() - started:.2f}s" if sync.enabled(db) else "Sync is not enabled on this database; there is no change log to fold.")
+    elif args.action == "clone": print(f"Copied to {args.file} as node {sync.clone(db, args.file)}; this database is node {sync.status(db)['node']}")
+    elif args.action == "export":
+        header = sync.export_file(db, args.file, args.peer, args.full); size = os.path.getsize(db.db_file)
+        print(f"Wrote {sum(header['counts'].values()):,} changes ({', '.join(f'{n:,} {table}' for table, n in header['counts'].items())}) to {args.file}: {header['bytes']:,} bytes, {header['bytes'] / size:.3%} of the database")
+    elif args.action == "import":
+        result = sync.import_file(db, args.file)
+        print(f"From {result['node']}: {result['applied']:,} applied, {result['deleted']:,} deleted, {result['skipped']:,} already current, {result['unresolved']:,} unresolved")
+        if result["gap"]: print("Warning: this bundle starts after the last one received from that node; ask for a new one with --full.", file=sys.stderr)
+    elif args.action == "serve":
+        server = sync.SyncServer(db, args.host, args.port, on_sync=lambda result: print(f"{datetime.now():%H:%M:%S} {result['peer']}: {describe_sync(result)}"))
+        print(f"Serving sync on {args.host}:{args.port} (Ctrl+C to stop)")
+        try: server.serve_forever()
+        except KeyboardInterrupt: pass
+        finally: server.server_close()
+    else:
+        host, _, port = args.address.partition(":"); result = sync.connect(db, host, int(port or sync.SYNC_PORT), args.full)
+        print(f"Synced with {result['peer']}: {describe_sync(result)}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="agroflow", description="Headless AgroFlow tools.")
+    parser.add_argument("--db", default=DB_FILE, help=f"database file (default: {DB_FILE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="stream a table or report to CSV or Parquet")
+    export.add_argument("dataset", choices=list(EXPORT_QUERIES)); export.add_argument("output")
+    export.add_argument("--format", choices=EXPORT_FORMATS, default=None, help="defaults to the output file extension"); export.add_argument("--quiet", action="store_true")
+    export.set_defaults(handler=cmd_export)
+    import_orders = commands.add_parser("import-orders", help="bulk-create orders from a CSV of order_ref, customer, product, quantity[, order_date] lines")
+    import_orders.add_argument("file"); import_orders.add_argument("--quiet", action="store_true")
+    import_orders.set_defaults(handler=cmd_import_orders)
+    render = commands.add_parser("render-invoices", help="render PDF invoices for completed orders, optionally emailing them with the smtp_* settings")
+    date = lambda value: datetime.strptime(value, "%Y-%m-%d")
+    render.add_argument("--from", dest="from_date", type=date, help="first order date (YYYY-MM-DD)"); render.add_argument("--to", dest="to_date", type=date, help="last order date, inclusive (YYYY-MM-DD)")
+    render.add_argument("--out", default=INVOICE_DIR, help=f"output directory (default: {INVOICE_DIR})"); render.add_argument("--workers", type=int, default=None, help="most render processes (default: one per core; small batches use fewer or render in-process)")
+    render.add_argument("--email", action="store_true", help="also send each invoice to the customer's email address"); render.add_argument("--quiet", action="store_true")
+    render.set_defaults(handler=cmd_render_invoices)
+    sync_parser = commands.add_parser("sync", help="exchange changes with another AgroFlow database through bundle files or a socket")
+    actions = sync_parser.add_subparsers(dest="action", required=True)
+    actions.add_parser("status", help="show this database's node id and sync watermarks")
+    actions.add_parser("new-node", help="give a copied database its own node id (run on the copy before its first sync)")
+    actions.add_parser("compact", help="fold the change log into the per-row sync table (the app also does this at startup)")
+    actions.add_parser("clone", help="enable sync here and copy this database to a new file that syncs as its own node").add_argument("file")
+    export_bundle = actions.add_parser("export", help="write the changes a peer hasn't acknowledged to a bundle file")
+    export_bundle.add_argument("file"); export_bundle.add_argument("--peer", help="node id of the receiving database (default: changes since sync began)")
+    export_bundle.add_argument("--full", action="store_true", help="include every row, to seed a database that isn't a copy of this one")
+    actions.add_parser("import", help="apply a bundle file").add_argument("file")
+    serve = actions.add_parser("serve", help="accept sync connections")
+    serve.add_argument("--host", default="127.0.0.1", help="interface to listen on (default: 127.0.0.1; the protocol is unauthenticated)"); serve.add_argument("--port", type=int, default=sync.SYNC_PORT)
+    connect = actions.add_parser("connect", help="sync both ways with a database running 'sync serve'")
+    connect.add_argument("address", help=f"host[:port] (default port {sync.SYNC_PORT})"); connect.add_argument("--full", action="store_true", help="send and receive every row")
+    sync_parser.set_defaults(handler=cmd_sync)
+    commands.add_parser("rebuild-rollups", help="recompute the materialized sales rollups from order history").set_defaults(handler=cmd_rebuild_rollups)
+    return parser
+
+def main(argv=None):
+    parser = build_parser(); args = parser.parse_args(argv); db = Database(args.db)
+    try: args.handler(db, args)
+    except (ValueError, RuntimeError, OSError) as e: parser.exit(1, f"Error: {e}\n")
+    finally: db.close()
+
+if __name__ == "__main__":
+    main()
@@ -4,18 +4,172 @@ import sqlite3
 import hashlib
 import csv
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice, groupby
 from datetime import datetime, timedelta
+from urllib.request import pathname2url
+import querystats
 
 DB_FILE = os.path.join("data", "agroflow.db")
 DB_FOLDER = "data"
+SEARCH_LIMIT = 50
+ORDER_PAGE_SIZE = 100
+STATEMENT_PAGE_SIZE = 500
+QUERY_CACHE_SIZE = 256
+STATEMENT_CACHE_SIZE = 256
+
+# Connection tuning applied at connect time. The active profile is the 'db_profile' setting;
+# individual values can be overridden with 'db_pragma_<name>' settings.
+DB_PROFILES = {
+    "Safe": {"journal_mode": "DELETE", "synchronous": "FULL", "mmap_size": 0, "cache_size": -2000, "temp_store": "DEFAULT", "busy_timeout": 5000},
+    "Balanced": {"journal_mode": "WAL", "synchronous": "NORMAL", "mmap_size": 268435456, "cache_size": -65536, "temp_store": "MEMORY", "busy_timeout": 5000},
+    "Fast": {"journal_mode": "WAL", "synchronous": "OFF", "mmap_size": 1073741824, "cache_size": -262144, "temp_store": "MEMORY", "busy_timeout": 10000},
+}
+# Safe until chosen otherwise: WAL does not work on network drives, and a database without a db_profile row may live on one.
+DEFAULT_DB_PROFILE = "Safe"
+SEARCHABLE_TABLES = ("customers", "products")
+# Tables whose row changes are captured in change_log for sync; a row's table code is its position here, from 1.
+CDC_TABLES = ("customers", "products", "orders", "order_items")
+IMPORT_CHUNK_SIZE = 5000
+EXPORT_BATCH_SIZE = 2000
+EXPORT_FORMATS = ("csv", "parquet")
+EXPORT_QUERIES = {
+    "orders": "SELECT o.id, o.customer_id, c.name AS customer, o.order_date, o.status, o.total_invoice FROM orders o JOIN customers c ON o.customer_id = c.id ORDER BY o.id",
+    "order_items": "SELECT oi.id, oi.order_id, o.order_date, oi.product_id, p.name AS product, p.category, oi.quantity, oi.final_price, oi.is_out_of_stock FROM order_items oi JOIN orders o ON oi.order_id = o.id JOIN products p ON oi.product_id = p.id ORDER BY oi.id",
+    "customers": "SELECT id, name, email, phone, address, notes FROM customers ORDER BY id",
+    "products": "SELECT id, name, master_price, category FROM products ORDER BY id",
+    "sales_by_customer": "SELECT c.id, c.name, COUNT(o.id) AS completed_orders, SUM(o.total_invoice) AS total_spent, MIN(o.order_date) AS first_order, MAX(o.order_date) AS last_order FROM orders o JOIN customers c ON o.customer_id = c.id WHERE o.status = 'Completed' GROUP BY c.id ORDER BY total_spent DESC",
+    "sales_by_product": "SELECT p.id, p.name, p.category, SUM(oi.quantity) AS total_quantity, SUM(oi.quantity * oi.final_price) AS revenue FROM order_items oi JOIN orders o ON oi.order_id = o.id JOIN products p ON oi.product_id = p.id WHERE o.status = 'Completed' AND oi.is_out_of_stock = 0 GROUP BY p.id ORDER BY revenue DESC",
+}
+# Column types per export dataset (matching EXPORT_QUERIES column for column), so Parquet files get a fixed schema however the rows start.
+EXPORT_TYPES = {
+    "orders": ("int", "int", "str", "timestamp", "str", "float"),
+    "order_items": ("int", "int", "timestamp", "int", "str", "str", "int", "float", "int"),
+    "customers": ("int", "str", "str", "str", "str", "str"),
+    "products": ("int", "str", "float", "str"),
+    "sales_by_customer": ("int", "str", "int", "float", "str", "str"),
+    "sales_by_product": ("int", "str", "str", "int", "float"),
+}
+# Per-table INSERT used by import_from_csv; products upsert on their unique name.
+ORDER_IMPORT_COLUMNS = ("order_ref", "customer", "product", "quantity")
+IMPORT_CONFLICT_CLAUSES = {"customers": "", "products": " ON CONFLICT(name) DO UPDATE SET {updates}"}
+
+# Schema migrations, applied in order and tracked through PRAGMA user_version.
+MIGRATIONS = [
+    (1, [
+        "CREATE INDEX IF NOT EXISTS idx_orders_date ON orders (order_date, id)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_customer_status ON orders (customer_id, status, order_date, total_invoice)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_status_date ON orders (status, order_date, total_invoice)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_status_customer ON orders (status, customer_id, total_invoice)",
+        "CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id, is_out_of_stock)",
+        "CREATE INDEX IF NOT EXISTS idx_order_items_stock_product ON order_items (is_out_of_stock, product_id, quantity)",
+        "CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items (product_id)",
+    ]),
+    (2, [
+        "CREATE TABLE IF NOT EXISTS sales_daily (day TEXT PRIMARY KEY, orders INTEGER NOT NULL, revenue REAL NOT NULL) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS sales_daily_customer (day TEXT NOT NULL, customer_id INTEGER NOT NULL, orders INTEGER NOT NULL, revenue REAL NOT NULL, PRIMARY KEY (day, customer_id)) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS sales_daily_product (day TEXT NOT NULL, product_id INTEGER NOT NULL, quantity INTEGER NOT NULL, revenue REAL NOT NULL, PRIMARY KEY (day, product_id)) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS customer_sales_totals (customer_id INTEGER PRIMARY KEY, orders INTEGER NOT NULL, revenue REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS product_sales_totals (product_id INTEGER PRIMARY KEY, quantity INTEGER NOT NULL, revenue REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_customer_sales_totals_revenue ON customer_sales_totals (revenue)",
+        "CREATE INDEX IF NOT EXISTS idx_product_sales_totals_quantity ON product_sales_totals (quantity)",
+        lambda db: db._refresh_sales_rollups(),
+    ]),
+    # Tables for sync.py's change data capture: the CDC_TRIGGERS append (table, row, op, unix time) to change_log; sync folds
+    # those into sync_ids (global id, last-writer-wins version and sequence per row) and prunes the log, on every sync and at app
+    # startup. AUTOINCREMENT keeps sequence numbers growing after the log is pruned, since peers hold them as watermarks.
+    (3, [
+        "CREATE TABLE IF NOT EXISTS change_log (seq INTEGER PRIMARY KEY AUTOINCREMENT, tbl INTEGER NOT NULL, row_id INTEGER NOT NULL, op TEXT NOT NULL, changed_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS sync_ids (tbl INTEGER NOT NULL, row_id INTEGER NOT NULL, gid TEXT NOT NULL, version REAL NOT NULL, node TEXT NOT NULL, seq INTEGER NOT NULL, deleted INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (tbl, row_id))",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_ids_gid ON sync_ids (tbl, gid)",
+        "CREATE INDEX IF NOT EXISTS idx_sync_ids_seq ON sync_ids (seq)",
+        "CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    ]),
+    # Databases migrated while version 3 still installed the triggers everywhere drop them unless they already sync.
+    (4, [lambda db: db._drop_idle_change_capture()]),
+]
+
+# Change data capture triggers, installed by sync.identity when a database first takes part in sync; until then bulk writes
+# don't pay for a change_log row each.
+CDC_TRIGGERS = {f"{table}_cdc_{suffix}": f"CREATE TRIGGER IF NOT EXISTS {table}_cdc_{suffix} AFTER {event} ON {table} BEGIN INSERT INTO change_log (tbl, row_id, op, changed_at) VALUES ({code}, {row}.id, '{op}', (julianday('now') - 2440587.5) * 86400.0); END"
+                for code, table in enumerate(CDC_TABLES, 1) for suffix, event, row, op in (("ai", "INSERT", "new", "I"), ("au", "UPDATE", "new", "U"), ("ad", "DELETE", "old", "D"))}
+
+# Materialized sales rollups over completed orders. Each statement folds the orders matching {where} into its
+# table, scaled by :sign so a re-fulfilled order can be backed out before it is added again. The unary + keeps the
+# planner from picking the low-selectivity stock-flag index over the order_id lookup.
+SALES_ROLLUPS = {
+    "sales_daily": "INSERT INTO sales_daily (day, orders, revenue) SELECT date(o.order_date), :sign * COUNT(*), :sign * TOTAL(o.total_invoice) FROM orders o WHERE o.status = 'Completed' AND {where} GROUP BY 1 ON CONFLICT(day) DO UPDATE SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue",
+    "sales_daily_customer": "INSERT INTO sales_daily_customer (day, customer_id, orders, revenue) SELECT date(o.order_date), o.customer_id, :sign * COUNT(*), :sign * TOTAL(o.total_invoice) FROM orders o WHERE o.status = 'Completed' AND {where} GROUP BY 1, 2 ON CONFLICT(day, customer_id) DO UPDATE SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue",
+    "sales_daily_product": "INSERT INTO sales_daily_product (day, product_id, quantity, revenue) SELECT date(o.order_date), oi.product_id, :sign * SUM(oi.quantity), :sign * TOTAL(oi.quantity * oi.final_price) FROM orders o JOIN order_items oi ON oi.order_id = o.id WHERE o.status = 'Completed' AND +oi.is_out_of_stock = 0 AND {where} GROUP BY 1, 2 ON CONFLICT(day, product_id) DO UPDATE SET quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue",
+    "customer_sales_totals": "INSERT INTO customer_sales_totals (customer_id, orders, revenue) SELECT o.customer_id, :sign * COUNT(*), :sign * TOTAL(o.total_invoice) FROM orders o WHERE o.status = 'Completed' AND {where} GROUP BY 1 ON CONFLICT(customer_id) DO UPDATE SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue",
+    "product_sales_totals": "INSERT INTO product_sales_totals (product_id, quantity, revenue) SELECT oi.product_id, :sign * SUM(oi.quantity), :sign * TOTAL(oi.quantity * oi.final_price) FROM orders o JOIN order_items oi ON oi.order_id = o.id WHERE o.status = 'Completed' AND +oi.is_out_of_stock = 0 AND {where} GROUP BY 1 ON CONFLICT(product_id) DO UPDATE SET quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue",
+}
+
+ROLLUP_TABLES = tuple(SALES_ROLLUPS)
+CRUD_TABLE_PATTERN = re.compile(r"\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+(\w+)", re.IGNORECASE)
+
+# Per-table write counters shared by every connection in this process, keyed by database path. A cached read
+# remembers the counters of the tables it depends on and is only served while they are unchanged; '*' counts all writes.
+_table_versions, _table_versions_lock = {}, threading.Lock()
+# The settings table is read once per process and database file into a snapshot shared by every connection; writes
+# replace the snapshot after they commit. Typed keys are (type, default); others read back as text. Bools are stored as '1'/'0'.
+_settings_snapshots = {}
+SETTINGS_SCHEMA = {
+    "theme": (str, "System"), "db_profile": (str, DEFAULT_DB_PROFILE), "query_stats": (bool, False), "ui_profile": (bool, False), "slow_query_ms": (float, None),
+    "smtp_smtp_host": (str, ""), "smtp_port": (int, 587), "smtp_username": (str, ""), "smtp_password": (str, ""),
+    "company_name": (str, "AgroFlow"), "company_address": (str, ""), "company_phone": (str, ""), "company_email": (str, ""),
+}
 
 class Database:
-    def __init__(self):
-        os.makedirs(DB_FOLDER, exist_ok=True)
-        self.conn = sqlite3.connect(DB_FILE, detect_types=sqlite3.PARSE_DECLTYPES)
+    def __init__(self, db_file=DB_FILE, read_only=False):
+        self.db_file, self.read_only = db_file, read_only
+        if read_only: self.conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_file))}?mode=ro", uri=True, detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=STATEMENT_CACHE_SIZE, factory=querystats.connection_factory())
+        else: os.makedirs(os.path.dirname(db_file) or DB_FOLDER, exist_ok=True); self.conn = sqlite3.connect(db_file, detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=STATEMENT_CACHE_SIZE, factory=querystats.connection_factory())
         self.conn.row_factory = sqlite3.Row
         self.cursor = self.conn.cursor()
-        self._create_tables()
+        self._cache_key, self._cache, self.cache_hits, self.cache_misses = os.path.abspath(db_file), OrderedDict(), 0, 0
+        self._data_version, self._local_writes = None, None
+        self._apply_profile()
+        if read_only: self.search_index = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name='customers_fts'").fetchone() is not None
+        else: self._create_tables()
+
+    def _apply_profile(self):
+        try: stored = dict(self.conn.execute("SELECT key, value FROM settings WHERE key='db_profile' OR key LIKE 'db_pragma_%'").fetchall())
+        except sqlite3.OperationalError: stored = {}
+        self.profile_name = stored.get("db_profile") if stored.get("db_profile") in DB_PROFILES else DEFAULT_DB_PROFILE; self.profile = dict(DB_PROFILES[self.profile_name])
+        self.profile.update({key[len("db_pragma_"):]: value for key, value in stored.items() if key[len("db_pragma_"):] in self.profile and re.fullmatch(r"-?\w+", str(value))})
+        for pragma, value in self.profile.items():
+            if pragma == "journal_mode" and self.read_only: continue
+            self.conn.execute(f"PRAGMA {pragma} = {value}")
+
+    def _cached(self, tables, key, load):
+        # Read-through LRU cache; results are shared between callers and must be treated as read-only.
+        self._check_external_writes()
+        stamp = self.table_versions(*tables); entry = self._cache.get(key)
+        if entry is not None and entry[0] == stamp: self._cache.move_to_end(key); self.cache_hits += 1; return entry[1]
+        self.cache_misses += 1; result = load(); self._cache[key] = (stamp, result); self._cache.move_to_end(key)
+        if len(self._cache) > QUERY_CACHE_SIZE: self._cache.popitem(last=False)
+        return result
+    def table_versions(self, *tables):
+        # Write counters for `tables` as a tuple; it changes whenever this process writes to any of them.
+        with _table_versions_lock: versions = _table_versions.get(self._cache_key, {}); return tuple(versions.get(table, 0) for table in tables)
+    def _check_external_writes(self):
+        # data_version moves when any other connection commits. If no write in this process accounts for it
+        # (another process, or a write that bypassed _invalidate), nothing cached can be trusted.
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        with _table_versions_lock: local_writes = _table_versions.get(self._cache_key, {}).get("*", 0)
+        if data_version != self._data_version and local_writes == self._local_writes: self._cache.clear()
+        self._data_version, self._local_writes = data_version, local_writes
+    def _invalidate(self, *tables):
+        with _table_versions_lock:
+            versions = _table_versions.setdefault(self._cache_key, {})
+            for table in tables + ("*",): versions[table] = versions.get(table, 0) + 1
+    def clear_query_cache(self): self._cache.clear()
+    def cache_info(self): return {"hits": self.cache_hits, "misses": self.cache_misses, "size": len(self._cache), "max_size": QUERY_CACHE_SIZE}
 
     def _hash_password(self, password):
         return hashlib.sha256(password.encode()).hexdigest()
@@ -28,7 +182,37 @@ class Database:
         self.cursor.execute("CREATE TABLE IF NOT EXISTS order_items (id INTEGER PRIMARY KEY, order_id INTEGER NOT NULL, product_id INTEGER NOT NULL, quantity INTEGER NOT NULL, final_price REAL, is_out_of_stock INTEGER DEFAULT 0, FOREIGN KEY (order_id) REFERENCES orders (id) ON DELETE CASCADE, FOREIGN KEY (product_id) REFERENCES products (id))")
         self.cursor.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
         self.conn.commit()
+        self._create_search_index()
+        self._migrate()
         self._initialize_defaults()
+    def _create_search_index(self):
+        # Trigram FTS5 mirrors of customers/products.name, kept in sync by triggers; NOCASE indexes serve prefix lookups.
+        self.search_index = True
+        for table in SEARCHABLE_TABLES:
+            self.cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_name ON {table} (name COLLATE NOCASE)")
+            if not self.search_index: continue
+            exists = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (f"{table}_fts",)).fetchone()
+            try: self.cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(name, content='{table}', content_rowid='id', tokenize='trigram')")
+            except sqlite3.OperationalError: self.search_index = False; continue
+            self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN INSERT INTO {table}_fts (rowid, name) VALUES (new.id, new.name); END")
+            self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN INSERT INTO {table}_fts ({table}_fts, rowid, name) VALUES ('delete', old.id, old.name); END")
+            self.cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE OF name ON {table} BEGIN INSERT INTO {table}_fts ({table}_fts, rowid, name) VALUES ('delete', old.id, old.name); INSERT INTO {table}_fts (rowid, name) VALUES (new.id, new.name); END")
+            if not exists: self.cursor.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+        self.conn.commit()
+    def schema_version(self): return self.conn.execute("PRAGMA user_version").fetchone()[0]
+    def _migrate(self, target=None):
+        pending = [(version, statements) for version, statements in MIGRATIONS if version > self.schema_version() and (target is None or version <= target)]
+        for version, statements in pending:
+            try:
+                self.conn.execute("BEGIN")
+                for statement in statements: statement(self) if callable(statement) else self.conn.execute(statement)
+                self.conn.execute(f"PRAGMA user_version = {version}"); self.conn.commit()
+            except sqlite3.Error: self.conn.rollback(); raise
+        if pending: self.conn.execute("ANALYZE"); self.conn.commit()
+    def _drop_idle_change_capture(self):
+        if self.conn.execute("SELECT 1 FROM sync_state WHERE key = 'node'").fetchone(): return
+        for name in CDC_TRIGGERS: self.conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        self.conn.execute("DELETE FROM change_log")
     def _initialize_defaults(self):
         self.cursor.execute("SELECT * FROM users WHERE username='admin'")
         if not self.cursor.fetchone(): self.add_user('admin', 'admin')
@@ -39,7 +223,7 @@ class Database:
         password_hash = self._hash_password(password)
         try:
             self.cursor.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", (username, password_hash))
-            self.conn.commit()
+            self.conn.commit(); self._invalidate("users")
             return True
         except sqlite3.IntegrityError: return False
 
@@ -51,7 +235,7 @@ class Database:
     def update_username(self, user_id, new_username):
         try:
             self.cursor.execute("UPDATE users SET username=? WHERE id=?", (new_username, user_id))
-            self.conn.commit()
+            self.conn.commit(); self._invalidate("users")
             return True, "Username updated successfully."
         except sqlite3.IntegrityError:
             return False, "This username is already taken."
@@ -59,36 +243,124 @@ class Database:
     def update_password(self, user_id, new_password):
         new_hash = self._hash_password(new_password)
         self.cursor.execute("UPDATE users SET password_hash=? WHERE id=?", (new_hash, user_id))
-        self.conn.commit()
+        self.conn.commit(); self._invalidate("users")
         return True, "Password updated successfully."
 
-    def get_customers(self, search_term=""):
-        if search_term: return self.conn.execute("SELECT * FROM customers WHERE name LIKE ? ORDER BY name", (f"%{search_term}%",)).fetchall()
-        return self.conn.execute("SELECT * FROM customers ORDER BY name").fetchall()
-    def get_products(self, search_term=""):
-        if search_term: return self.conn.execute("SELECT * FROM products WHERE name LIKE ? ORDER BY name", (f"%{search_term}%",)).fetchall()
-        return self.conn.execute("SELECT * FROM products ORDER BY name").fetchall()
+    def _search(self, table, search_term, limit, offset):
+        # Ranked: name-prefix hits first (index order), then substring hits (FTS order); pages are sliced from that sequence.
+        if not search_term:
+            query, params = f"SELECT * FROM {table} ORDER BY name COLLATE NOCASE", ()
+            if limit is not None: query += " LIMIT ? OFFSET ?"; params = (limit, offset)
+            return self.conn.execute(query, params).fetchall()
+        escaped = search_term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        needed = -1 if limit is None else offset + limit
+        rows = self.conn.execute(f"SELECT * FROM {table} WHERE name LIKE ? ESCAPE '\\' ORDER BY name COLLATE NOCASE LIMIT ?", (f"{escaped}%", needed)).fetchall()
+        if limit is None or len(rows) < needed:
+            remaining = -1 if limit is None else needed - len(rows)
+            if self.search_index and len(search_term) >= 3:
+                query, params = f"SELECT t.* FROM {table}_fts f JOIN {table} t ON t.id = f.rowid WHERE {table}_fts MATCH ? AND t.name NOT LIKE ? ESCAPE '\\' LIMIT ?", ('"' + search_term.replace('"', '""') + '"', f"{escaped}%", remaining)
+            else: query, params = f"SELECT * FROM {table} WHERE name LIKE ? ESCAPE '\\' AND name NOT LIKE ? ESCAPE '\\' LIMIT ?", (f"%{escaped}%", f"{escaped}%", remaining)
+            rows += self.conn.execute(query, params).fetchall()
+        return rows[offset:] if limit is None else rows[offset:needed]
+    def get_customers(self, search_term="", limit=None, offset=0): return self._cached(("customers",), ("customers", search_term, limit, offset), lambda: self._search("customers", search_term, limit, offset))
+    def get_names(self, table, ids):
+        # {id: name} for a handful of customers or products, e.g. to label analytics results.
+        if table not in SEARCHABLE_TABLES: raise ValueError(f"Unknown table: {table}")
+        names = {}
+        for i in range(0, len(ids), 500): chunk = ids[i:i + 500]; names.update(self.conn.execute(f"SELECT id, name FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})", chunk).fetchall())
+        return names
+    def get_product_rows(self):
+        # Plain (id, name, master_price, category) tuples for the in-memory catalog; deliberately not cached.
+        cursor = self.conn.cursor(); cursor.row_factory = None
+        return cursor.execute("SELECT id, name, master_price, category FROM products").fetchall()
+    def get_products(self, search_term="", limit=None, offset=0): return self._cached(("products",), ("products", search_term, limit, offset), lambda: self._search("products", search_term, limit, offset))
     def create_order(self, customer_id, cart):
         self.cursor.execute("INSERT INTO orders (customer_id, order_date, status) VALUES (?, ?, ?)", (customer_id, datetime.now(), "Pending Vendor"))
         order_id = self.cursor.lastrowid
-        order_items = [(order_id, pid, data['quantity']) for pid, data in cart.items()]
+        order_items = [(order_id, pid, data['quantity'] if isinstance(data, dict) else data) for pid, data in cart.items()]
         self.cursor.executemany("INSERT INTO order_items (order_id, product_id, quantity) VALUES (?, ?, ?)", order_items)
-        self.conn.commit(); return order_id
+        self.conn.commit(); self._invalidate("orders", "order_items"); return order_id
+    def create_orders(self, orders, order_date=None):
+        # Bulk intake of (customer_id, cart) pairs in one transaction; carts map product id to a quantity or to {'quantity': n}.
+        order_date, carts = order_date or datetime.now(), iter(orders)
+        batches = iter(lambda: [(customer_id, order_date, [(pid, data['quantity'] if isinstance(data, dict) else data) for pid, data in cart.items()]) for customer_id, cart in islice(carts, IMPORT_CHUNK_SIZE)], [])
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE"); first_id = next_id = self._next_order_id()
+            for batch in batches: next_id = self._insert_order_batch(batch, next_id)
+        self._invalidate("orders", "order_items"); return list(range(first_id, next_id))
+    def _next_order_id(self): return (self.conn.execute("SELECT MAX(id) FROM orders").fetchone()[0] or 0) + 1
+    def _insert_order_batch(self, batch, next_id):
+        # Ids are assigned up front so every batch is two executemany calls instead of one INSERT per order.
+        order_rows, item_rows = [], []
+        for customer_id, order_date, items in batch: order_rows.append((next_id, customer_id, order_date, "Pending Vendor")); item_rows.extend((next_id, pid, quantity) for pid, quantity in items); next_id += 1
+        self.conn.executemany("INSERT INTO orders (id, customer_id, order_date, status) VALUES (?, ?, ?, ?)", order_rows)
+        self.conn.executemany("INSERT INTO order_items (order_id, product_id, quantity) VALUES (?, ?, ?)", item_rows)
+        return next_id
     def get_all_orders_with_details(self, customer_search=""):
         query = "SELECT o.id, c.name, o.order_date, o.status, o.total_invoice FROM orders o JOIN customers c ON o.customer_id = c.id"
         params = []
         if customer_search: query += " WHERE c.name LIKE ?"; params.append(f"%{customer_search}%")
         query += " ORDER BY o.order_date DESC"
         return self.conn.execute(query, tuple(params)).fetchall()
+    def get_orders_page(self, customer_search="", after=None, limit=ORDER_PAGE_SIZE):
+        # Keyset pagination over (order_date, id), newest first; pass the last row's (order_date, id) as `after` for the next page.
+        query, params = "SELECT o.id, c.name, o.order_date, o.status, o.total_invoice FROM orders o JOIN customers c ON o.customer_id = c.id WHERE 1", []
+        if customer_search and self.search_index and len(customer_search) >= 3: query += " AND o.customer_id IN (SELECT rowid FROM customers_fts WHERE customers_fts MATCH ?)"; params.append('"' + customer_search.replace('"', '""') + '"')
+        elif customer_search: query += " AND c.name LIKE ?"; params.append(f"%{customer_search}%")
+        if after: query += " AND (o.order_date, o.id) < (?, ?)"; params.extend(after)
+        query += " ORDER BY o.order_date DESC, o.id DESC LIMIT ?"; params.append(limit)
+        return self._cached(("orders", "customers"), ("orders_page", customer_search, tuple(after) if after else None, limit), lambda: self.conn.execute(query, tuple(params)).fetchall())
     def get_full_order_details(self, order_id):
         order_info = self.conn.execute("SELECT o.id, o.order_date, o.status, o.total_invoice, c.* FROM orders o JOIN customers c ON o.customer_id = c.id WHERE o.id = ?", (order_id,)).fetchone()
         items_info = self.conn.execute("SELECT p.name, oi.quantity, oi.final_price, oi.is_out_of_stock FROM order_items oi JOIN products p ON oi.product_id = p.id WHERE oi.order_id = ? AND oi.is_out_of_stock = 0", (order_id,)).fetchall()
         return order_info, items_info
     
+    def get_invoice_data(self, order_ids):
+        # Plain (picklable) invoice payloads for the render processes, in the order given; ids that are not Completed are left out.
+        invoices = {}
+        for start in range(0, len(order_ids), 500):
+            chunk = list(order_ids[start:start + 500]); marks = ",".join("?" * len(chunk))
+            for row in self.conn.execute(f"SELECT o.id, o.order_date, o.total_invoice, c.name, c.email, c.phone, c.address FROM orders o JOIN customers c ON o.customer_id = c.id WHERE o.id IN ({marks}) AND o.status = 'Completed'", chunk):
+                invoices[row[0]] = {"id": row[0], "order_date": row[1], "total": row[2], "name": row[3], "email": row[4], "phone": row[5], "address": row[6], "items": []}
+            for order_id, name, quantity, price in self.conn.execute(f"SELECT oi.order_id, p.name, oi.quantity, oi.final_price FROM order_items oi JOIN products p ON oi.product_id = p.id WHERE oi.order_id IN ({marks}) AND oi.is_out_of_stock = 0 ORDER BY oi.order_id, oi.id", chunk):
+                if order_id in invoices: invoices[order_id]["items"].append((name, quantity, price or 0.0))
+        return [invoices[order_id] for order_id in order_ids if order_id in invoices]
+    def get_completed_order_ids(self, start_date=None, end_date=None):
+        # Completed orders with start_date <= order_date < end_date (either bound optional), oldest first.
+        query, params = "SELECT id FROM orders WHERE status = 'Completed'", []
+        if start_date: query += " AND order_date >= ?"; params.append(start_date)
+        if end_date: query += " AND order_date < ?"; params.append(end_date)
+        return [row[0] for row in self.conn.execute(query + " ORDER BY order_date, id", params)]
+    
+    def get_order_status(self, order_id): result = self.conn.execute("SELECT status FROM orders WHERE id=?", (order_id,)).fetchone(); return result[0] if result else None
+    
     def get_sales_report_for_customer(self, customer_id):
-        return self.conn.execute("SELECT o.id, o.order_date, o.total_invoice FROM orders o WHERE o.customer_id = ? AND o.status = 'Completed' ORDER BY o.order_date DESC", (customer_id,)).fetchall()
+        return self._cached(("orders",), ("sales_report", customer_id), lambda: self.conn.execute("SELECT o.id, o.order_date, o.total_invoice FROM orders o WHERE o.customer_id = ? AND o.status = 'Completed' ORDER BY o.order_date DESC", (customer_id,)).fetchall())
+
+    def get_customer_statement_summary(self, customer_id, start_date=None, end_date=None):
+        # Totals for start_date <= order_date < end_date (either bound optional) and for the equally long period before it,
+        # plus a month-by-month breakdown with running and month-over-month figures; all aggregated in SQL.
+        # Without an end the period runs to the latest order, like the statement pages; the previous period is then as long as
+        # start_date to the end of today, and that day is part of the cache key so the window moves on with the date.
+        bound = " AND order_date < :end" if end_date else ""
+        window_end = end_date or datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+        previous_start = start_date - (window_end - start_date) if start_date else None
+        def load():
+            params = {"customer_id": customer_id, "start": start_date or datetime.min, "previous_start": previous_start or start_date or datetime.min, "end": end_date}
+            totals = self.conn.execute("SELECT COUNT(*) FILTER (WHERE order_date >= :start) AS orders, TOTAL(total_invoice) FILTER (WHERE order_date >= :start) AS revenue, MIN(order_date) FILTER (WHERE order_date >= :start) AS first_order, MAX(order_date) AS last_order, COUNT(*) FILTER (WHERE order_date < :start) AS previous_orders, TOTAL(total_invoice) FILTER (WHERE order_date < :start) AS previous_revenue FROM orders WHERE customer_id = :customer_id AND status = 'Completed' AND order_date >= :previous_start" + bound, params).fetchone()
+            months = self.conn.execute("SELECT month, orders, revenue, SUM(revenue) OVER (ORDER BY month) AS cumulative, LAG(revenue) OVER (ORDER BY month) AS previous_revenue FROM (SELECT substr(order_date, 1, 7) AS month, COUNT(*) AS orders, TOTAL(total_invoice) AS revenue FROM orders WHERE customer_id = :customer_id AND status = 'Completed' AND order_date >= :start" + bound + " GROUP BY month) ORDER BY month", params).fetchall()
+            return {"orders": totals["orders"], "revenue": totals["revenue"], "first_order": totals["first_order"], "last_order": totals["last_order"], "previous": (totals["previous_orders"], totals["previous_revenue"]) if previous_start else None, "months": months}
+        return self._cached(("orders",), ("statement_summary", customer_id, start_date, end_date, previous_start), load)
+    def get_customer_statement_page(self, customer_id, start_date=None, end_date=None, after=None, opening_balance=0.0, limit=STATEMENT_PAGE_SIZE):
+        # Completed orders oldest first with a running balance, keyset paged like get_orders_page: pass the last row's (order_date, id)
+        # as `after` and its balance as `opening_balance`. Each page is limited before the window runs, so it reads only its own rows.
+        query, params = "SELECT id, order_date, total_invoice FROM orders WHERE customer_id = :customer_id AND status = 'Completed'", {"customer_id": customer_id, "opening": opening_balance, "limit": limit}
+        if start_date: query += " AND order_date >= :start"; params["start"] = start_date
+        if end_date: query += " AND order_date < :end"; params["end"] = end_date
+        if after: query += " AND (order_date, id) > (:after_date, :after_id)"; params["after_date"], params["after_id"] = after
+        return self._cached(("orders",), ("statement_page", customer_id, start_date, end_date, tuple(after) if after else None, opening_balance, limit), lambda: self.conn.execute(f"SELECT id, order_date, total_invoice, :opening + SUM(total_invoice) OVER (ORDER BY order_date, id ROWS UNBOUNDED PRECEDING) AS balance FROM ({query} ORDER BY order_date, id LIMIT :limit) ORDER BY order_date, id", params).fetchall())
         
-    def _execute_crud(self, query, params=()): self.cursor.execute(query, params); self.conn.commit()
+    def _execute_crud(self, query, params=()): self.cursor.execute(query, params); self.conn.commit(); self._invalidate(CRUD_TABLE_PATTERN.match(query).group(1).lower())
     def add_customer(self, name, email, phone, address, notes): self._execute_crud("INSERT INTO customers (name, email, phone, address, notes) VALUES (?, ?, ?, ?, ?)", (name, email, phone, address, notes))
     def update_customer(self, cust_id, name, email, phone, address, notes): self._execute_crud("UPDATE customers SET name=?, email=?, phone=?, address=?, notes=? WHERE id=?", (name, email, phone, address, notes, cust_id))
     def delete_customer(self, cust_id): self._execute_crud("DELETE FROM customers WHERE id=?", (cust_id,))
@@ -97,29 +369,190 @@ class Database:
     def delete_product(self, prod_id): self._execute_crud("DELETE FROM products WHERE id=?", (prod_id,))
     def get_order_items(self, order_id): return self.conn.execute("SELECT oi.id, p.name, oi.quantity FROM order_items oi JOIN products p ON oi.product_id = p.id WHERE oi.order_id = ?", (order_id,)).fetchall()
     def update_order_fulfillment(self, fulfillment_data):
-        total_invoice, order_id = 0, None
-        for item_id, data in fulfillment_data.items():
-            if order_id is None: order_id = self.conn.execute("SELECT order_id FROM order_items WHERE id=?", (item_id,)).fetchone()[0]
-            final_price = data['price'] if not data['out_of_stock'] else 0; is_out_of_stock = 1 if data['out_of_stock'] else 0
-            self._execute_crud("UPDATE order_items SET final_price=?, is_out_of_stock=? WHERE id=?", (final_price, is_out_of_stock, item_id))
-            if not is_out_of_stock: total_invoice += float(final_price) * int(self.conn.execute("SELECT quantity FROM order_items WHERE id=?", (item_id,)).fetchone()[0])
-        if order_id: self._execute_crud("UPDATE orders SET status='Completed', total_invoice=? WHERE id=?", (total_invoice, order_id))
-    def get_total_sales(self, period):
-        end_date = datetime.now()
+        items = [(0 if data['out_of_stock'] else float(data['price']), 1 if data['out_of_stock'] else 0, item_id) for item_id, data in fulfillment_data.items()]
+        if not items: return
+        with self.conn:
+            if not self.conn.in_transaction: self.conn.execute("BEGIN IMMEDIATE")
+            order_id, status = self.conn.execute("SELECT o.id, o.status FROM order_items oi JOIN orders o ON oi.order_id = o.id WHERE oi.id=?", (items[0][2],)).fetchone()
+            if status == 'Completed': self._apply_sales_rollups(order_id, -1)
+            self.conn.executemany("UPDATE order_items SET final_price=?, is_out_of_stock=? WHERE id=?", items)
+            self.conn.execute("UPDATE orders SET status='Completed', total_invoice=(SELECT COALESCE(SUM(quantity * final_price), 0) FROM order_items WHERE order_id = orders.id AND is_out_of_stock = 0) WHERE id=?", (order_id,))
+            self._apply_sales_rollups(order_id, 1)
+        self._invalidate("orders", "order_items", *ROLLUP_TABLES)
+    def _apply_sales_rollups(self, order_id, sign):
+        for statement in SALES_ROLLUPS.values(): self.conn.execute(statement.format(where="o.id = :order_id"), {"sign": sign, "order_id": order_id})
+    def _refresh_sales_rollups(self):
+        for table, statement in SALES_ROLLUPS.items(): self.conn.execute(f"DELETE FROM {table}"); self.conn.execute(statement.format(where="1"), {"sign": 1})
+    def rebuild_sales_rollups(self):
+        with self.conn: self.conn.execute("BEGIN IMMEDIATE"); self._refresh_sales_rollups()
+        self._invalidate(*ROLLUP_TABLES)
+    def get_total_sales(self, period, now=None):
+        # Rolling periods ending at `now`, through the same exclusive-end path as get_total_sales_between.
+        end_date = now or datetime.now()
         if period == 'month': start_date = end_date - timedelta(days=30)
         elif period == 'week': start_date = end_date - timedelta(days=7)
         else: start_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        return self.conn.execute("SELECT SUM(total_invoice) FROM orders WHERE status='Completed' AND order_date BETWEEN ? AND ?", (start_date, end_date)).fetchone()
-    def get_top_selling_products(self, limit=5): return self.conn.execute("SELECT p.name, SUM(oi.quantity) as total_quantity FROM order_items oi JOIN products p ON oi.product_id = p.id WHERE oi.is_out_of_stock = 0 GROUP BY p.name ORDER BY total_quantity DESC LIMIT ?", (limit,)).fetchall()
-    def get_top_customers_by_value(self, limit=5): return self.conn.execute("SELECT c.name, SUM(o.total_invoice) as total_spent FROM orders o JOIN customers c ON o.customer_id = c.id WHERE o.status = 'Completed' GROUP BY c.name ORDER BY total_spent DESC LIMIT ?", (limit,)).fetchall()
-    def get_setting(self, key): result = self.conn.execute("SELECT value FROM settings WHERE key=?", (key,)).fetchone(); return result[0] if result else None
-    def set_setting(self, key, value): self._execute_crud("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
-    def import_from_csv(self, file_path, table_name):
-        with open(file_path, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            data = [tuple(row.get(col, None) for col in reader.fieldnames) for row in reader]
-            if not data: return
-            placeholders = ', '.join(['?'] * len(reader.fieldnames)); cols = ', '.join(reader.fieldnames)
-            query = f"INSERT OR IGNORE INTO {table_name} ({cols}) VALUES ({placeholders})"
-            self.cursor.executemany(query, data); self.conn.commit()
+        return self.get_total_sales_between(start_date, end_date)
+    def get_total_sales_between(self, start_date, end_date):
+        # start_date <= order_date < end_date: whole days come from the daily rollup, partial first and last days are summed from orders
+        # (all of it from orders when the period has no whole day).
+        first_full_day = start_date if start_date.time() == datetime.min.time() else datetime.combine(start_date.date() + timedelta(days=1), datetime.min.time())
+        last_full_day_end = datetime.combine(end_date.date(), datetime.min.time())
+        return self.conn.execute("SELECT SUM(total) FROM (SELECT revenue AS total FROM sales_daily WHERE day >= :first_day AND day < :end_day UNION ALL SELECT total_invoice FROM orders WHERE status='Completed' AND order_date >= :start AND order_date < :end AND (order_date < :first_full OR order_date >= :last_full_end))", {"first_day": first_full_day.date().isoformat(), "end_day": last_full_day_end.date().isoformat(), "start": start_date, "end": end_date, "first_full": first_full_day, "last_full_end": last_full_day_end}).fetchone()
+    # With start_date/end_date these read whole days (start_date <= day < end_date) from the daily rollups; without them, the all-time totals.
+    def get_top_selling_products(self, limit=5, start_date=None, end_date=None):
+        if start_date or end_date: return self._cached(("sales_daily_product", "products"), ("top_products", limit, start_date, end_date), lambda: self.conn.execute("SELECT p.name, SUM(t.quantity) as total_quantity FROM sales_daily_product t JOIN products p ON t.product_id = p.id WHERE t.day >= ? AND t.day < ? GROUP BY t.product_id ORDER BY total_quantity DESC LIMIT ?", (*self._rollup_days(start_date, end_date), limit)).fetchall())
+        return self._cached(("product_sales_totals", "products"), ("top_products", limit), lambda: self.conn.execute("SELECT p.name, t.quantity as total_quantity FROM product_sales_totals t JOIN products p ON t.product_id = p.id ORDER BY t.quantity DESC LIMIT ?", (limit,)).fetchall())
+    def get_top_customers_by_value(self, limit=5, start_date=None, end_date=None):
+        if start_date or end_date: return self._cached(("sales_daily_customer", "customers"), ("top_customers", limit, start_date, end_date), lambda: self.conn.execute("SELECT c.name, SUM(t.revenue) as total_spent FROM sales_daily_customer t JOIN customers c ON t.customer_id = c.id WHERE t.day >= ? AND t.day < ? GROUP BY t.customer_id ORDER BY total_spent DESC LIMIT ?", (*self._rollup_days(start_date, end_date), limit)).fetchall())
+        return self._cached(("customer_sales_totals", "customers"), ("top_customers", limit), lambda: self.conn.execute("SELECT c.name, t.revenue as total_spent FROM customer_sales_totals t JOIN customers c ON t.customer_id = c.id ORDER BY t.revenue DESC LIMIT ?", (limit,)).fetchall())
+    def get_product_sales(self, product_id, start_date=None, end_date=None):
+        # (quantity, revenue) for one product.
+        if start_date or end_date: return self._cached(("sales_daily_product",), ("product_sales", product_id, start_date, end_date), lambda: self.conn.execute("SELECT TOTAL(quantity), TOTAL(revenue) FROM sales_daily_product WHERE day >= ? AND day < ? AND product_id = ?", (*self._rollup_days(start_date, end_date), product_id)).fetchone())
+        return self._cached(("product_sales_totals",), ("product_sales", product_id), lambda: self.conn.execute("SELECT TOTAL(quantity), TOTAL(revenue) FROM product_sales_totals WHERE product_id = ?", (product_id,)).fetchone())
+    def _rollup_days(self, start_date, end_date): return (start_date.date().isoformat() if start_date else "0000-00-00", end_date.date().isoformat() if end_date else "9999-99-99")
+    def _settings(self):
+        snapshot = _settings_snapshots.get(self._cache_key)
+        if snapshot is None:
+            # Loaded under the lock so a write committing meanwhile is either in the rows read or applied after.
+            with _table_versions_lock:
+                snapshot = _settings_snapshots.get(self._cache_key)
+                if snapshot is None: snapshot = _settings_snapshots[self._cache_key] = dict(self.conn.execute("SELECT key, value FROM settings").fetchall())
+        return snapshot
+    def get_setting(self, key): return self._settings().get(key)
+    def setting(self, key):
+        kind, default = SETTINGS_SCHEMA.get(key, (str, None)); value = self._settings().get(key)
+        if value is None or value == "": return default
+        if kind is bool: return value == "1"
+        try: return kind(value)
+        except ValueError: return default
+    def set_settings(self, changes):
+        # Writes the keys whose stored text changes in one transaction (None deletes a key); returns them as {key: typed value}.
+        current = self._settings(); rows = {key: None if value is None else "1" if value is True else "0" if value is False else str(value) for key, value in changes.items()}
+        rows = {key: value for key, value in rows.items() if current.get(key) != value}
+        if not rows: return {}
+        with self.conn:
+            if not self.conn.in_transaction: self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", [(key, value) for key, value in rows.items() if value is not None])
+            self.conn.executemany("DELETE FROM settings WHERE key = ?", [(key,) for key, value in rows.items() if value is None])
+        with _table_versions_lock: _settings_snapshots[self._cache_key] = {key: value for key, value in {**_settings_snapshots.get(self._cache_key, current), **rows}.items() if value is not None}
+        self._invalidate("settings"); return {key: self.setting(key) for key in rows}
+    def set_setting(self, key, value): self.set_settings({key: value})
+    def import_from_csv(self, file_path, table_name, progress=None, cancel_event=None, chunk_size=IMPORT_CHUNK_SIZE):
+        # Streams the file in chunks inside one transaction; rows that fail coercion are skipped. Returns (imported, skipped, cancelled).
+        if table_name not in IMPORT_CONFLICT_CLAUSES: raise ValueError(f"Importing into '{table_name}' is not supported.")
+        columns = {row['name']: (row['type'].upper(), row['notnull']) for row in self.conn.execute(f"PRAGMA table_info({table_name})") if row['name'] != 'id'}
+        with open(file_path, 'r', newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f); fields = [name for name in (reader.fieldnames or []) if name in columns]
+            missing = [name for name, (_, not_null) in columns.items() if not_null and name not in fields]
+            if missing: raise ValueError(f"CSV is missing required column(s): {', '.join(missing)}")
+            updates = ", ".join(f"{name}=excluded.{name}" for name in fields if name != 'name')
+            query = f"INSERT INTO {table_name} ({', '.join(fields)}) VALUES ({', '.join(['?'] * len(fields))})" + (IMPORT_CONFLICT_CLAUSES[table_name].format(updates=updates) if updates else " ON CONFLICT DO NOTHING")
+            imported, skipped, started = 0, 0, time.perf_counter()
+            with self.conn, self._unspilled():
+                if not self.conn.in_transaction: self.conn.execute("BEGIN IMMEDIATE")
+                for chunk in iter(lambda: list(islice(reader, chunk_size)), []):
+                    if cancel_event is not None and cancel_event.is_set(): self.conn.rollback(); return imported, skipped, True
+                    rows = [values for values in (self._coerce_csv_row(row, fields, columns) for row in chunk) if values is not None]
+                    self.conn.executemany(query, rows); imported += len(rows); skipped += len(chunk) - len(rows)
+                    if progress: progress(imported, skipped, imported / max(time.perf_counter() - started, 1e-6))
+        self._invalidate(table_name); return imported, skipped, False
+    def import_orders_from_csv(self, file_path, progress=None, cancel_event=None, chunk_size=IMPORT_CHUNK_SIZE):
+        # One row per order line: order_ref, customer, product, quantity[, order_date]. Lines of an order must be contiguous.
+        # Names resolve case-insensitively through in-memory maps; an unknown customer or bad order_date skips the
+        # whole order, an unknown product or bad quantity skips the line. Returns (orders imported, lines skipped, cancelled).
+        customers = {name.strip().casefold(): cid for cid, name in self.conn.execute("SELECT id, name FROM customers")}
+        products = {name.strip().casefold(): pid for pid, name in self.conn.execute("SELECT id, name FROM products")}
+        with open(file_path, 'r', newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f); header = [name.strip() for name in next(reader, [])]
+            missing = [name for name in ORDER_IMPORT_COLUMNS if name not in header]
+            if missing: raise ValueError(f"CSV is missing required column(s): {', '.join(missing)}")
+            counts, imported, started = {"skipped": 0}, 0, time.perf_counter()
+            orders = self._parse_order_lines(reader, [header.index(name) for name in ORDER_IMPORT_COLUMNS] + [header.index("order_date") if "order_date" in header else None], customers, products, datetime.now(), counts)
+            with self.conn, self._unspilled():
+                self.conn.execute("BEGIN IMMEDIATE"); next_id = self._next_order_id()
+                for batch in iter(lambda: list(islice(orders, chunk_size)), []):
+                    if cancel_event is not None and cancel_event.is_set(): self.conn.rollback(); return imported, counts["skipped"], True
+                    next_id = self._insert_order_batch(batch, next_id); imported += len(batch)
+                    if progress: progress(imported, counts["skipped"], imported / max(time.perf_counter() - started, 1e-6))
+        self._invalidate("orders", "order_items"); return imported, counts["skipped"], False
+    @contextmanager
+    def _unspilled(self):
+        # Under a rollback journal (the Safe profile) a transaction that spills its cache into the file locks every reader out until
+        # it commits. Bulk imports keep their changes in memory instead, so readers wait only while the commit is written.
+        rollback_journal = self.conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != "wal"
+        if rollback_journal: self.conn.execute("PRAGMA cache_spill = OFF")
+        try: yield
+        finally:
+            if rollback_journal: self.conn.execute("PRAGMA cache_spill = ON")
+    def _parse_order_lines(self, reader, columns, customers, products, default_date, counts):
+        ref, customer, product, quantity, date = columns; width = max(index for index in columns if index is not None) + 1
+        # Raw spellings are memoized next to the normalized names, so repeated names skip strip/casefold.
+        lookup = lambda names, raw: names.get(raw) if raw in names else names.setdefault(raw, names.get(raw.strip().casefold()))
+        def complete(lines):
+            for line in lines:
+                if len(line) >= width: yield line
+                elif any(line): counts["skipped"] += 1
+        for _, lines in groupby(complete(reader), key=lambda line: line[ref]):
+            lines = list(lines); customer_id = lookup(customers, lines[0][customer])
+            try: order_date = datetime.fromisoformat(lines[0][date].strip()) if date is not None and lines[0][date].strip() else default_date
+            except ValueError: customer_id = None
+            if customer_id is None: counts["skipped"] += len(lines); continue
+            items = {}
+            for line in lines:
+                product_id = lookup(products, line[product])
+                try: amount = int(line[quantity])
+                except ValueError: amount = 0
+                if product_id is None or amount <= 0: counts["skipped"] += 1; continue
+                items[product_id] = items.get(product_id, 0) + amount
+            if items: yield customer_id, order_date, list(items.items())
+    def _coerce_csv_row(self, row, fields, columns):
+        values = []
+        for name in fields:
+            value, (col_type, not_null) = (row.get(name) or "").strip(), columns[name]
+            if not value:
+                if not_null: return None
+                values.append(None); continue
+            try:
+                if col_type == "REAL": value = float(value.replace("$", "").replace(",", ""))
+                elif col_type == "INTEGER": value = int(value.replace(",", ""))
+            except ValueError: return None
+            values.append(value)
+        return values
+    def iter_export(self, dataset, batch_size=EXPORT_BATCH_SIZE):
+        # Yields the column names, then row batches straight from the cursor so memory does not grow with the table.
+        cursor = self.conn.cursor(); cursor.execute(EXPORT_QUERIES[dataset]); yield [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows: break
+            yield rows
+    def export_to_file(self, dataset, file_path, file_format=None, progress=None, cancel_event=None, batch_size=EXPORT_BATCH_SIZE):
+        # Writes to a temporary file that replaces file_path only once complete, so a cancelled or failed export leaves nothing behind.
+        # Returns (exported, cancelled).
+        file_format = file_format or ("parquet" if file_path.lower().endswith(".parquet") else "csv")
+        if dataset not in EXPORT_QUERIES: raise ValueError(f"Unknown export dataset '{dataset}'.")
+        if file_format not in EXPORT_FORMATS: raise ValueError(f"Unknown export format '{file_format}'.")
+        batches = self.iter_export(dataset, batch_size); columns = next(batches); exported, cancelled, partial = 0, False, f"{file_path}.partial"
+        write_batch, finish = self._parquet_writer(partial, columns, EXPORT_TYPES[dataset]) if file_format == "parquet" else self._csv_writer(partial, columns)
+        try:
+            try:
+                for rows in batches:
+                    if cancel_event is not None and cancel_event.is_set(): cancelled = True; break
+                    write_batch(rows); exported += len(rows)
+                    if progress: progress(exported)
+            finally: finish()
+            if not cancelled: os.replace(partial, file_path)
+        finally:
+            if os.path.exists(partial): os.remove(partial)
+        return exported, cancelled
+    def _csv_writer(self, file_path, columns):
+        f = open(file_path, 'w', newline='', encoding='utf-8'); writer = csv.writer(f); writer.writerow(columns)
+        return writer.writerows, f.close
+    def _parquet_writer(self, file_path, columns, types):
+        try: import pyarrow as pa; import pyarrow.parquet as pq
+        except ImportError: raise RuntimeError("Parquet export requires the optional 'pyarrow' package (pip install pyarrow).")
+        arrow_types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string(), "timestamp": pa.timestamp("us")}
+        schema = pa.schema([pa.field(name, arrow_types[kind]) for name, kind in zip(columns, types)]); writer = pq.ParquetWriter(file_path, schema)
+        def write_batch(rows): writer.write_table(pa.Table.from_pydict({name: [row[i] for row in rows] for i, name in enumerate(columns)}, schema=schema))
+        return write_batch, writer.close
     def close(self): self.conn.close()
\ No newline at end of file
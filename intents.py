@@ -0,0 +1,142 @@
+# agroflow/intents.py
+
+import re
+import time
+import analytics
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+ANSWER_TTL_SECONDS = 60
+ANSWER_CACHE_SIZE = 128
+DEFAULT_TOP = 5
+MAX_TOP = 50
+
+# Parameters are matched (and cut out of the question) before intents, so dates never end up in a product or customer name.
+PREFIX = r"(?:(?:for|in|over|during|on)\s+)?(?:the\s+)?"
+PARAMETERS = re.compile(rf"""
+    \btop\s+(?P<limit>\d+)\b
+  | \b(?:from|between)\s+(?P<range_start>\d{{4}}-\d{{2}}-\d{{2}})\s+(?:to|and|until|through|-)\s+(?P<range_end>\d{{4}}-\d{{2}}-\d{{2}})\b
+  | \bsince\s+(?P<since>\d{{4}}-\d{{2}}-\d{{2}})\b
+  | \b{PREFIX}(?P<day>\d{{4}}-\d{{2}}-\d{{2}})\b
+  | \b{PREFIX}(?P<month>\d{{4}}-\d{{2}})\b
+  | \b{PREFIX}(?:last|past)\s+(?P<days>\d+)\s+days?\b
+  | \b{PREFIX}(?P<relative>(?:this|last|past)\s+(?:week|month|year)|today|yesterday|day|week|month|year)\b
+  | \b{PREFIX}(?P<year>(?:19|20)\d{{2}})\b
+""", re.VERBOSE)
+# One pass over the remaining text; when several intents match, the earliest in INTENT_PRIORITY wins. The top-N
+# intents only match their first word (the rest is a lookahead) so "most seasonal products" still sees "seasonal".
+INTENTS = re.compile(r"""
+    \bhow\s+much\s+(?:did|has|have)\s+(?P<spender>.+?)\s+(?:spend|spent|buy|bought|order|ordered)\b
+  | \b(?:sales|revenue|sold|spending|orders)\s+(?:of|for|by|from|to)\s+(?P<subject>\w.*?)\s*$
+  | (?P<reorder>\b(?:re-?order\w*|restock\w*|forecast\w*|demand)\b)
+  | (?P<seasonality>\b(?:season\w*|peak\s+months?)\b)
+  | (?P<segments>\b(?:rfm|segment\w*|churn\w*|at[\s-]risk|lapsed|loyal)\b)
+  | (?P<trend>\b(?:trends?|trending|weekly|rolling)\b)
+  | (?P<top_products>\b(?:top|best|most)\b(?=.*\b(?:products?|items?|sellers?|produce)\b))
+  | (?P<top_customers>\b(?:top|best|biggest)\b(?=.*\b(?:customers?|clients?|buyers?|accounts?)\b))
+  | (?P<total_sales>\b(?:sales|revenue|turnover|sold)\b)
+  | (?P<thanks>\bthanks?\b)
+  | (?P<greeting>\b(?:hello|hi|hey)\b)
+""", re.VERBOSE)
+INTENT_PRIORITY = ("subject_sales", "reorder", "seasonality", "segments", "trend", "top_products", "top_customers", "total_sales", "thanks", "greeting")
+INTENT_GROUPS = {"spender": "subject_sales", "subject": "subject_sales"}
+SMALL_TALK = {
+    "greeting": "Hi there! What report can I get for you?",
+    "thanks": "You're welcome! Is there anything else?",
+    "help": "I can help with total sales, top products, top customers, and sales for a single product or customer, plus weekly revenue trends, seasonal products, customer segments and reorder suggestions. Add a period like 'today', 'this month', 'last 14 days', '2024-03' or 'from 2024-01-01 to 2024-01-31'.",
+}
+
+# start/end are datetimes on whole-day boundaries (end exclusive) or None; label describes the period in answers.
+Intent = namedtuple("Intent", "name start end label limit subject")
+
+def parse(text, now=None):
+    today = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0); found = {}
+    def take(match): found.update((key, value) for key, value in match.groupdict().items() if value is not None); return " top " if match.group("limit") else " "
+    remaining = PARAMETERS.sub(take, text.lower()).strip(" ?!.")
+    start, end, label = period(found, today)
+    matches = {INTENT_GROUPS.get(match.lastgroup, match.lastgroup): match for match in INTENTS.finditer(remaining)}
+    name = next((name for name in INTENT_PRIORITY if name in matches), "help")
+    subject = " ".join(next(group for group in matches[name].groups() if group).split()) if name == "subject_sales" else None
+    if name == "total_sales" and start is None: start, end, label = today - timedelta(days=29), today + timedelta(days=1), "the last 30 days"
+    return Intent(name, start, end, label, min(int(found.get("limit", DEFAULT_TOP)), MAX_TOP) or DEFAULT_TOP, subject)
+
+def period(found, today):
+    day, tomorrow = timedelta(days=1), today + timedelta(days=1)
+    if "range_start" in found:
+        start, end = datetime.strptime(found["range_start"], "%Y-%m-%d"), datetime.strptime(found["range_end"], "%Y-%m-%d")
+        return start, end + day, f"{start:%Y-%m-%d} to {end:%Y-%m-%d}"
+    if "since" in found: start = datetime.strptime(found["since"], "%Y-%m-%d"); return start, tomorrow, f"since {start:%Y-%m-%d}"
+    if "day" in found: start = datetime.strptime(found["day"], "%Y-%m-%d"); return start, start + day, f"{start:%Y-%m-%d}"
+    if "month" in found: start = datetime.strptime(found["month"], "%Y-%m"); return start, (start + timedelta(days=32)).replace(day=1), f"{start:%Y-%m}"
+    if "year" in found: start = datetime(int(found["year"]), 1, 1); return start, start.replace(year=start.year + 1), found["year"]
+    if "days" in found: days = max(int(found["days"]), 1); return tomorrow - days * day, tomorrow, f"the last {days} days"
+    relative = " ".join(found.get("relative", "").split())
+    if relative in ("today", "day"): return today, tomorrow, "today"
+    if relative == "yesterday": return today - day, today, "yesterday"
+    if relative == "this week": return today - timedelta(days=today.weekday()), tomorrow, "this week"
+    if relative == "this month": return today.replace(day=1), tomorrow, "this month"
+    if relative == "this year": return today.replace(month=1, day=1), tomorrow, "this year"
+    # Bare or "last"/"past" week, month and year are rolling windows ending today.
+    for unit, days in (("week", 7), ("month", 30), ("year", 365)):
+        if relative.endswith(unit): return tomorrow - days * day, tomorrow, f"the last {days} days"
+    return None, None, None
+
+def answer(db, intent):
+    # Runs on a pool reader and returns the formatted reply.
+    during = f" for {intent.label}" if intent.label else ""
+    if intent.name in ANALYTICS_ANSWERS:
+        # A period only moves the analysis back in time: it runs as of the period's last day.
+        if not analytics.available(): return analytics.UNAVAILABLE
+        return ANALYTICS_ANSWERS[intent.name](db, intent.end and (intent.end - timedelta(days=1)).date(), intent.limit)
+    if intent.name == "total_sales":
+        total = db.get_total_sales_between(intent.start, intent.end)
+        return f"Total sales{during} were ${total[0]:,.2f}." if total and total[0] is not None else f"No sales{during}."
+    if intent.name == "top_products":
+        products = db.get_top_selling_products(intent.limit, intent.start, intent.end)
+        return f"Top {len(products)} products{during}:\n" + "\n".join(f"- {p['name']} ({p['total_quantity']:,} units)" for p in products) if products else f"No product sales data found{during}."
+    if intent.name == "top_customers":
+        customers = db.get_top_customers_by_value(intent.limit, intent.start, intent.end)
+        return f"Top {len(customers)} customers{during}:\n" + "\n".join(f"- {c['name']} (${c['total_spent']:,.2f})" for c in customers) if customers else f"No customer sales data found{during}."
+    kind, match = find_subject(db, intent.subject)
+    if kind == "customer":
+        summary = db.get_customer_statement_summary(match["id"], intent.start, intent.end)
+        return f"{match['name']} placed {summary['orders']:,} completed orders worth ${summary['revenue']:,.2f}" + (f" ({intent.label})." if intent.label else " in total.")
+    if kind == "product":
+        quantity, revenue = db.get_product_sales(match["id"], intent.start, intent.end)
+        return f"{match['name']}: {quantity:,.0f} units sold for ${revenue:,.2f}" + (f" ({intent.label})." if intent.label else " in total.")
+    return f"I couldn't find a customer or product called '{intent.subject}'."
+
+def find_subject(db, term):
+    # An exact (case-insensitive) name wins, customers before products; otherwise the first prefix or substring hit.
+    candidates = [("customer", row) for row in db.get_customers(term, 5)] + [("product", row) for row in db.get_products(term, 5)]
+    return next((candidate for candidate in candidates if candidate[1]["name"].casefold() == term.casefold()), candidates[0] if candidates else (None, None))
+
+ANALYTICS_ANSWERS = {"trend": analytics.trend_report, "seasonality": analytics.seasonality_report, "segments": analytics.segments_report, "reorder": analytics.reorder_report}
+
+# Tables each answer reads; completing an order bumps them, which drops the cached answer.
+ANSWER_TABLES = {
+    "total_sales": ("orders", "sales_daily"),
+    "top_products": ("sales_daily_product", "product_sales_totals", "products"),
+    "top_customers": ("sales_daily_customer", "customer_sales_totals", "customers"),
+    "subject_sales": ("orders", "sales_daily_product", "product_sales_totals", "customers", "products"),
+    **{name: analytics.ANALYTICS_TABLES + ("customers", "products") for name in ANALYTICS_ANSWERS},
+}
+
+class AnswerCache:
+    # Formatted answers keyed by intent. An answer is served until it is `ttl` seconds old (relative periods move, and other
+    # processes write without bumping our counters) or until this process writes to a table it was built from.
+    def __init__(self, db, ttl=ANSWER_TTL_SECONDS, size=ANSWER_CACHE_SIZE): self.db, self.ttl, self.size, self._answers = db, ttl, size, OrderedDict()
+
+    def stamp(self, intent): return self.db.table_versions(*ANSWER_TABLES[intent.name])
+
+    def get(self, intent):
+        entry = self._answers.get(intent)
+        if entry is None: return None
+        expires, stamp, text = entry
+        if time.monotonic() >= expires or stamp != self.stamp(intent): del self._answers[intent]; return None
+        self._answers.move_to_end(intent); return text
+
+    def put(self, intent, stamp, text):
+        # `stamp` is taken before the query runs, so a write that lands meanwhile still invalidates the answer.
+        self._answers[intent] = (time.monotonic() + self.ttl, stamp, text); self._answers.move_to_end(intent)
+        if len(self._answers) > self.size: self._answers.popitem(last=False)
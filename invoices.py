@@ -0,0 +1,224 @@
+# agroflow/invoices.py
+
+import os
+import ssl
+import time
+import zlib
+import queue
+import smtplib
+import threading
+import multiprocessing
+from functools import lru_cache
+from itertools import islice
+from email.message import EmailMessage
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Stdlib only, so importing it adds nothing heavy to a render process. A spawned process also re-imports the launching
+# __main__ though: from the GUI that is app.py with Tk and the database layer, which is part of why small batches skip the processes.
+INVOICE_DIR = os.path.join("data", "invoices")
+INVOICE_CHUNK_SIZE = 50
+# Batches up to INVOICE_INLINE_MAX render on the calling thread; larger ones get a render process per INVOICE_PROCESS_BATCH invoices.
+INVOICE_INLINE_MAX = 100
+INVOICE_PROCESS_BATCH = 1000
+COMPANY_SETTINGS = ("company_name", "company_address", "company_phone", "company_email")
+SMTP_SETTINGS = ("smtp_smtp_host", "smtp_port", "smtp_username", "smtp_password")
+SMTP_POOL_SIZE = 2
+SMTP_IDLE_SECONDS = 60
+SMTP_TIMEOUT = 30
+
+# US Letter in points; rows below ROWS_BOTTOM continue on the next page.
+PAGE_WIDTH, PAGE_HEIGHT, MARGIN = 612, 792, 50
+ROWS_TOP, ROWS_BOTTOM, ROW_HEIGHT = 560, 110, 16
+COLUMNS = (("Item", MARGIN, False), ("Qty", 360, True), ("Unit Price", 460, True), ("Amount", PAGE_WIDTH - MARGIN, True))
+ITEM_WIDTH = 250
+# Helvetica advance widths (1/1000 em) for ASCII 32..126; other characters are measured as 556. Close enough for Helvetica-Bold.
+HELVETICA_WIDTHS = (278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278, 556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+                    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+                    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584)
+FONTS = (b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+
+def company_details(db): return tuple(db.setting(key) for key in COMPANY_SETTINGS)
+def invoice_filename(order_id): return f"invoice_{order_id:06d}.pdf"
+def money(value): return f"${value:,.2f}"
+
+def text_width(text, size): return sum(HELVETICA_WIDTHS[ord(char) - 32] if 32 <= ord(char) <= 126 else 556 for char in text) * size / 1000
+def fit(text, size, width):
+    if text_width(text, size) <= width: return text
+    while text and text_width(text + "...", size) > width: text = text[:-1]
+    return text + "..."
+
+def draw(x, y, text, size=10, bold=False, right=False):
+    if right: x -= text_width(text, size)
+    encoded = " ".join(str(text).split()).encode("cp1252", "replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+    return b"BT /F%d %g Tf %.2f %.2f Td (%s) Tj ET\n" % (2 if bold else 1, size, x, y, encoded)
+def rule(y, width=0.5): return b"%g w %d %.2f m %d %.2f l S\n" % (width, MARGIN, y, PAGE_WIDTH - MARGIN, y)
+
+def build_pdf(page_streams):
+    # Catalog, page tree and the two fonts are objects 1-4; each page adds its content stream and page object.
+    objects, kids = [b"<< /Type /Catalog /Pages 2 0 R >>", None, *FONTS], []
+    for stream in page_streams:
+        data = zlib.compress(stream, 6); objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(data), data))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>" % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))); kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+    out, offsets = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"), []
+    for number, body in enumerate(objects, 1): offsets.append(len(out)); out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out); out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1) + b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+class InvoiceTemplate:
+    # The parts of a page that only depend on the company (letterhead, title, column headings) are encoded once per company
+    # and reused for every page of every invoice; see get_template().
+    def __init__(self, company):
+        name, address, phone, email = company; self.company = company
+        header = draw(MARGIN, 730, name, 20, bold=True) + draw(PAGE_WIDTH - MARGIN, 730, "INVOICE", 22, bold=True, right=True)
+        for i, line in enumerate([part.strip() for part in address.replace(";", "\n").splitlines() if part.strip()] + [value for value in (phone, email) if value]): header += draw(MARGIN, 712 - i * 12, line, 9)
+        self.header = header + rule(ROWS_TOP + 22) + b"".join(draw(x, ROWS_TOP + 8, title, 10, bold=True, right=right) for title, x, right in COLUMNS) + rule(ROWS_TOP + 2)
+        self.rows_per_page = int((ROWS_TOP - ROWS_BOTTOM) // ROW_HEIGHT)
+
+    def render(self, invoice):
+        items = invoice["items"]; pages = [items[i:i + self.rows_per_page] for i in range(0, len(items), self.rows_per_page)] or [[]]
+        details = self.details(invoice); streams = []
+        for number, page in enumerate(pages, 1):
+            stream = bytearray(self.header); stream += details; y = ROWS_TOP - ROW_HEIGHT + 2
+            for name, quantity, price in page:
+                stream += draw(MARGIN, y, fit(name, 10, ITEM_WIDTH)) + draw(360, y, f"{quantity:g}", right=True) + draw(460, y, money(price), right=True) + draw(PAGE_WIDTH - MARGIN, y, money(quantity * price), right=True); y -= ROW_HEIGHT
+            if number == len(pages): stream += rule(y + ROW_HEIGHT - 4) + draw(460, y - 8, "Total", 12, bold=True, right=True) + draw(PAGE_WIDTH - MARGIN, y - 8, money(invoice["total"] or 0), 12, bold=True, right=True)
+            stream += draw(MARGIN, 40, f"Thank you for your business. - {self.company[0]}", 8) + draw(PAGE_WIDTH - MARGIN, 40, f"Page {number} of {len(pages)}", 8, right=True)
+            streams.append(bytes(stream))
+        return build_pdf(streams)
+
+    def details(self, invoice):
+        stream = draw(PAGE_WIDTH - MARGIN, 700, f"Invoice #{invoice['id']}", 11, bold=True, right=True) + draw(PAGE_WIDTH - MARGIN, 686, f"Date: {invoice['order_date']:%Y-%m-%d}", 10, right=True)
+        stream += draw(MARGIN, 650, "Bill To", 10, bold=True)
+        for i, line in enumerate(value for value in (invoice["name"], invoice["address"], invoice["phone"], invoice["email"]) if value): stream += draw(MARGIN, 636 - i * 12, line, 10)
+        return stream
+
+@lru_cache(maxsize=8)
+def get_template(company): return InvoiceTemplate(company)
+def render_invoice(invoice, company): return get_template(company).render(invoice)
+
+def _render_chunk(invoices, company, out_dir):
+    # Runs in a render process; writes each PDF and returns {order_id: path}.
+    rendered = {}
+    for invoice in invoices:
+        path = os.path.join(out_dir, invoice_filename(invoice["id"]))
+        with open(path, "wb") as f: f.write(render_invoice(invoice, company))
+        rendered[invoice["id"]] = path
+    return rendered
+
+class InvoiceRenderer:
+    # Renders invoices in a pool of processes (at most `workers`, one per core by default) so large batches use every core and never
+    # compete with the Tk thread for the GIL. Processes are spawned on first use, as many as the batch warrants, and kept until shutdown().
+    def __init__(self, workers=None): self.workers, self._executor, self._size, self._lock = workers or os.cpu_count() or 1, None, 0, threading.Lock()
+
+    def _pool(self, processes):
+        with self._lock:
+            if self._executor is not None and self._size < processes: self._executor.shutdown(wait=False); self._executor = None
+            if self._executor is None: self._executor, self._size = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")), processes
+            return self._executor, self._size
+
+    def render_orders(self, db, order_ids, out_dir=INVOICE_DIR, progress=None, cancel_event=None, chunk_size=INVOICE_CHUNK_SIZE):
+        # Invoice data is read chunk by chunk on the calling thread while earlier chunks render, with at most two chunks per
+        # process in flight. Orders that are not Completed are left out. Returns ({order_id: path}, cancelled).
+        os.makedirs(out_dir, exist_ok=True); company, total = company_details(db), len(order_ids)
+        ids, pending, rendered, started = iter(order_ids), set(), {}, time.perf_counter()
+        report = lambda: progress and progress(len(rendered), total, len(rendered) / max(time.perf_counter() - started, 1e-6))
+        if total <= INVOICE_INLINE_MAX:
+            # Spawning a process costs more than rendering a small batch outright.
+            for chunk in iter(lambda: list(islice(ids, chunk_size)), []):
+                if cancel_event is not None and cancel_event.is_set(): break
+                rendered.update(_render_chunk(db.get_invoice_data(chunk), company, out_dir)); report()
+            return rendered, cancel_event is not None and cancel_event.is_set()
+        pool, processes = self._pool(min(self.workers, -(-total // INVOICE_PROCESS_BATCH)))
+        def collect():
+            nonlocal pending
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if not future.cancelled(): rendered.update(future.result())
+            report()
+        for chunk in iter(lambda: list(islice(ids, chunk_size)), []):
+            if cancel_event is not None and cancel_event.is_set(): break
+            pending.add(pool.submit(_render_chunk, db.get_invoice_data(chunk), company, out_dir))
+            while len(pending) >= processes * 2: collect()
+        cancelled = cancel_event is not None and cancel_event.is_set()
+        if cancelled:
+            for future in pending: future.cancel()
+        while pending: collect()
+        return rendered, cancelled
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None: self._executor.shutdown(wait=False, cancel_futures=True); self._executor = None
+
+class SMTPPool:
+    # Keeps up to `size` logged-in SMTP sessions for reuse; connecting, STARTTLS and AUTH cost far more than sending a message.
+    # Sessions idle for over SMTP_IDLE_SECONDS are checked with NOOP before reuse, and a send that finds the session dropped is retried once.
+    def __init__(self, host, port=587, username="", password="", sender=None, size=SMTP_POOL_SIZE):
+        self.host, self.port, self.username, self.password, self.size = host, int(port or 587), username, password, size
+        self.sender = sender or (username if "@" in username else f"invoices@{host}")
+        self._idle, self._slots = queue.LifoQueue(), threading.BoundedSemaphore(size)
+
+    @classmethod
+    def from_settings(cls, db):
+        host, port, username, password = (db.setting(key) for key in SMTP_SETTINGS)
+        if not host: raise ValueError("No SMTP host is configured. Enter one under Settings > SMTP Email Settings.")
+        return cls(host, port, username, password)
+
+    def send(self, message):
+        if "From" not in message: message["From"] = self.sender
+        with self._slots:
+            connection = self._acquire()
+            try:
+                try: connection.send_message(message)
+                except smtplib.SMTPServerDisconnected: connection = self._connect(); connection.send_message(message)
+            except Exception: self._discard(connection); raise
+            self._idle.put((connection, time.monotonic()))
+
+    def _acquire(self):
+        while True:
+            try: connection, last_used = self._idle.get_nowait()
+            except queue.Empty: return self._connect()
+            if time.monotonic() - last_used < SMTP_IDLE_SECONDS: return connection
+            try:
+                if connection.noop()[0] == 250: return connection
+            except (smtplib.SMTPException, OSError): pass
+            self._discard(connection)
+
+    def _connect(self):
+        if self.port == 465: connection = smtplib.SMTP_SSL(self.host, self.port, timeout=SMTP_TIMEOUT, context=ssl.create_default_context())
+        else: connection = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        try:
+            connection.ehlo()
+            if self.port != 465 and connection.has_extn("starttls"): connection.starttls(context=ssl.create_default_context()); connection.ehlo()
+            if self.username and self.password: connection.login(self.username, self.password)
+        except Exception: connection.close(); raise
+        return connection
+
+    def _discard(self, connection):
+        try: connection.quit()
+        except (smtplib.SMTPException, OSError): connection.close()
+
+    def close(self):
+        while True:
+            try: self._discard(self._idle.get_nowait()[0])
+            except queue.Empty: return
+
+def invoice_message(invoice, path, company):
+    message = EmailMessage(); message["To"], message["Subject"] = invoice["email"], f"Invoice #{invoice['id']} from {company[0]}"
+    if company[3]: message["Reply-To"] = company[3]
+    message.set_content(f"Dear {invoice['name']},\n\nPlease find attached invoice #{invoice['id']} dated {invoice['order_date']:%Y-%m-%d} for {money(invoice['total'] or 0)}.\n\nThank you for your business,\n{company[0]}\n")
+    with open(path, "rb") as f: message.add_attachment(f.read(), maintype="application", subtype="pdf", filename=os.path.basename(path))
+    return message
+
+def email_invoices(db, renderer, mailer, order_ids, out_dir=INVOICE_DIR, progress=None, cancel_event=None):
+    # Renders through the process pool, then sends over the mailer's pooled sessions. Orders whose customer has no email address
+    # (or that are not Completed) are skipped. Returns (sent, skipped, cancelled).
+    rendered, cancelled = renderer.render_orders(db, order_ids, out_dir, cancel_event=cancel_event)
+    invoices, company, sent = [] if cancelled else [invoice for invoice in db.get_invoice_data(list(rendered)) if invoice["email"]], company_details(db), 0
+    with ThreadPoolExecutor(mailer.size) as senders:
+        for future in [senders.submit(mailer.send, invoice_message(invoice, rendered[invoice["id"]], company)) for invoice in invoices]:
+            if cancel_event is not None and cancel_event.is_set(): cancelled = True; future.cancel(); continue
+            future.result(); sent += 1
+            if progress: progress(sent, len(invoices))
+    return sent, len(order_ids) - len(invoices), cancelled
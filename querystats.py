@@ -0,0 +1,129 @@
+# agroflow/querystats.py
+
+import os
+import sys
+import sqlite3
+import threading
+import logging
+from logging.handlers import RotatingFileHandler
+from time import perf_counter
+from collections import Counter
+
+# Opt-in: set AGROFLOW_QUERY_STATS=1 (and optionally AGROFLOW_SLOW_QUERY_MS) or the 'query_stats' setting. Connections opened while disabled are plain
+# sqlite3 connections, so the disabled path costs nothing per statement.
+LATENCY_BUCKETS_MS = (1, 4, 16, 50, 100, 250, 1000, float("inf"))
+SLOW_QUERY_MS = 100
+SLOW_QUERY_LOG = os.path.join("data", "slow_queries.log")
+SLOW_LOG_MAX_BYTES = 1_000_000
+SLOW_LOG_BACKUPS = 3
+CALL_SITE_SKIP = {os.path.abspath(__file__), os.path.abspath(os.path.join(os.path.dirname(__file__), "database.py")), os.path.abspath(os.path.join(os.path.dirname(__file__), "workers.py")), os.path.abspath(sqlite3.__file__), os.path.abspath(threading.__file__)}
+
+_enabled, _slow_ms, _slow_logger = False, SLOW_QUERY_MS, None
+
+def is_enabled(): return _enabled
+def enable(slow_ms=None, log_file=SLOW_QUERY_LOG):
+    global _enabled, _slow_ms, _slow_logger
+    _enabled = True
+    if slow_ms is not None: _slow_ms = float(slow_ms)
+    if _slow_logger is None:
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        _slow_logger = logging.getLogger("agroflow.slow_queries"); _slow_logger.setLevel(logging.INFO); _slow_logger.propagate = False
+        handler = RotatingFileHandler(log_file, maxBytes=SLOW_LOG_MAX_BYTES, backupCount=SLOW_LOG_BACKUPS, encoding="utf-8"); handler.setFormatter(logging.Formatter("%(asctime)s %(message)s")); _slow_logger.addHandler(handler)
+def connection_factory(): return InstrumentedConnection if _enabled else sqlite3.Connection
+
+def call_site():
+    # Innermost Database method plus the first caller outside the data layer, e.g. "get_orders_page <- app.py:412 filter_orders".
+    # Calls run by the worker pool have no such caller and are reported by method name alone.
+    frame, method = sys._getframe(2), None
+    while frame is not None:
+        path = os.path.abspath(frame.f_code.co_filename)
+        if path not in CALL_SITE_SKIP: return f"{method or '?'} <- {os.path.basename(path)}:{frame.f_lineno} {frame.f_code.co_name}"
+        if method is None and path.endswith("database.py") and not frame.f_code.co_name.startswith(("<", "_")): method = frame.f_code.co_name
+        frame = frame.f_back
+    return method or "?"
+
+class QueryStats:
+    # Process-wide aggregates per SQL text: call count, total/max latency, rows, a latency histogram and the busiest call sites.
+    def __init__(self): self._lock, self._stats = threading.Lock(), {}
+
+    def record(self, sql, seconds, rows, site):
+        ms, key = seconds * 1000, " ".join(sql.split())
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None: stat = self._stats[key] = {"sql": key, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "histogram": [0] * len(LATENCY_BUCKETS_MS), "sites": Counter()}
+            stat["count"] += 1; stat["total_ms"] += ms; stat["max_ms"] = max(stat["max_ms"], ms); stat["rows"] += max(rows, 0); stat["sites"][site] += 1
+            stat["histogram"][next(i for i, bound in enumerate(LATENCY_BUCKETS_MS) if ms <= bound)] += 1
+        return ms
+
+    def snapshot(self, order_by="total_ms", limit=None):
+        with self._lock: stats = [dict(stat, histogram=list(stat["histogram"]), sites=stat["sites"].most_common(3)) for stat in self._stats.values()]
+        for stat in stats: stat["avg_ms"], stat["p95_ms"] = stat["total_ms"] / stat["count"], self._percentile(stat["histogram"], 0.95)
+        stats.sort(key=lambda stat: stat[order_by], reverse=True)
+        return stats[:limit] if limit else stats
+
+    def _percentile(self, histogram, fraction):
+        # Upper bound of the bucket holding the requested fraction of calls.
+        target, seen = fraction * sum(histogram), 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, histogram):
+            seen += count
+            if seen >= target: return bound
+        return LATENCY_BUCKETS_MS[-1]
+
+    def reset(self):
+        with self._lock: self._stats.clear()
+
+STATS = QueryStats()
+
+def log_slow(connection, sql, parameters, ms, rows, site):
+    if _slow_logger is None: return
+    plan = []
+    if parameters is None: plan = ["(executemany)"]
+    elif sql.lstrip().upper().startswith(("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")):
+        try: plan = [row[3] for row in sqlite3.Connection.execute(connection, "EXPLAIN QUERY PLAN " + sql, parameters)]
+        except sqlite3.Error as e: plan = [f"(plan unavailable: {e})"]
+    _slow_logger.info("%.1f ms, %d rows, %s\n    %s\n    params: %r\n    plan: %s", ms, rows, site, " ".join(sql.split()), parameters, " | ".join(plan) or "-")
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # A SELECT is timed from execute() until its rows are consumed (fetchall, fetchone, a short fetchmany batch or the end of
+    # iteration), so the sample includes stepping the rows; statements without a result set are recorded as soon as they return.
+    _pending = None
+
+    def execute(self, sql, parameters=()):
+        self._flush(); started, site = perf_counter(), call_site(); super().execute(sql, parameters); seconds = perf_counter() - started
+        if self.description is None: self._record(sql, parameters, seconds, self.rowcount, site)
+        else: self._pending = [sql, parameters, seconds, site, 0]
+        return self
+    def executemany(self, sql, seq_of_parameters):
+        self._flush(); started, site = perf_counter(), call_site(); super().executemany(sql, seq_of_parameters)
+        self._record(sql, None, perf_counter() - started, self.rowcount, site); return self
+    def fetchone(self):
+        started = perf_counter(); row = super().fetchone(); self._consume(perf_counter() - started, row is not None, True); return row
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size; started = perf_counter(); rows = super().fetchmany(size); self._consume(perf_counter() - started, len(rows), len(rows) < size); return rows
+    def fetchall(self):
+        started = perf_counter(); rows = super().fetchall(); self._consume(perf_counter() - started, len(rows), True); return rows
+    def __next__(self):
+        started = perf_counter()
+        try: row = super().__next__()
+        except StopIteration: self._consume(perf_counter() - started, 0, True); raise
+        self._consume(perf_counter() - started, 1, False); return row
+
+    def _consume(self, seconds, rows, done):
+        if self._pending is None: return
+        self._pending[2] += seconds; self._pending[4] += rows
+        if done: self._flush()
+    def _flush(self):
+        if self._pending is None: return
+        sql, parameters, seconds, site, rows = self._pending; self._pending = None; self._record(sql, parameters, seconds, rows, site)
+    def _record(self, sql, parameters, seconds, rows, site):
+        ms = STATS.record(sql, seconds, rows, site)
+        if ms >= _slow_ms: log_slow(self.connection, sql, parameters, ms, rows, site)
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor): return super().cursor(factory)
+    def execute(self, sql, parameters=()): return self.cursor().execute(sql, parameters)
+    def executemany(self, sql, seq_of_parameters): return self.cursor().executemany(sql, seq_of_parameters)
+    def commit(self):
+        started, site = perf_counter(), call_site(); super().commit(); STATS.record("COMMIT", perf_counter() - started, 0, site)
+
+if os.environ.get("AGROFLOW_QUERY_STATS", "") not in ("", "0"): enable(os.environ.get("AGROFLOW_SLOW_QUERY_MS"))
@@ -0,0 +1,260 @@
+# agroflow/sync.py
+# Delta sync between AgroFlow databases, built on the change_log / sync_ids tables of migration 3.
+
+import gzip
+import io
+import json
+import os
+import socket
+import socketserver
+import sqlite3
+import struct
+import uuid
+from datetime import datetime
+from database import Database, CDC_TABLES, CDC_TRIGGERS, ROLLUP_TABLES
+
+SYNC_FORMAT = 1
+SYNC_PORT = 8765
+SYNC_TIMEOUT = 60
+SYNC_ROLLUP_REFRESH_ORDERS = 5000
+# Synced columns per table and the columns that reference another synced table; references travel as global ids.
+SYNC_COLUMNS = {
+    "customers": (("name", "email", "phone", "address", "notes"), {}),
+    "products": (("name", "master_price", "category"), {}),
+    "orders": (("customer_id", "order_date", "status", "total_invoice"), {"customer_id": "customers"}),
+    "order_items": (("order_id", "product_id", "quantity", "final_price", "is_out_of_stock"), {"order_id": "orders", "product_id": "products"}),
+}
+# Rows the peer doesn't know by global id are matched on these before being inserted, so hand-kept copies don't double up.
+NATURAL_KEYS = {"customers": "name = ? COLLATE NOCASE AND COALESCE(email, '') = COALESCE(?, '')", "products": "name = ?"}
+
+# Each local change is folded into sync_ids: a new row gets a global id '<node>-<id>', and rows that predate sync keep the
+# implicit id '<origin>-<id>' (origin being the node the database file was first synced as, which survives `new-node`).
+# version/node is the last writer; seq orders changes for the delta watermarks. A row created and deleted between two
+# syncs never leaves the database.
+STAMP = """INSERT INTO sync_ids (tbl, row_id, gid, version, node, seq, deleted)
+    SELECT :tbl, c.row_id, (CASE WHEN c.created THEN :node ELSE :origin END) || '-' || c.row_id, c.changed_at, :node, c.seq, c.deleted FROM (
+        SELECT row_id, MAX(seq) AS seq, MAX(changed_at) AS changed_at, MAX(op = 'I') AS created, NOT EXISTS (SELECT 1 FROM {table} t WHERE t.id = row_id) AS deleted
+        FROM change_log WHERE tbl = :tbl AND seq > :stamped GROUP BY row_id) c
+    WHERE NOT (c.created AND c.deleted)
+    ON CONFLICT (tbl, row_id) DO UPDATE SET version = excluded.version, node = excluded.node, seq = excluded.seq, deleted = excluded.deleted"""
+
+def select_sql(table, full):
+    # Unary + keeps PARSE_DECLTYPES from turning order_date into a datetime; references resolve to global ids.
+    columns, references = SYNC_COLUMNS[table]; joins = [f"LEFT JOIN sync_ids r{i} ON r{i}.tbl = {CDC_TABLES.index(references[column]) + 1} AND r{i}.row_id = t.{column}" for i, column in enumerate(references)]
+    values = ", ".join(f"COALESCE(r{list(references).index(column)}.gid, :origin || '-' || t.{column})" if column in references else f"+t.{column}" for column in columns)
+    if full: return f"SELECT COALESCE(s.gid, :origin || '-' || t.id), COALESCE(s.version, 0), COALESCE(s.node, :origin), 0, {values} FROM {table} t LEFT JOIN sync_ids s ON s.tbl = :tbl AND s.row_id = t.id {' '.join(joins)} UNION ALL SELECT gid, version, node, 1, {', '.join('NULL' for _ in columns)} FROM sync_ids WHERE tbl = :tbl AND deleted"
+    return f"SELECT s.gid, s.version, s.node, s.deleted OR t.id IS NULL, {values} FROM sync_ids s LEFT JOIN {table} t ON t.id = s.row_id {' '.join(joins)} WHERE s.seq > :since AND s.tbl = :tbl AND s.node != :peer"
+
+def begin(db):
+    if not db.conn.in_transaction: db.conn.execute("BEGIN IMMEDIATE")
+def state(db, key, default=None):
+    row = db.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone(); return row[0] if row else default
+def set_state(db, key, value): db.conn.execute("INSERT INTO sync_state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, str(value)))
+
+def enabled(db): return state(db, "node") is not None
+
+def identity(db):
+    # (node, origin), created on first use, which also starts change capture. Call inside a write transaction.
+    node = state(db, "node")
+    if node is None:
+        node = uuid.uuid4().hex[:12]; set_state(db, "node", node); set_state(db, "origin", node)
+        for statement in CDC_TRIGGERS.values(): db.conn.execute(statement)
+    return node, state(db, "origin")
+
+def new_node(db):
+    # For a database copied from another installation: both files would otherwise write as the same node. The copy
+    # already holds everything the original had written, which its first bundle back acknowledges.
+    with db.conn:
+        begin(db)
+        # A file copied before its original took part in sync: the original's changes since the copy were never logged.
+        if not enabled(db): raise ValueError("This copy was made before sync was enabled on the original, so changes made there since can't be sent. Run 'sync clone <file>' on the original instead.")
+        previous = identity(db)[0]; stamped = stamp(db); node = uuid.uuid4().hex[:12]
+        set_state(db, "node", node); set_state(db, f"received:{previous}", max(stamped, int(state(db, f"received:{previous}", 0))))
+    return node
+
+def stamp(db):
+    # Folds change_log into sync_ids and prunes it; returns the last folded sequence. Call inside a write transaction.
+    node, origin = identity(db); stamped = int(state(db, "stamped", 0))
+    last = db.conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+    if last is None or last <= stamped: return stamped
+    for code, table in enumerate(CDC_TABLES, 1): db.conn.execute(STAMP.format(table=table), {"tbl": code, "node": node, "origin": origin, "stamped": stamped})
+    db.conn.execute("DELETE FROM change_log WHERE seq <= ?", (last,)); set_state(db, "stamped", last); return last
+
+def clone(db, path):
+    # Enables sync here, copies the database to path with SQLite's backup API and makes the copy a node of its own.
+    if os.path.exists(path): raise ValueError(f"{path} already exists.")
+    with db.conn: begin(db); identity(db)
+    target = sqlite3.connect(path)
+    try: db.conn.backup(target)
+    finally: target.close()
+    copy = Database(path)
+    try: return new_node(copy)
+    finally: copy.close()
+
+def compact(db):
+    # Folds change_log into sync_ids, which holds one row per changed row rather than one per change. The app runs this at
+    # startup ('sync compact' on demand), so the log stays small on databases that sync rarely. Databases that don't sync have no log.
+    if not enabled(db): return 0
+    with db.conn: begin(db); return stamp(db)
+
+def status(db):
+    # Node ids, the local sequence and, per known peer, the watermarks and how many changed rows it hasn't acknowledged.
+    if not enabled(db): return {"node": None, "origin": None, "sequence": 0, "peers": {}}
+    with db.conn:
+        begin(db); node, origin = identity(db); stamped = stamp(db); peers = {}
+        for key, value in db.conn.execute("SELECT key, value FROM sync_state WHERE key LIKE 'received:%' OR key LIKE 'acked:%'"):
+            kind, peer = key.split(":", 1); peers.setdefault(peer, {"received": 0, "acked": 0})[kind] = int(value)
+    for peer, marks in peers.items(): marks["pending"] = db.conn.execute("SELECT COUNT(*) FROM sync_ids WHERE seq > ? AND node != ?", (marks["acked"], peer)).fetchone()[0]
+    return {"node": node, "origin": origin, "sequence": stamped, "peers": peers}
+
+def write_bundle(db, out, peer=None, full=False, since=None):
+    # Streams the changes a peer hasn't acknowledged to `out` as gzipped JSON lines: a header, then one
+    # [table, gid, version, node, deleted, values] record per row in table order, so references resolve on import.
+    # full=True sends every row, for seeding a database that wasn't copied from this one. Returns the header with counts.
+    counts = {table: 0 for table in CDC_TABLES}
+    with db.conn, gzip.GzipFile(fileobj=out, mode="wb") as stream:
+        begin(db); node, origin = identity(db); until = stamp(db)
+        if peer == node: raise ValueError(f"Refusing to sync with myself ({node}).")
+        since = -1 if full else since if since is not None else int(state(db, f"acked:{peer}", 0))
+        header = {"agroflow_sync": SYNC_FORMAT, "node": node, "peer": peer, "since": since, "until": until, "received": int(state(db, f"received:{peer}", 0)), "created": datetime.now().isoformat(timespec="seconds")}
+        stream.write(json.dumps(header).encode() + b"\n"); cursor = db.conn.cursor(); cursor.row_factory = None
+        for code, table in enumerate(CDC_TABLES, 1):
+            for gid, version, writer, deleted, *values in cursor.execute(select_sql(table, full), {"tbl": code, "origin": origin, "since": since, "peer": peer or ""}):
+                stream.write(json.dumps([code, gid, version, writer, 1 if deleted else 0, None if deleted else values], separators=(",", ":")).encode() + b"\n"); counts[table] += 1
+    return {**header, "counts": counts}
+
+def read_bundle(data):
+    stream = gzip.GzipFile(fileobj=data, mode="rb"); header = json.loads(stream.readline())
+    if header.get("agroflow_sync") != SYNC_FORMAT: raise ValueError("Not an AgroFlow sync bundle (or from an incompatible version).")
+    return header, (json.loads(line) for line in stream)
+
+def apply_bundle(db, data):
+    # Applies a bundle in one transaction. A change wins when its (version, node) is greater than the local row's, so
+    # every database converges on the same rows whatever order bundles arrive in; re-applying a bundle is a no-op.
+    header, records = read_bundle(data); result = {"node": header["node"], "applied": 0, "deleted": 0, "skipped": 0, "unresolved": 0}
+    with db.conn:
+        begin(db); node, origin = identity(db); stamp(db)
+        if header["node"] == node: raise ValueError(f"This bundle was written by this database ({node}). If this file is a copy of another installation, run 'sync new-node' on it first.")
+        rollups = RollupTracker(db)
+        for code, gid, version, writer, deleted, values in records:
+            # A change that breaks a constraint here (a product renamed to a name taken locally) is left out.
+            try: result[apply_record(db, origin, rollups, CDC_TABLES[code - 1], code, gid, (version, writer), deleted, values)] += 1
+            except sqlite3.IntegrityError: result["unresolved"] += 1
+        rollups.finish()
+        # Rows written here logged changes of their own; they keep the sender's version but take a local sequence so
+        # they are passed on to other peers.
+        last = db.conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+        if last is not None: db.conn.execute("UPDATE sync_ids SET seq = ? WHERE seq = -1", (last,)); db.conn.execute("DELETE FROM change_log"); set_state(db, "stamped", last)
+        received = int(state(db, f"received:{header['node']}", 0)); result["gap"] = header["since"] > received
+        if not result["gap"]: set_state(db, f"received:{header['node']}", max(received, header["until"]))
+        if header.get("peer") == node: set_state(db, f"acked:{header['node']}", max(int(state(db, f"acked:{header['node']}", 0)), header["received"]))
+    if result["applied"] or result["deleted"]: db._invalidate(*CDC_TABLES, *ROLLUP_TABLES)
+    return result
+
+def apply_record(db, origin, rollups, table, code, gid, version, deleted, values):
+    columns, references = SYNC_COLUMNS[table]
+    row_id, local, mapped = resolve(db, origin, table, code, gid, values)
+    if version <= local: return "skipped"
+    exists = row_id is not None and db.conn.execute(f"SELECT 1 FROM {table} WHERE id = ?", (row_id,)).fetchone() is not None
+    if deleted:
+        if not exists: return "skipped"
+        rollups.before(table, row_id, None); db.conn.execute(f"DELETE FROM {table} WHERE id = ?", (row_id,))
+    else:
+        values = list(values)
+        for i, column in enumerate(columns):
+            if column in references:
+                values[i] = resolve(db, origin, references[column], CDC_TABLES.index(references[column]) + 1, values[i], None)[0]
+                if values[i] is None: return "unresolved"
+        row = dict(zip(columns, values))
+        if exists: rollups.before(table, row_id, row); db.conn.execute(f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?", (*values, row_id))
+        else: rollups.before(table, None, row); row_id = db.conn.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})", values).lastrowid; rollups.created(table, row_id)
+    if not mapped: db.conn.execute("DELETE FROM sync_ids WHERE tbl = ? AND gid = ? AND row_id != ?", (code, gid, row_id))
+    db.conn.execute("INSERT INTO sync_ids (tbl, row_id, gid, version, node, seq, deleted) VALUES (?, ?, ?, ?, ?, -1, ?) ON CONFLICT (tbl, row_id) DO UPDATE SET gid = CASE WHEN ? THEN gid ELSE excluded.gid END, version = excluded.version, node = excluded.node, seq = -1, deleted = excluded.deleted",
+                    (code, row_id, gid, *version, 1 if deleted else 0, mapped))
+    return "deleted" if deleted else "applied"
+
+def resolve(db, origin, table, code, gid, values):
+    # (local row id or None, local (version, node), whether the row already has a different global id).
+    row = db.conn.execute("SELECT row_id, version, node, deleted FROM sync_ids WHERE tbl = ? AND gid = ?", (code, gid)).fetchone()
+    if row: return (None if row[3] else row[0]), (row[1], row[2]), False
+    prefix, _, number = gid.rpartition("-")
+    if prefix == origin and number.isdigit() and not db.conn.execute("SELECT 1 FROM sync_ids WHERE tbl = ? AND row_id = ?", (code, int(number))).fetchone() and db.conn.execute(f"SELECT 1 FROM {table} WHERE id = ?", (int(number),)).fetchone():
+        return int(number), (0, origin), False
+    if values is not None and table in NATURAL_KEYS:
+        match = db.conn.execute(f"SELECT t.id, s.version, s.node FROM {table} t LEFT JOIN sync_ids s ON s.tbl = ? AND s.row_id = t.id WHERE {NATURAL_KEYS[table]} LIMIT 1", (code, *values[:NATURAL_KEYS[table].count("?")])).fetchone()
+        if match: return match[0], (match[1] or 0, match[2] or origin), match[1] is not None
+    return None, (0, ""), False
+
+class RollupTracker:
+    # Backs each order out of the sales rollups before its first change and adds it back at the end; past
+    # SYNC_ROLLUP_REFRESH_ORDERS orders (a full sync) it rebuilds the rollups once instead.
+    def __init__(self, db): self.db, self.orders, self.rebuild = db, set(), False
+
+    def before(self, table, row_id, row):
+        # Called before a row changes: an order, or an item (the order it is on now and the one it moves to).
+        if table == "orders": order_ids = [row_id]
+        elif table == "order_items": order_ids = [row["order_id"] if row else None] + [found[0] for found in self.db.conn.execute("SELECT order_id FROM order_items WHERE id = ?", (row_id,))]
+        else: return
+        for order_id in order_ids:
+            if order_id is None or self.rebuild or order_id in self.orders: continue
+            if len(self.orders) >= SYNC_ROLLUP_REFRESH_ORDERS: self.rebuild = True; return
+            self.db._apply_sales_rollups(order_id, -1); self.orders.add(order_id)
+
+    def created(self, table, row_id):
+        # A new order isn't in the rollups yet; it is only added at the end.
+        if table == "orders" and not self.rebuild: self.orders.add(row_id)
+
+    def finish(self):
+        if self.rebuild: self.db._refresh_sales_rollups(); return
+        for order_id in self.orders: self.db._apply_sales_rollups(order_id, 1)
+
+def export_file(db, path, peer=None, full=False):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f: header = write_bundle(db, f, peer, full)
+    return {**header, "bytes": os.path.getsize(path)}
+
+def import_file(db, path):
+    with open(path, "rb") as f: return apply_bundle(db, f)
+
+# Socket sync: length-prefixed messages over one TCP connection. The client says who it is, the server answers with how
+# far it has received from the client, then each side sends the other its delta bundle.
+def send_message(sock, data): sock.sendall(struct.pack("!Q", len(data)) + data)
+def receive_message(sock):
+    size = struct.unpack("!Q", receive_exactly(sock, 8))[0]; return receive_exactly(sock, size)
+def receive_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk: raise ConnectionError("The peer closed the connection mid-sync.")
+        chunks.append(chunk); size -= len(chunk)
+    return b"".join(chunks)
+
+def bundle_bytes(db, peer, full=False, since=None):
+    out = io.BytesIO(); header = write_bundle(db, out, peer, full, since); return out.getvalue(), header
+
+def connect(db, host, port=SYNC_PORT, full=False):
+    with socket.create_connection((host, port), timeout=SYNC_TIMEOUT) as sock:
+        with db.conn: begin(db); node = identity(db)[0]
+        send_message(sock, json.dumps({"node": node, "full": full}).encode())
+        hello = json.loads(receive_message(sock))
+        if "error" in hello: raise ValueError(hello["error"])
+        data, sent = bundle_bytes(db, hello["node"], full, since=None if full else hello["received"]); send_message(sock, data)
+        received = apply_bundle(db, io.BytesIO(receive_message(sock)))
+    return {"peer": hello["node"], "sent": sent["counts"], "sent_bytes": len(data), "received": received}
+
+class SyncServer(socketserver.TCPServer):
+    # One sync at a time, on the thread (and database connection) that calls serve_forever.
+    allow_reuse_address = True
+
+    def __init__(self, db, host="127.0.0.1", port=SYNC_PORT, on_sync=None):
+        super().__init__((host, port), SyncSession); self.db, self.on_sync = db, on_sync
+
+class SyncSession(socketserver.BaseRequestHandler):
+    def handle(self):
+        db = self.server.db; self.request.settimeout(SYNC_TIMEOUT); hello = json.loads(receive_message(self.request))
+        with db.conn: begin(db); node = identity(db)[0]; received = int(state(db, f"received:{hello['node']}", 0))
+        if hello["node"] == node: send_message(self.request, json.dumps({"error": f"Both databases are node {node}; run 'sync new-node' on the copy."}).encode()); return
+        send_message(self.request, json.dumps({"node": node, "received": -1 if hello.get("full") else received}).encode())
+        result = apply_bundle(db, io.BytesIO(receive_message(self.request)))
+        data, sent = bundle_bytes(db, hello["node"], hello.get("full"), since=None if hello.get("full") else int(state(db, f"acked:{hello['node']}", 0))); send_message(self.request, data)
+        if self.server.on_sync: self.server.on_sync({"peer": hello["node"], "sent": sent["counts"], "sent_bytes": len(data), "received": result})
@@ -0,0 +1,40 @@
+# agroflow/tests/test_rollups.py
+
+import random
+import pytest
+from datetime import datetime, timedelta
+from conftest import END, rollups
+
+def fulfil(db, order_id, rng, out_of_stock=0.2):
+    items = [row[0] for row in db.conn.execute("SELECT id FROM order_items WHERE order_id = ?", (order_id,))]
+    db.update_order_fulfillment({item_id: {"price": round(rng.uniform(0.5, 40.0), 2), "out_of_stock": rng.random() < out_of_stock} for item_id in items})
+
+def rebuilt(db):
+    db.rebuild_sales_rollups(); return rollups(db)
+
+def test_fulfilment_matches_rebuild(db):
+    rng = random.Random(7); pending = [row[0] for row in db.conn.execute("SELECT id FROM orders WHERE status != 'Completed'")]
+    for order_id in pending: fulfil(db, order_id, rng)
+    assert rollups(db) == rebuilt(db)
+
+def test_refulfilment_backs_out_previous_figures(db):
+    # Re-fulfilling a completed order has to subtract what it contributed before adding it again, including items that
+    # change between in and out of stock.
+    rng = random.Random(11); completed = [row[0] for row in db.conn.execute("SELECT id FROM orders WHERE status = 'Completed' ORDER BY id")]
+    for order_id in rng.sample(completed, 60) * 2: fulfil(db, order_id, rng, out_of_stock=0.5)
+    assert rollups(db) == rebuilt(db)
+
+def test_new_orders_fulfilled_twice(db):
+    rng = random.Random(3); product_ids = [row[0] for row in db.conn.execute("SELECT id FROM products")]
+    order_ids = db.create_orders([(customer_id, {pid: rng.randint(1, 9) for pid in rng.sample(product_ids, 3)}) for customer_id in range(1, 21)], order_date=END - timedelta(days=2, hours=5))
+    for order_id in order_ids + order_ids[::3]: fulfil(db, order_id, rng)
+    assert rollups(db) == rebuilt(db)
+
+def test_total_sales_between_matches_orders(db):
+    # Whole days come from sales_daily and partial days from orders; both together must equal a direct sum.
+    rng = random.Random(5)
+    for order_id in [row[0] for row in db.conn.execute("SELECT id FROM orders WHERE status = 'Completed' LIMIT 40")]: fulfil(db, order_id, rng)
+    direct = lambda start, end: db.conn.execute("SELECT SUM(total_invoice) FROM orders WHERE status = 'Completed' AND order_date >= ? AND order_date < ?", (start, end)).fetchone()[0]
+    periods = [(END - timedelta(days=30), END), (END - timedelta(days=45, hours=7), END - timedelta(days=3, hours=20)), (END - timedelta(days=10, hours=1), END - timedelta(days=10, minutes=5)), (datetime(2000, 1, 1), END + timedelta(days=1))]
+    for start, end in periods: assert (db.get_total_sales_between(start, end)[0] or 0) == pytest.approx(direct(start, end) or 0)
+    assert db.get_total_sales("week", now=END)[0] == pytest.approx(direct(END - timedelta(days=7), END))
@@ -0,0 +1,58 @@
+# agroflow/tests/test_statement_pages.py
+
+from datetime import datetime, timedelta
+import pytest
+from conftest import END
+
+def busiest_customer(db):
+    return db.conn.execute("SELECT customer_id FROM orders WHERE status = 'Completed' GROUP BY customer_id ORDER BY COUNT(*) DESC LIMIT 1").fetchone()[0]
+
+def complete_orders_at(db, customer_id, order_date, count):
+    # Orders sharing one order_date, so paging has to fall back on the id to break ties.
+    order_ids = db.create_orders([(customer_id, {1: n + 1, 2: 2}) for n in range(count)], order_date=order_date)
+    for order_id in order_ids: db.update_order_fulfillment({item_id: {"price": 1.25, "out_of_stock": False} for (item_id,) in db.conn.execute("SELECT id FROM order_items WHERE order_id = ?", (order_id,))})
+    return order_ids
+
+def all_pages(db, customer_id, limit, **window):
+    rows, after, balance = [], None, 0.0
+    while True:
+        page = db.get_customer_statement_page(customer_id, after=after, opening_balance=balance, limit=limit, **window)
+        rows.extend(page)
+        if len(page) < limit: return rows
+        after, balance = (page[-1]["order_date"], page[-1]["id"]), page[-1]["balance"]
+
+def expected(db, customer_id, start=datetime.min, end=datetime.max):
+    return [tuple(row) for row in db.conn.execute("SELECT id, order_date, total_invoice FROM orders WHERE customer_id = ? AND status = 'Completed' AND order_date >= ? AND order_date < ? ORDER BY order_date, id", (customer_id, start, end))]
+
+@pytest.mark.parametrize("limit", [1, 7, 500])
+def test_pages_cover_every_order_once_in_order(db, limit):
+    customer_id = busiest_customer(db); complete_orders_at(db, customer_id, END - timedelta(days=20), 9)
+    rows = all_pages(db, customer_id, limit)
+    assert [(row["id"], row["order_date"], row["total_invoice"]) for row in rows] == expected(db, customer_id)
+    running = 0.0
+    for row in rows: running += row["total_invoice"]; assert row["balance"] == pytest.approx(running)
+
+def test_windowed_pages_and_summary_agree(db):
+    customer_id = busiest_customer(db); start, end = END - timedelta(days=60), END - timedelta(days=20)
+    complete_orders_at(db, customer_id, end - timedelta(hours=1), 4); complete_orders_at(db, customer_id, end, 3)
+    rows = all_pages(db, customer_id, 5, start_date=start, end_date=end)
+    assert [row["id"] for row in rows] == [row[0] for row in expected(db, customer_id, start, end)]
+    summary = db.get_customer_statement_summary(customer_id, start, end)
+    assert summary["orders"] == len(rows) and summary["revenue"] == pytest.approx(rows[-1]["balance"])
+    assert sum(month["revenue"] for month in summary["months"]) == pytest.approx(summary["revenue"])
+    previous = expected(db, customer_id, start - (end - start), start)
+    assert summary["previous"][0] == len(previous) and summary["previous"][1] == pytest.approx(sum(row[2] for row in previous))
+
+def test_open_ended_summary_compares_with_the_period_to_today(db):
+    customer_id, start = busiest_customer(db), END - timedelta(days=30)
+    window_end = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+    summary = db.get_customer_statement_summary(customer_id, start)
+    assert summary["orders"] == len(expected(db, customer_id, start))
+    assert summary["previous"][0] == len(expected(db, customer_id, start - (window_end - start), start))
+
+def test_pages_see_new_orders(db):
+    # Pages are cached; completing an order has to invalidate them.
+    customer_id = busiest_customer(db); before = all_pages(db, customer_id, 50)
+    new_ids = complete_orders_at(db, customer_id, END + timedelta(days=1), 2)
+    after = all_pages(db, customer_id, 50)
+    assert [row["id"] for row in after] == [row["id"] for row in before] + new_ids
@@ -0,0 +1,84 @@
+# agroflow/tests/test_sync.py
+
+import shutil, threading, time
+import pytest
+from database import Database, CDC_TRIGGERS
+from conftest import rollups
+import sync
+
+@pytest.fixture
+def pair(db, tmp_path):
+    # The populated database and a clone of it, each its own node.
+    sync.clone(db, str(tmp_path / "clone.db")); other = Database(str(tmp_path / "clone.db"))
+    yield db, other
+    other.close()
+
+def contents(db):
+    # Rows by content rather than local id, since the two sides number new rows independently.
+    query = lambda sql: sorted(tuple(row) for row in db.conn.execute(sql))
+    return (query("SELECT name, email FROM customers"), query("SELECT name, master_price, category FROM products"),
+            query("SELECT c.name, +o.order_date, o.status, o.total_invoice FROM orders o JOIN customers c ON c.id = o.customer_id"),
+            query("SELECT c.name, +o.order_date, p.name, oi.quantity, oi.final_price, oi.is_out_of_stock FROM order_items oi JOIN orders o ON o.id = oi.order_id JOIN customers c ON c.id = o.customer_id JOIN products p ON p.id = oi.product_id"))
+
+def exchange(a, b, tmp_path):
+    sync.export_file(a, str(tmp_path / "a.agsync"), sync.status(b)["node"]); b_result = sync.import_file(b, str(tmp_path / "a.agsync"))
+    sync.export_file(b, str(tmp_path / "b.agsync"), sync.status(a)["node"]); a_result = sync.import_file(a, str(tmp_path / "b.agsync"))
+    return a_result, b_result
+
+def fulfil(db, order_id, price):
+    db.update_order_fulfillment({item_id: {"price": price, "out_of_stock": False} for (item_id,) in db.conn.execute("SELECT id FROM order_items WHERE order_id = ?", (order_id,))})
+
+def triggers(db):
+    return {row[0] for row in db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")} & set(CDC_TRIGGERS)
+
+def test_no_change_capture_until_sync_is_enabled(db, tmp_path):
+    assert not sync.enabled(db) and not triggers(db) and sync.compact(db) == 0
+    db.add_customer("Unsynced Farm", "", "", "", "")
+    assert db.conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 0
+    sync.clone(db, str(tmp_path / "clone.db"))
+    assert sync.enabled(db) and triggers(db) == set(CDC_TRIGGERS)
+
+def test_new_node_refuses_a_copy_made_before_sync(db, tmp_path):
+    db.close(); shutil.copy(db.db_file, tmp_path / "copy.db"); copy = Database(str(tmp_path / "copy.db"))
+    try:
+        with pytest.raises(ValueError): sync.new_node(copy)
+    finally: copy.close()
+
+def test_edits_on_both_sides_converge(pair, tmp_path):
+    a, b = pair; assert sync.status(a)["node"] != sync.status(b)["node"]
+    a.add_customer("New Farm A", "a@example.com", "", "", ""); customer_id = a.conn.execute("SELECT MAX(id) FROM customers").fetchone()[0]
+    fulfil(a, a.create_order(customer_id, {1: 3, 2: 4}), 2.5); a.update_product(3, "Renamed Lot", 9.99, "Fruit")
+    b.add_customer("New Farm B", "b@example.com", "", "", ""); fulfil(b, b.create_order(7, {4: 10}), 1.75)
+    a.add_product("Spare Lot", 1.0, "Root"); exchange(a, b, tmp_path)
+    b.delete_product(b.conn.execute("SELECT id FROM products WHERE name = 'Spare Lot'").fetchone()[0]); exchange(a, b, tmp_path)
+    assert contents(a) == contents(b) and "Spare Lot" not in {row[0] for row in a.conn.execute("SELECT name FROM products")}
+    for db in (a, b):
+        incremental = rollups(db); db.rebuild_sales_rollups(); assert rollups(db) == incremental
+
+def test_concurrent_edits_resolve_to_the_last_writer(pair, tmp_path):
+    a, b = pair
+    a.update_customer(6, "Six from A", "", "", "", ""); time.sleep(0.01); b.update_customer(6, "Six from B", "", "", "", "")
+    b.update_customer(5, "Five from B", "", "", "", ""); time.sleep(0.01); a.update_customer(5, "Five from A", "", "", "", "")
+    exchange(a, b, tmp_path)
+    for db in (a, b): assert [row[0] for row in db.conn.execute("SELECT name FROM customers WHERE id IN (5, 6) ORDER BY id")] == ["Five from A", "Six from B"]
+    assert contents(a) == contents(b)
+
+def test_reimport_and_repeat_exchange_are_no_ops(pair, tmp_path):
+    a, b = pair; fulfil(a, a.conn.execute("SELECT MIN(id) FROM orders WHERE status != 'Completed'").fetchone()[0], 3.0)
+    exchange(a, b, tmp_path); before = contents(b)
+    assert sync.import_file(b, str(tmp_path / "a.agsync"))["applied"] == 0 and contents(b) == before
+    a_result, b_result = exchange(a, b, tmp_path)
+    assert a_result["applied"] == b_result["applied"] == 0 and contents(a) == contents(b)
+
+def test_socket_sync(pair):
+    # The server answers on the thread that owns its connection, so the client runs on a thread with a connection of its own.
+    a, b = pair; a.add_customer("Socket Farm", "", "", "", ""); b.update_product(2, "Socket Lot", 4.5, "Greens"); results = []
+    def client():
+        db = Database(a.db_file)
+        try: results.append(sync.connect(db, "127.0.0.1", server.server_address[1]))
+        finally: db.close()
+    server = sync.SyncServer(b, port=0); thread = threading.Thread(target=client); thread.start()
+    try: server.handle_request()
+    finally: thread.join(10); server.server_close()
+    result, = results
+    assert result["peer"] == sync.status(b)["node"] and contents(a) == contents(b)
@@ -0,0 +1,108 @@
+# agroflow/uiprofiler.py
+
+import os
+import sys
+import json
+import time
+import atexit
+import inspect
+import functools
+import threading
+import tkinter
+from collections import deque
+
+# Opt-in: set AGROFLOW_UI_PROFILE=1 (or a trace file path) or the 'ui_profile' setting. Nothing is patched until install().
+JANK_MS = 16
+STALL_MS = 100
+HEARTBEAT_MS = 50
+MAX_EVENTS = 200_000
+UI_TRACE_FILE = os.path.join("data", "ui_trace.json")
+
+def unwrap(func):
+    # after() hands Tk a local 'callit' closure; report the function it schedules instead.
+    code, closure = getattr(func, "__code__", None), getattr(func, "__closure__", None)
+    if code is not None and closure and code.co_name == "callit": return dict(zip(code.co_freevars, (cell.cell_contents for cell in closure))).get("func", func)
+    return func
+
+def describe(func):
+    func = getattr(func, "__func__", func); name = getattr(func, "__qualname__", None) or repr(func); code = getattr(func, "__code__", None)
+    if code is not None and "<lambda>" in name: name += f" ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name
+
+class UIProfiler:
+    # Times every Tk callback (bindings, widget commands, after() jobs) by patching tkinter.CallWrapper, and the methods
+    # of the instrumented modules' classes nested inside them. Callbacks over JANK_MS / STALL_MS are flagged with the
+    # slowest chain of app methods beneath them; everything is kept as Chrome trace events (chrome://tracing, Perfetto).
+    def __init__(self, trace_file=UI_TRACE_FILE, jank_ms=JANK_MS, stall_ms=STALL_MS):
+        self.trace_file, self.jank_ms, self.stall_ms = trace_file, jank_ms, stall_ms
+        self.events, self.counts = deque(maxlen=MAX_EVENTS), {"callbacks": 0, "jank": 0, "stall": 0}
+        self._stack, self._main, self._origin, self._original_call, self._quiet = [], threading.main_thread().ident, time.perf_counter(), None, set()
+
+    def install(self, *modules):
+        if self._original_call is None:
+            original, profiler = tkinter.CallWrapper.__call__, self
+            def __call__(wrapper, *args):
+                func = unwrap(wrapper.func)
+                if func in profiler._quiet: return original(wrapper, *args)
+                return profiler._timed(describe(func), original, wrapper, *args, top=True)
+            tkinter.CallWrapper.__call__, self._original_call = __call__, original
+            if self.trace_file: atexit.register(self.export)
+        for module in modules: self.instrument(module)
+        return self
+
+    def uninstall(self):
+        if self._original_call is not None: tkinter.CallWrapper.__call__, self._original_call = self._original_call, None
+
+    def instrument(self, module):
+        for cls in [value for value in vars(module).values() if inspect.isclass(value) and value.__module__ == module.__name__]:
+            for name, fn in list(vars(cls).items()):
+                if inspect.isfunction(fn) and not getattr(fn, "_ui_profiled", False): setattr(cls, name, self._wrap(fn, f"{cls.__name__}.{name}"))
+
+    def _wrap(self, fn, name):
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs): return self._timed(name, fn, *args, **kwargs)
+        profiled._ui_profiled = True
+        return profiled
+
+    def _timed(self, name, fn, *args, top=False, **kwargs):
+        if threading.get_ident() != self._main: return fn(*args, **kwargs)
+        # entry = [name, slowest child as (name, ms, its slowest child)]
+        parent, entry = self._stack[-1] if self._stack else None, [name, None]
+        self._stack.append(entry); started = time.perf_counter()
+        try: return fn(*args, **kwargs)
+        finally:
+            ended = time.perf_counter(); self._stack.pop(); ms = (ended - started) * 1000
+            if parent is not None and (parent[1] is None or ms > parent[1][1]): parent[1] = (name, ms, entry[1])
+            event = {"name": name, "cat": "callback" if top else "app", "ph": "X", "ts": round((started - self._origin) * 1e6, 1), "dur": round((ended - started) * 1e6, 1), "pid": os.getpid(), "tid": 1}
+            if top: self._flag(event, name, ms, entry[1])
+            self.events.append(event)
+
+    def _flag(self, event, name, ms, slowest):
+        self.counts["callbacks"] += 1
+        if ms < self.jank_ms: return
+        level = "stall" if ms >= self.stall_ms else "jank"; self.counts[level] += 1
+        chain = [name]
+        while slowest is not None: chain.append(f"{slowest[0]} ({slowest[1]:.0f} ms)"); slowest = slowest[2]
+        event["args"] = {"level": level, "culprit": " > ".join(chain)}
+        if level == "stall": print(f"Warning: UI stall of {ms:.0f} ms in {event['args']['culprit']}", file=sys.stderr)
+
+    def start_watchdog(self, widget, interval_ms=HEARTBEAT_MS):
+        # Heartbeat on the event loop: how late each tick fires is the time the loop was blocked.
+        expected = [time.perf_counter() + interval_ms / 1000]
+        def heartbeat():
+            now = time.perf_counter(); lag = max(0.0, (now - expected[0]) * 1000)
+            self.events.append({"name": "event loop lag", "ph": "C", "ts": round((now - self._origin) * 1e6, 1), "pid": os.getpid(), "tid": 1, "args": {"ms": round(lag, 1)}})
+            expected[0] = now + interval_ms / 1000; widget.after(interval_ms, heartbeat)
+        self._quiet.add(heartbeat)
+        widget.after(interval_ms, heartbeat)
+
+    def export(self, path=None):
+        path = path or self.trace_file; os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": 1, "args": {"name": "Tk main loop"}}]
+        with open(path, "w", encoding="utf-8") as f: json.dump({"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms", "otherData": dict(self.counts, jank_ms=self.jank_ms, stall_ms=self.stall_ms)}, f)
+        return path
+
+def from_environment():
+    value = os.environ.get("AGROFLOW_UI_PROFILE", "")
+    if value in ("", "0"): return None
+    return UIProfiler(UI_TRACE_FILE if value == "1" else value)
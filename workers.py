@@ -0,0 +1,123 @@
+# agroflow/workers.py
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from database import Database
+
+SEARCH_DEBOUNCE_MS = 200
+RESULT_POLL_MS = 15
+READ_WORKERS = 2
+CLOSE_TIMEOUT = 2.0
+
+class DataAccessPool:
+    # Read pool plus a single serialized writer; every worker thread owns its own Database connection.
+    # read()/write() take a Database method name (or a callable taking the db) and return a Future. When a
+    # callback is given it is run on the Tk thread, marshalled by polling a completion queue with after().
+    def __init__(self, db_file, widget=None, readers=READ_WORKERS):
+        self.db_file, self.widget = db_file, widget
+        self._read_queue, self._write_queue, self._completed = queue.Queue(), queue.Queue(), queue.Queue()
+        self._pending, self._ready, self._tasks = 0, threading.Barrier(readers + 2), set()
+        self._threads = [threading.Thread(target=self._serve, args=(self._read_queue, True), daemon=True) for _ in range(readers)]
+        self._threads.append(threading.Thread(target=self._serve, args=(self._write_queue, False), daemon=True))
+        for thread in self._threads: thread.start()
+        self._ready.wait()
+
+    def read(self, method, *args, callback=None, errback=None): return self._submit(self._read_queue, method, args, callback, errback)
+    def write(self, method, *args, callback=None, errback=None): return self._submit(self._write_queue, method, args, callback, errback)
+
+    def _submit(self, work_queue, method, args, callback, errback):
+        future = Future(); work_queue.put((future, method, args))
+        if callback or errback:
+            future.add_done_callback(lambda f: self._completed.put((f, callback, errback))); self._pending += 1
+            if self._pending == 1: self.widget.after(RESULT_POLL_MS, self._poll)
+        return future
+
+    def _serve(self, work_queue, read_only):
+        # The writer opens first so schema setup and migrations finish before readers connect.
+        if read_only: self._ready.wait()
+        try: db = Database(self.db_file, read_only=read_only)
+        except Exception: self._ready.abort(); raise
+        if not read_only: self._ready.wait()
+        while True:
+            item = work_queue.get()
+            if item is None: break
+            future, method, args = item
+            if not future.set_running_or_notify_cancel(): continue
+            try: future.set_result(method(db, *args) if callable(method) else getattr(db, method)(*args))
+            except Exception as e: future.set_exception(e)
+        db.close()
+
+    def _poll(self):
+        while True:
+            try: future, callback, errback = self._completed.get_nowait()
+            except queue.Empty: break
+            self._pending -= 1
+            if future.cancelled(): continue
+            error = future.exception()
+            if error is None: callback and callback(future.result())
+            elif errback: errback(error)
+            else: print(f"Warning: Background database call failed. Error: {error}")
+        if self._pending: self.widget.after(RESULT_POLL_MS, self._poll)
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        # Drops queued reads and cancels background tasks, lets queued writes finish, then waits at most `timeout` seconds;
+        # a job still running after that (a rebuild, say) is abandoned with its daemon thread and SQLite rolls it back.
+        while True:
+            try: future, _, _ = self._read_queue.get_nowait()
+            except queue.Empty: break
+            future.cancel()
+        for task in list(self._tasks): task.cancel(); task.future.cancel()
+        for _ in self._threads[:-1]: self._read_queue.put(None)
+        self._write_queue.put(None); deadline = time.monotonic() + timeout
+        for thread in self._threads: thread.join(max(deadline - time.monotonic(), 0))
+
+class SearchDispatcher:
+    # Debounces keystroke searches per channel (usually the Entry being typed in), runs them on the pool's
+    # readers and hands only the newest result per channel back to Tk. Superseded requests never reach SQLite.
+    def __init__(self, pool, delay=SEARCH_DEBOUNCE_MS):
+        self.pool, self.widget, self.delay = pool, pool.widget, delay
+        self._latest, self._timers = {}, {}
+
+    def submit(self, channel, method, args, callback, delay=None):
+        self.cancel(channel); seq = self._latest[channel]
+        self._timers[channel] = self.widget.after(self.delay if delay is None else delay, lambda: self._dispatch(channel, seq, method, args, callback))
+
+    def cancel(self, channel):
+        self._latest[channel] = self._latest.get(channel, 0) + 1
+        if channel in self._timers: self.widget.after_cancel(self._timers.pop(channel))
+
+    def _dispatch(self, channel, seq, method, args, callback):
+        self._timers.pop(channel, None); is_current = lambda: seq == self._latest.get(channel)
+        query = lambda db: getattr(db, method)(*args) if is_current() else None
+        self.pool.read(query, callback=lambda result: callback(result) if is_current() else None, errback=lambda e: print(f"Warning: Search '{method}' failed. Error: {e}"))
+
+class BackgroundTask:
+    # Runs fn(db, report, cancel_event) on the pool (the writer when write=True). Only the newest progress
+    # report and the final result (or exception) are delivered to the Tk thread.
+    def __init__(self, pool, fn, write=False, on_progress=None, on_done=None, on_error=None):
+        self.widget, self.on_progress, self.cancel_event, self._progress, self._finished = pool.widget, on_progress, threading.Event(), queue.Queue(), False
+        submit = pool.write if write else pool.read; pool._tasks.add(self)
+        self.future = submit(lambda db: fn(db, lambda *args: self._progress.put(args), self.cancel_event), callback=lambda result: self._finish(on_done, result), errback=lambda e: self._finish(on_error, e))
+        self.future.add_done_callback(lambda _: pool._tasks.discard(self))
+        self.widget.after(RESULT_POLL_MS * 5, self._poll)
+
+    def cancel(self): self.cancel_event.set()
+
+    def _latest_progress(self):
+        progress = None
+        while True:
+            try: progress = self._progress.get_nowait()
+            except queue.Empty: return progress
+
+    def _poll(self):
+        if self._finished: return
+        progress = self._latest_progress()
+        if progress is not None and self.on_progress: self.on_progress(*progress)
+        self.widget.after(RESULT_POLL_MS * 5, self._poll)
+
+    def _finish(self, handler, payload):
+        self._finished = True
+        if handler: handler(payload)
+        elif isinstance(payload, Exception): print(f"Warning: Background task failed. Error: {payload}")